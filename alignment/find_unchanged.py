@@ -3,11 +3,19 @@
 # Author: Nicolas Spring
 
 import argparse
+import os
 import pandas as pd
 import re
+import sys
 
 from string import punctuation
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.columnar import read_table  # noqa: E402
+from common.compressed_io import open_file  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.stage_cache import StageCache, add_cache_args  # noqa: E402
 
 
 def parse_args() -> argparse.Namespace:
@@ -18,7 +26,7 @@ def parse_args() -> argparse.Namespace:
         nargs="+",
         type=str,
         metavar="PATH",
-        help="One or more tsv files containing simplewiki corpus alignments.",
+        help="One or more (compressed) tsv files containing simplewiki corpus alignments.",
     )
     parser.add_argument(
         "-c",
@@ -34,7 +42,8 @@ def parse_args() -> argparse.Namespace:
         "--output",
         type=str,
         metavar="PATH",
-        help="The output path for the file with corresponding sentences.",
+        help="The output path for the file with corresponding sentences (compressed if it ends "
+        + "in .gz, .bz2, .zst or .xz).",
     )
     parser.add_argument(
         "-p",
@@ -42,8 +51,10 @@ def parse_args() -> argparse.Namespace:
         nargs="+",
         type=str,
         metavar="PATH",
-        help="One or more tsv files containing parsed wikipedia articles.",
+        help="One or more (compressed) tsv or parquet files containing parsed wikipedia articles.",
     )
+    add_profiling_args(parser)
+    add_cache_args(parser)
     args = parser.parse_args()
     return args
 
@@ -53,27 +64,32 @@ def read_alignment_file(path: str) -> pd.DataFrame:
     reads an tsv alignment file into a pd.DataFrame.
 
     Args:
-        path:   the path to a tsv file containing en-simple wikipedia alignments.
+        path:   the path to a (compressed) tsv file containing en-simple wikipedia alignments.
     """
     filename = path.split("/")[-1] if "/" in path else path
-    df = pd.read_csv(path, delimiter="\t", names=["en", "simple", "score"])
+    with open_file(path, "rb") as infile:
+        df = pd.read_csv(infile, delimiter="\t", names=["en", "simple", "score"], encoding="utf8")
     df.insert(3, "filename", pd.Series([filename for n in range(len(df))]))
     return df
 
 
 def read_parsed_wiki(path: str, column_index: int = 6) -> pd.DataFrame:
     """
-    reads a tsv file and returns all columns up to and including the specified one.
+    reads a tsv (or parquet) file and returns the id columns and the specified sentence column.
 
     Args:
-        path:   the path to a tsv file containing the parsing output.
+        path:           the path to a tsv or parquet file containing the parsing output.
+        column_index:   the index of the column containing the sentences.
     """
-    df = pd.read_csv(path, sep="\t", header=None, quotechar='"').loc[:, :column_index]
+    df = read_table(path, columns=sorted({0, 1, 2, column_index}))
     return df
 
 
 def find_pendants(
-    simple_dfs: List[pd.DataFrame], alignment_dfs: List[pd.DataFrame], fuzzy: bool = False
+    simple_dfs: List[pd.DataFrame],
+    alignment_dfs: List[pd.DataFrame],
+    fuzzy: bool = False,
+    column_index: int = 6,
 ) -> pd.DataFrame:
     """
     finds lines in both the simplewiki dfs and the alignment dfs and returns a pd.DataFrame.
@@ -81,6 +97,8 @@ def find_pendants(
     Args:
         simple_dfs:     a list of pd.DataFrames read from parsed tsv files.
         alignment_dfs:  a list of pd.DataFrames read from the alignment files.
+        fuzzy:          a boolean specifying whether or not the sentences are simplified.
+        column_index:   the index of the column containing the sentences.
 
     Returns:
         df:             a pd.DataFrame containing the following columns:
@@ -98,13 +116,8 @@ def find_pendants(
 
     df_dict = {}
     for i, row in simple_df.iterrows():
-        sent = remove_punctuation_and_lowercase(row[6]).strip() if fuzzy else row[6]
-        if sent == "":  # sents containing nothing apart from whitespace and punctuation
-            continue
-        found = sent_lookup.get(sent, None)
-        if (
-            found is not None and found["simple"].strip() != ""
-        ):  # sents containing nothing apart from whitespace and punctuation
+        found = match_sentence(row[column_index], sent_lookup, fuzzy)
+        if found is not None:
             df_dict[i] = (
                 found["filename"],
                 found["simple"],
@@ -112,7 +125,7 @@ def find_pendants(
                 row[0],
                 row[1],
                 row[2],
-                row[6],
+                row[column_index],
             )
 
     output_cols = [
@@ -128,6 +141,31 @@ def find_pendants(
     return df
 
 
+def match_sentence(
+    sent: str, sent_lookup: Dict[str, Dict[str, str]], fuzzy: bool = False
+) -> Optional[Dict[str, str]]:
+    """
+    looks up a parsed sentence in the alignment sentences.
+
+    Args:
+        sent:           a sentence from a parsed file.
+        sent_lookup:    the alignment sentences created by make_sent_lookup_dict.
+        fuzzy:          a boolean specifying whether or not the sentence keys are simplified.
+
+    Returns:
+        found:          the alignment row (a dict of column values) or None.
+    """
+    sent = remove_punctuation_and_lowercase(sent).strip() if fuzzy else sent
+    if sent == "":  # sents containing nothing apart from whitespace and punctuation
+        return None
+    found = sent_lookup.get(sent, None)
+    if (
+        found is not None and found["simple"].strip() != ""
+    ):  # sents containing nothing apart from whitespace and punctuation
+        return found
+    return None
+
+
 def merge_dfs(df_list: List[pd.DataFrame]) -> pd.DataFrame:
     """
     concatenates a list of pd.DataFrames with the same number of columns into one.
@@ -184,11 +222,39 @@ def remove_punctuation_and_lowercase(input_string: str) -> str:
 
 
 def main(args: argparse.Namespace):
-    parsed_files = [read_parsed_wiki(path, args.column_index) for path in args.parsed_file]
-    alignment_files = [read_alignment_file(path) for path in args.alignment_file]
-
-    ret_df = find_pendants(parsed_files, alignment_files, fuzzy=True)
-    ret_df.to_csv(args.output, sep="\t", quotechar='"', index=False, header=False)
+    profiler = Profiler.from_args("find_unchanged", args).start()
+    cache = StageCache.from_args(args)
+    if cache is not None:
+        # the file names of the alignment files are part of the output
+        params = {
+            "column_index": args.column_index,
+            "alignment_files": [os.path.basename(path) for path in args.alignment_file],
+        }
+        cache_key = cache.key("find_pendants", params, args.parsed_file + args.alignment_file)
+        if cache.restore(cache_key, [args.output]):
+            if args.profile:
+                profiler.write_report(args.profile)
+            return
+
+    with profiler.stage("read parsed files"):
+        parsed_files = [read_parsed_wiki(path, args.column_index) for path in args.parsed_file]
+    with profiler.stage("read alignment files"):
+        alignment_files = [read_alignment_file(path) for path in args.alignment_file]
+    profiler.count("parsed sentences", sum(len(df) for df in parsed_files))
+    profiler.count("alignments", sum(len(df) for df in alignment_files))
+
+    with profiler.stage("match"):
+        ret_df = find_pendants(
+            parsed_files, alignment_files, fuzzy=True, column_index=args.column_index
+        )
+    profiler.count("matched sentences", len(ret_df))
+    with profiler.stage("write"):
+        with open_file(args.output, "w", newline="") as outfile:
+            ret_df.to_csv(outfile, sep="\t", quotechar='"', index=False, header=False)
+    if cache is not None:
+        cache.store(cache_key, [args.output], "find_pendants")
+    if args.profile:
+        profiler.write_report(args.profile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from typing import Dict, List
+
+from generate_corpora import CorpusGenerator
+from run_benchmarks import BENCHMARKS, STAGES, measure
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(REPO_DIR)
+from common.compressed_io import (  # noqa: E402
+    BUFFER_SIZE,
+    compression_of,
+    default_threads,
+    find_command,
+    is_supported,
+    open_file,
+)
+
+FORMATS = {"raw": "", "gz": ".gz", "bz2": ".bz2", "zst": ".zst", "xz": ".xz"}
+CORPORA = ["simple_docs", "de_docs", "parsed.tsv", "alignments.tsv"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="directory with corpora created by generate_corpora.py. corpora are generated in "
+        + "--work-dir if omitted.",
+    )
+    parser.add_argument(
+        "-w",
+        "--work-dir",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="directory for the compressed corpora and the outputs of the stages (default: a "
+        + "temporary directory)",
+    )
+    parser.add_argument(
+        "-n",
+        "--articles",
+        type=int,
+        default=2000,
+        metavar="INT",
+        help="number of articles of generated corpora (default: 2000)",
+    )
+    parser.add_argument(
+        "-f",
+        "--formats",
+        type=str,
+        nargs="+",
+        choices=list(FORMATS),
+        default=list(FORMATS),
+        help="the formats of the inputs and outputs, raw is uncompressed (default: all)",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=default_threads(),
+        metavar="INT",
+        help="number of processes of the parse stage (default: number of cpus)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=None,
+        metavar="INT",
+        help="number of threads of multi-threaded compression tools (default: number of cpus)",
+    )
+    parser.add_argument(
+        "-l",
+        "--level",
+        type=int,
+        default=None,
+        metavar="INT",
+        help="compression level of the inputs (default: the default level of the format)",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="number of runs per format, the fastest run is reported (default: 1)",
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        type=str,
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help="the stages to run (default: all)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="output file for a json report of all measurements",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def disk_size(path: str) -> int:
+    """
+    returns the size of a file or the total size of the files in a directory.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(path)
+        for file in files
+    )
+
+
+def compress_corpora(
+    data_dir: str, output_dir: str, suffix: str, threads: int = None, level: int = None
+) -> int:
+    """
+    copies the corpora read by the stages to @param output_dir. every file is compressed in the
+    format of @param suffix (or copied for raw inputs), the langlinks table is linked. returns the
+    number of bytes on disk.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    n_bytes = 0
+    for name in CORPORA:
+        source = os.path.join(data_dir, name)
+        if os.path.isfile(source):
+            files = [(source, os.path.join(output_dir, name + suffix))]
+        else:
+            files = [
+                (
+                    os.path.join(root, file),
+                    os.path.join(output_dir, os.path.relpath(root, data_dir), file + suffix),
+                )
+                for root, _, dir_files in os.walk(source)
+                for file in dir_files
+            ]
+        for input_file, output_file in files:
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open_file(input_file, "rb") as infile, open_file(
+                output_file, "wb", threads=threads, level=level
+            ) as outfile:
+                shutil.copyfileobj(infile, outfile, BUFFER_SIZE)
+            n_bytes += os.path.getsize(output_file)
+    link = os.path.join(output_dir, "langlinks.sqlite")
+    if not os.path.exists(link):
+        os.symlink(os.path.abspath(os.path.join(data_dir, "langlinks.sqlite")), link)
+    return n_bytes
+
+
+def run_pipeline(
+    data_dir: str, work_dir: str, n_processes: int, suffix: str, stages: List[str]
+) -> Dict[str, float]:
+    """
+    runs the stages one after the other with the inputs and outputs in the format of @param suffix
+    and returns the run time of every stage.
+    """
+    seconds = {}
+    for stage in stages:
+        start = time.perf_counter()
+        BENCHMARKS[stage](data_dir, work_dir, n_processes, suffix)
+        seconds[stage] = time.perf_counter() - start
+    return seconds
+
+
+def run_format(
+    name: str, data_dir: str, work_dir: str, args: argparse.Namespace, stages: List[str]
+) -> Dict:
+    """
+    compresses the corpora in one format and measures the end-to-end wall time of the stages.
+    """
+    suffix = FORMATS[name]
+    format_dir = os.path.join(work_dir, name)
+    start = time.perf_counter()
+    input_bytes = compress_corpora(
+        data_dir, os.path.join(format_dir, "data"), suffix, args.threads, args.level
+    )
+    prepare_seconds = time.perf_counter() - start
+    output_dir = os.path.join(format_dir, "out")
+    os.makedirs(output_dir, exist_ok=True)
+    runs = [
+        measure(
+            run_pipeline,
+            os.path.join(format_dir, "data"),
+            output_dir,
+            args.processes,
+            suffix,
+            stages,
+        )
+        for _ in range(args.repeat)
+    ]
+    best = min(runs, key=lambda run: run["seconds"])
+    compression = compression_of("file" + suffix)
+    command = find_command(compression) if compression is not None else None
+    return {
+        "format": name,
+        "tool": command[0] if command is not None else ("python" if compression else None),
+        "compress_seconds": prepare_seconds,
+        "input_bytes": input_bytes,
+        "output_bytes": disk_size(output_dir),
+        "seconds": best["seconds"],
+        "stage_seconds": best["counters"],
+        "max_rss_mb": best["max_rss_mb"],
+        "max_rss_children_mb": best["max_rss_children_mb"],
+    }
+
+
+def print_results(results: List[Dict], stages: List[str]):
+    print(
+        f"\n{'format':<7}{'tool':<8}{'input MB':>9}{'output MB':>10}{'seconds':>9}{'vs raw':>8}"
+        + "".join(f"{stage:>15}" for stage in stages)
+    )
+    for result in results:
+        relative = result.get("relative_seconds")
+        print(
+            f"{result['format']:<7}{result['tool'] or '-':<8}"
+            + f"{result['input_bytes'] / 1e6:>9.1f}{result['output_bytes'] / 1e6:>10.1f}"
+            + f"{result['seconds']:>9.2f}"
+            + (f"{relative:>8.2f}" if relative is not None else f"{'-':>8}")
+            + "".join(f"{result['stage_seconds'][stage]:>15.2f}" for stage in stages)
+        )
+
+
+def main(args: argparse.Namespace):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="simplewiki_bench_compression_")
+    os.makedirs(work_dir, exist_ok=True)
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(work_dir, "data")
+        print(f"Generating corpora with {args.articles} articles in {data_dir}...", file=sys.stderr)
+        CorpusGenerator(args.articles).write_all(data_dir)
+    # the stages are run in the order of the pipeline
+    stages = [stage for stage in STAGES if stage in args.stages]
+    results = []
+    for name in args.formats:
+        compression = compression_of("file" + FORMATS[name])
+        if compression is not None and not is_supported(compression):
+            print(
+                f"Skipping {name}: neither the zstd command nor the zstandard module is installed.",
+                file=sys.stderr,
+            )
+            continue
+        print(f"Running the stages on {name} files...", file=sys.stderr)
+        results.append(run_format(name, data_dir, work_dir, args, stages))
+    raw = next((result for result in results if result["format"] == "raw"), None)
+    if raw is not None:
+        for result in results:
+            result["relative_seconds"] = result["seconds"] / raw["seconds"]
+            result["relative_input_bytes"] = result["input_bytes"] / raw["input_bytes"]
+    print_results(results, stages)
+    if args.output:
+        report = {
+            "started": datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "data_dir": os.path.abspath(data_dir),
+            "processes": args.processes,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf8") as outfile:
+            json.dump(report, outfile, indent=2)
+            outfile.write("\n")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
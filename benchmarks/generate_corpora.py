@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import csv
+import os
+import random
+import sqlite3
+
+from typing import List, Tuple
+
+SYLLABLES = [
+    "ka", "to", "ri", "ne", "sa", "mu", "lo", "pe", "di", "ga",
+    "vi", "ro", "ta", "mi", "ku", "le", "no", "ba", "se", "fu",
+]  # fmt: skip
+SECTION_NAMES = ["History", "Geography", "Culture", "Economy", "People", "Sports", "References"]
+IMAGE_OPTIONS = ["thumb", "left", "right", "center", "upright", "200px", "250px"]
+SIMPLE_URL = "https://simple.wikipedia.org/wiki?curid="
+DE_URL = "https://de.wikipedia.org/wiki?curid="
+DE_ID_OFFSET = 1000000
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        required=True,
+        metavar="PATH",
+        help="output directory for the synthetic corpora",
+    )
+    parser.add_argument(
+        "-n",
+        "--articles",
+        type=int,
+        default=2000,
+        metavar="INT",
+        help="number of articles per corpus (default: 2000)",
+    )
+    parser.add_argument(
+        "--articles-per-file",
+        type=int,
+        default=100,
+        metavar="INT",
+        help="number of articles per medialab file (default: 100)",
+    )
+    parser.add_argument(
+        "--match-rate",
+        type=float,
+        default=0.7,
+        metavar="FLOAT",
+        help="share of articles with an entry in the langlinks table (default: 0.7)",
+    )
+    parser.add_argument("--seed", type=int, default=1, metavar="INT", help="random seed")
+    args = parser.parse_args()
+    return args
+
+
+class CorpusGenerator(object):
+    def __init__(self, n_articles: int, match_rate: float = 0.7, seed: int = 1):
+        """
+        generates reproducible synthetic corpora resembling the inputs and outputs of the scripts in
+        this repository. the same seed always produces the same corpora.
+
+        Args:
+        n_articles      the number of articles per corpus.
+        match_rate      the share of articles with an entry in the langlinks table.
+        seed            the random seed.
+        """
+        self.n_articles = n_articles
+        self.match_rate = match_rate
+        self.seed = seed
+        self.article_ids = list(range(1, n_articles + 1))
+        rng = random.Random(seed)
+        self.matches = {
+            article_id: DE_ID_OFFSET + article_id
+            for article_id in self.article_ids
+            if rng.random() < match_rate
+        }
+
+    def write_all(self, output_dir: str, articles_per_file: int = 100):
+        """
+        writes all corpora to @param output_dir (see README.md for the layout).
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.write_medialab(os.path.join(output_dir, "simple_docs"), "simple", articles_per_file)
+        self.write_medialab(os.path.join(output_dir, "de_docs"), "de", articles_per_file)
+        self.write_langlinks(os.path.join(output_dir, "langlinks.sqlite"))
+        self.write_parsed_tsv(os.path.join(output_dir, "parsed.tsv"))
+        self.write_alignments(
+            os.path.join(output_dir, "parsed.tsv"), os.path.join(output_dir, "alignments.tsv")
+        )
+        self.write_xml_dump(os.path.join(output_dir, "pages-articles.xml"))
+
+    def write_medialab(self, output_dir: str, lang: str, articles_per_file: int = 100):
+        """
+        writes the articles of a corpus as files in medialab document format (like the output of the
+        WikiExtractor with --sections), split into subdirectories of 100 files.
+        """
+        rng = random.Random(f"{self.seed}-{lang}")
+        ids = self.article_ids if lang == "simple" else sorted(self.matches.values())
+        url = SIMPLE_URL if lang == "simple" else DE_URL
+        for n_file, start in enumerate(range(0, len(ids), articles_per_file)):
+            subdir = os.path.join(output_dir, f"A{n_file // 100:03d}")
+            os.makedirs(subdir, exist_ok=True)
+            with open(os.path.join(subdir, f"wiki_{n_file % 100:02d}"), "w", encoding="utf8") as f:
+                for article_id in ids[start : start + articles_per_file]:
+                    title = self.title(article_id)
+                    f.write(f'<doc id="{article_id}" url="{url}{article_id}" title="{title}">\n')
+                    f.write(f"{title}\n\n")
+                    for section_name, paragraphs in self._sections(rng):
+                        if section_name is not None:
+                            f.write(f"Section::::{section_name}.\n")
+                        for paragraph in paragraphs:
+                            f.write(paragraph + "\n")
+                    f.write("\n</doc>\n")
+
+    def write_langlinks(self, path: str, match_lang: str = "de"):
+        """
+        writes a sqlite database with a langlinks table (ll_from, ll_lang, ll_title) standing in for
+        the mysql database used by the DocumentParser.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        cnx = sqlite3.connect(path)
+        cnx.execute("CREATE TABLE langlinks (ll_from INTEGER, ll_lang TEXT, ll_title TEXT)")
+        cnx.executemany(
+            "INSERT INTO langlinks VALUES (?, ?, ?)",
+            [
+                (article_id, match_lang, self.title(de_id))
+                for article_id, de_id in self.matches.items()
+            ],
+        )
+        cnx.execute("CREATE INDEX langlinks_from ON langlinks (ll_from, ll_lang)")
+        cnx.commit()
+        cnx.close()
+
+    def write_parsed_tsv(self, path: str):
+        """
+        writes a tsv in the layout of the match file of parse_documents.py (eight columns, the last
+        one containing the title of the matching de article).
+        """
+        rng = random.Random(f"{self.seed}-parsed")
+        with open(path, "w", encoding="utf8") as outfile:
+            writer = csv.writer(outfile, delimiter="\t", quotechar='"')
+            for article_id, de_id in self.matches.items():
+                title = self.title(article_id)
+                for section_id, (section_name, paragraphs) in enumerate(self._sections(rng), 1):
+                    sents = [sent for paragraph in paragraphs for sent in paragraph.split(". ")]
+                    for sent_id, sent in enumerate(sents, 1):
+                        writer.writerow(
+                            [
+                                article_id,
+                                section_id,
+                                sent_id,
+                                SIMPLE_URL + str(article_id),
+                                title,
+                                section_name or "Summary",
+                                sent.rstrip(".") + ".",
+                                self.title(de_id),
+                            ]
+                        )
+
+    def write_alignments(self, parsed_path: str, path: str, share: float = 0.2):
+        """
+        writes an alignment file (english sentence, simple sentence, score) in the layout of the
+        Parallel Wikipedia Dataset. a @param share of the sentences in @param parsed_path is
+        contained (with tokenized punctuation like in the dataset), the rest of the file are
+        sentences which do not occur in the parsed file.
+        """
+        rng = random.Random(f"{self.seed}-alignments")
+        with open(parsed_path, encoding="utf8") as infile:
+            sents = [row[6] for row in csv.reader(infile, delimiter="\t")]
+        with open(path, "w", encoding="utf8") as outfile:
+            for sent in sents:
+                if rng.random() < share:
+                    simple = sent[:-1] + " ."
+                else:
+                    simple = self._sentence(rng)[:-1] + " ."
+                english = self._sentence(rng)[:-1] + " ."
+                outfile.write(f"{english}\t{simple}\t{rng.random():.4f}\n")
+
+    def write_xml_dump(self, path: str, image_rate: float = 0.5):
+        """
+        writes the simple articles as a pages-articles xml dump (like simplewiki-latest-pages-
+        articles.xml) for ../misc/extract_images.py. a section contains an image with a
+        probability of @param image_rate. the images have captions of different lengths, with and
+        without links, or only options (no caption).
+        """
+        rng = random.Random(f"{self.seed}-dump")
+        with open(path, "w", encoding="utf8") as outfile:
+            outfile.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">\n')
+            outfile.write("  <siteinfo>\n")
+            outfile.write("    <base>https://simple.wikipedia.org/wiki/Main_Page</base>\n")
+            outfile.write("  </siteinfo>\n")
+            for article_id in self.article_ids:
+                outfile.write("  <page>\n")
+                outfile.write(f"    <title>{self.title(article_id)}</title>\n")
+                outfile.write("    <ns>0</ns>\n")
+                outfile.write(f"    <id>{article_id}</id>\n")
+                outfile.write("    <revision>\n")
+                outfile.write(f"      <id>{DE_ID_OFFSET + article_id}</id>\n")
+                outfile.write('      <text xml:space="preserve">{{Infobox}}\n')
+                for section_name, paragraphs in self._sections(rng):
+                    if section_name is not None:
+                        outfile.write(f"\n== {section_name} ==\n")
+                    if rng.random() < image_rate:
+                        outfile.write(self._image(rng) + "\n")
+                    for paragraph in paragraphs:
+                        outfile.write(self._link_words(paragraph, rng) + "\n")
+                outfile.write("</text>\n")
+                outfile.write("    </revision>\n")
+                outfile.write("  </page>\n")
+            outfile.write("</mediawiki>\n")
+
+    def title(self, article_id: int) -> str:
+        """
+        returns the (single word) title of an article.
+        """
+        rng = random.Random(article_id)
+        return self._word(rng).capitalize() + "_" + str(article_id)
+
+    def _sections(self, rng: random.Random) -> List[Tuple[str, List[str]]]:
+        sections = [(None, self._paragraphs(rng))]
+        for section_name in rng.sample(SECTION_NAMES, rng.randint(1, 4)):
+            sections.append((section_name, self._paragraphs(rng)))
+        return sections
+
+    def _paragraphs(self, rng: random.Random) -> List[str]:
+        return [
+            " ".join(self._sentence(rng) for _ in range(rng.randint(2, 6)))
+            for _ in range(rng.randint(1, 3))
+        ]
+
+    def _sentence(self, rng: random.Random) -> str:
+        words = [self._word(rng) for _ in range(rng.randint(5, 20))]
+        return " ".join(words).capitalize() + "."
+
+    def _image(self, rng: random.Random) -> str:
+        options = rng.sample(IMAGE_OPTIONS, rng.randint(1, 3))
+        if rng.random() < 0.2:
+            # only options, no caption
+            return f"[[File:{self._word(rng).capitalize()}.png|{'|'.join(options)}]]"
+        caption = " ".join(self._sentence(rng) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            caption = self._link_words(caption, rng)
+        return f"[[File:{self._word(rng).capitalize()}.jpg|{'|'.join(options)}|{caption}]]"
+
+    def _link_words(self, text: str, rng: random.Random) -> str:
+        return " ".join(
+            f"[[{word}]]" if rng.random() < 0.1 and word[-1].isalpha() else word
+            for word in text.split(" ")
+        )
+
+    def _word(self, rng: random.Random) -> str:
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+
+def main(args: argparse.Namespace):
+    generator = CorpusGenerator(args.articles, match_rate=args.match_rate, seed=args.seed)
+    generator.write_all(args.output_dir, articles_per_file=args.articles_per_file)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from generate_corpora import CorpusGenerator
+from stand_ins import MockConnector, SQLiteDocumentParser
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(REPO_DIR, "parsing"))
+sys.path.append(os.path.join(REPO_DIR, "translation"))
+sys.path.append(os.path.join(REPO_DIR, "alignment"))
+sys.path.append(REPO_DIR)
+from URLFinder import URLFinder  # noqa: E402
+from TranslationHandler import TranslationHandler  # noqa: E402
+from find_unchanged import find_pendants, read_alignment_file, read_parsed_wiki  # noqa: E402
+from common.compressed_io import open_file  # noqa: E402
+
+STAGES = ["parse", "urls", "translate", "find_unchanged"]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--data-dir",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="directory with corpora created by generate_corpora.py. corpora are generated in "
+        + "--work-dir if omitted.",
+    )
+    parser.add_argument(
+        "-w",
+        "--work-dir",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="directory for the outputs of the stages (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "-n",
+        "--articles",
+        type=int,
+        default=2000,
+        metavar="INT",
+        help="number of articles of generated corpora (default: 2000)",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        metavar="INT",
+        help="process counts for the stages running in parallel (default: 1 2 4)",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="number of runs per measurement, the fastest run is reported (default: 1)",
+    )
+    parser.add_argument(
+        "-s",
+        "--stages",
+        type=str,
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help="the stages to run (default: all)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="output file for a json report of all measurements",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def bench_parse(data_dir: str, work_dir: str, n_processes: int, suffix: str = "") -> Dict[str, int]:
+    """
+    parses the simple medialab corpus and looks up all titles in the sqlite langlinks table. the
+    outputs are compressed if @param suffix is the extension of a compression format.
+    """
+    parser = SQLiteDocumentParser(
+        os.path.join(data_dir, "simple_docs"),
+        "en",
+        os.path.join(work_dir, "match.tsv" + suffix),
+        match_lang="de",
+        no_match_file=os.path.join(work_dir, "no_match.tsv" + suffix),
+        mysql_dict={"database": os.path.join(data_dir, "langlinks.sqlite")},
+        n_processes=n_processes,
+        verbose=0,
+    )
+    parser.parse_documents()
+    return parser.profiler.counters
+
+
+def bench_urls(data_dir: str, work_dir: str, n_processes: int, suffix: str = "") -> Dict[str, int]:
+    """
+    extracts the urls of the de medialab corpus and adds them to the parsed tsv.
+    """
+    finder = URLFinder(verbose=0)
+    finder.create_url_dict(os.path.join(data_dir, "de_docs"))
+    finder.add_url_column(
+        os.path.join(data_dir, "parsed.tsv" + suffix),
+        7,
+        os.path.join(work_dir, "parsed_urls.tsv" + suffix),
+    )
+    return {"articles": len(finder.url_dict), "sentences": len(finder.df)}
+
+
+def bench_translate(
+    data_dir: str, work_dir: str, n_processes: int, suffix: str = ""
+) -> Dict[str, int]:
+    """
+    translates the sentences of the parsed tsv with the mock connector.
+    """
+    handler = TranslationHandler(verbose=0)
+    handler.read_tsv(os.path.join(data_dir, "parsed.tsv" + suffix))
+    handler.translate_column(6, MockConnector(), "EN", "DE")
+    handler.add_translation_column(os.path.join(work_dir, "translated.tsv" + suffix))
+    return {"sentences": len(handler.translations)}
+
+
+def bench_find_unchanged(
+    data_dir: str, work_dir: str, n_processes: int, suffix: str = ""
+) -> Dict[str, int]:
+    """
+    finds the sentences of the alignment file in the parsed tsv.
+    """
+    parsed = read_parsed_wiki(os.path.join(data_dir, "parsed.tsv" + suffix))
+    alignments = read_alignment_file(os.path.join(data_dir, "alignments.tsv" + suffix))
+    df = find_pendants([parsed], [alignments], fuzzy=True)
+    with open_file(os.path.join(work_dir, "unchanged.tsv" + suffix), "w", newline="") as outfile:
+        df.to_csv(outfile, sep="\t", index=False, header=False)
+    return {"sentences": len(parsed), "alignments": len(alignments), "matches": len(df)}
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "parse": bench_parse,
+    "urls": bench_urls,
+    "translate": bench_translate,
+    "find_unchanged": bench_find_unchanged,
+}
+PARALLEL_STAGES = {"parse"}
+
+
+def measure(func: Callable, *args) -> Dict:
+    """
+    runs @param func in a forked process, so that its peak rss is not influenced by earlier
+    measurements. returns the run time, the counters returned by func and the peak rss of the
+    process and its worker processes.
+    """
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+
+    def target():
+        start = time.perf_counter()
+        counters = func(*args)
+        seconds = time.perf_counter() - start
+        queue.put(
+            {
+                "seconds": seconds,
+                "counters": dict(counters),
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "max_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                / 1024,
+            }
+        )
+
+    process = context.Process(target=target)
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_stage(stage: str, data_dir: str, work_dir: str, processes: List[int], repeat: int):
+    """
+    measures a stage (for every process count if it runs in parallel) and adds throughput and
+    scaling relative to the smallest process count.
+    """
+    results = []
+    for n_processes in processes if stage in PARALLEL_STAGES else [1]:
+        runs = [measure(BENCHMARKS[stage], data_dir, work_dir, n_processes) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run["seconds"])
+        best["processes"] = n_processes
+        best["throughput"] = {name: n / best["seconds"] for name, n in best["counters"].items()}
+        results.append(best)
+    for result in results:
+        result["speedup"] = results[0]["seconds"] / result["seconds"]
+        result["efficiency"] = result["speedup"] * results[0]["processes"] / result["processes"]
+    return results
+
+
+def print_results(stage: str, results: List[Dict]):
+    print(f"\n{stage}")
+    for result in results:
+        throughput = ", ".join(f"{n:.0f} {name}/s" for name, n in result["throughput"].items())
+        print(
+            f"  p={result['processes']:<3d} {result['seconds']:8.2f}s  "
+            + f"speedup {result['speedup']:5.2f}  efficiency {result['efficiency']:4.2f}  "
+            + f"rss {result['max_rss_mb']:.0f}MB (workers {result['max_rss_children_mb']:.0f}MB)"
+        )
+        print(f"        {throughput}")
+
+
+def main(args: argparse.Namespace):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="simplewiki_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(work_dir, "data")
+        print(f"Generating corpora with {args.articles} articles in {data_dir}...", file=sys.stderr)
+        CorpusGenerator(args.articles).write_all(data_dir)
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "data_dir": os.path.abspath(data_dir),
+        "stages": {},
+    }
+    for stage in args.stages:
+        results = run_stage(stage, data_dir, work_dir, args.processes, args.repeat)
+        report["stages"][stage] = results
+        print_results(stage, results)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as outfile:
+            json.dump(report, outfile, indent=2)
+            outfile.write("\n")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
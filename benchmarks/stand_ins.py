@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import os
+import sqlite3
+import sys
+import time
+
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "parsing"))
+from DocumentParser import DocumentParser  # noqa: E402
+
+
+class SQLiteDocumentParser(DocumentParser):
+    """
+    a DocumentParser looking up titles in a sqlite langlinks table (see generate_corpora.py)
+    instead of a mysql database. mysql_dict must contain the path to the database as "database".
+    """
+
+    LANGLINKS_QUERY = "SELECT * FROM langlinks WHERE ll_from = ? AND ll_lang = ?"
+
+    def _connect_langlinks(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.mysql_dict["database"])
+
+
+class MockConnector(object):
+    def __init__(self, latency: float = 0.0, chunk_size: int = 25):
+        """
+        a translation connector for offline benchmarks. sentences are "translated" by reversing their
+        words.
+
+        Args:
+        latency     simulated seconds per request.
+        chunk_size  the number of sentences per request (like the DeepLConnector).
+        """
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.n_requests = 0
+        self.n_sents = 0
+
+    def translate_sentences(
+        self, sents: List[str], source_lang: str, target_lang: str
+    ) -> List[str]:
+        for _ in range(0, len(sents), self.chunk_size):
+            self.n_requests += 1
+            if self.latency:
+                time.sleep(self.latency)
+        self.n_sents += len(sents)
+        return [" ".join(reversed(str(sent).split())) for sent in sents]
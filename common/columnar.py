@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import sys
+
+from typing import List, Optional, Sequence
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import open_file  # noqa: E402
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+CATEGORY_KEY = b"simplewiki.categorical_columns"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="A tsv file in the layout of the parsing output (can be compressed).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The output parquet file.",
+    )
+    parser.add_argument(
+        "--int-columns",
+        type=int,
+        nargs="*",
+        metavar="INT",
+        default=[0, 1, 2],
+        help="Indices of columns containing integer ids (default: article, section and sent id).",
+    )
+    parser.add_argument(
+        "--category-columns",
+        type=int,
+        nargs="*",
+        metavar="INT",
+        default=[3, 4, 5, 7, 8],
+        help="Indices of columns with many repeated values (URLs, article and section titles) "
+        + "that are loaded as categoricals.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        metavar="INT",
+        default=1000000,
+        help="The number of rows converted at once (one parquet row group per chunk).",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def is_columnar(path: str) -> bool:
+    """
+    checks whether a path points to a parquet file (by extension).
+    """
+    return path.lower().endswith(PARQUET_SUFFIXES)
+
+
+def convert_tsv(
+    input_file: str,
+    output_file: str,
+    int_columns: Sequence[int] = (0, 1, 2),
+    category_columns: Sequence[int] = (3, 4, 5, 7, 8),
+    chunksize: int = 1000000,
+) -> int:
+    """
+    converts a (quoted) tsv file without header into a parquet file. the first column (article id)
+    is stored as int64, all other @param int_columns as int32. string columns are dictionary encoded
+    on disk and the @param category_columns are loaded as pandas categoricals by read_table.
+
+    Args:
+        input_file:         the (compressed) tsv file to convert.
+        output_file:        the parquet output file.
+        int_columns:        indices of the columns containing integer ids.
+        category_columns:   indices of the columns to be loaded as categoricals.
+        chunksize:          the number of rows per row group.
+
+    Returns:
+        rows:               the number of rows written.
+    """
+    writer = None
+    schema = None
+    rows = 0
+    with open_file(input_file, "rb") as infile:
+        reader = pd.read_csv(
+            infile,
+            sep="\t",
+            quotechar='"',
+            header=None,
+            dtype=str,
+            keep_default_na=False,
+            na_values=[],
+            chunksize=chunksize,
+            encoding="utf8",
+        )
+        for chunk in reader:
+            for col in int_columns:
+                if col in chunk.columns:
+                    chunk[col] = chunk[col].astype("int64" if col == 0 else "int32")
+            chunk.columns = [str(col) for col in chunk.columns]
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                categorical = [str(col) for col in category_columns if str(col) in chunk.columns]
+                metadata = {**(table.schema.metadata or {}), CATEGORY_KEY: json.dumps(categorical)}
+                schema = table.schema.with_metadata(metadata)
+                table = table.replace_schema_metadata(metadata)
+                writer = pq.ParquetWriter(output_file, schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+def read_table(path: str, columns: Optional[List[int]] = None) -> pd.DataFrame:
+    """
+    reads a tsv or parquet file into a pd.DataFrame with integer column labels (as produced by
+    pd.read_csv with header=None). both formats return the same values: string cells are kept as
+    they are (empty cells and strings like "NA" or "null" are not converted to NaN), so the readers
+    match and translate the same rows for either format.
+
+    Args:
+        path:       a (compressed) tsv file or a parquet file created by convert_tsv.
+        columns:    optional list of column indices to load. all columns are loaded if omitted.
+
+    Returns:
+        df:         a pd.DataFrame containing the requested columns.
+    """
+    if not is_columnar(path):
+        with open_file(path, "rb") as infile:
+            return pd.read_csv(
+                infile,
+                sep="\t",
+                quotechar='"',
+                header=None,
+                usecols=columns,
+                keep_default_na=False,
+                na_values=[],
+                encoding="utf8",
+            )
+    names = None if columns is None else [str(col) for col in columns]
+    metadata = pq.read_schema(path).metadata or {}
+    categorical = json.loads(metadata.get(CATEGORY_KEY, b"[]"))
+    read_dictionary = [col for col in categorical if names is None or col in names]
+    table = pq.read_table(path, columns=names, read_dictionary=read_dictionary or None)
+    df = table.to_pandas()
+    df.columns = [int(col) for col in df.columns]
+    return df
+
+
+def main(args: argparse.Namespace):
+    rows = convert_tsv(
+        args.input,
+        args.output,
+        int_columns=args.int_columns,
+        category_columns=args.category_columns,
+        chunksize=args.chunksize,
+    )
+    sys.stderr.write(f"Converted {rows} rows from {args.input} to {args.output}.\n")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+
+from functools import lru_cache
+from typing import IO, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compression formats by file extension
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bzip2", ".zst": "zstd", ".xz": "xz"}
+
+# command line tools in order of preference, the first one installed is used. the multi-threaded
+# tools come first, the others still (de)compress in a separate process while python reads or
+# writes the data.
+COMMANDS = {
+    "gzip": [["pigz", "-p", "{threads}"], ["gzip"]],
+    "bzip2": [["lbzip2", "-n", "{threads}"], ["pbzip2", "-p{threads}"], ["bzip2"]],
+    "zstd": [["zstd", "-q", "-T{threads}"]],
+    "xz": [["xz", "-T{threads}"]],
+}
+
+BUFFER_SIZE = 1 << 20
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The input file (decompressed if it ends in .gz, .bz2, .zst or .xz).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The output file (compressed if it ends in .gz, .bz2, .zst or .xz).",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="The number of compression threads (default: all available cores).",
+    )
+    parser.add_argument(
+        "-l",
+        "--level",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="The compression level (default: the default level of the format).",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def compression_of(path: str) -> Optional[str]:
+    """
+    returns the compression format of a file by its extension, or None for uncompressed files.
+    """
+    return COMPRESSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def is_compressed(path: str) -> bool:
+    """
+    checks whether a file is read and written compressed (by extension).
+    """
+    return compression_of(path) is not None
+
+
+def default_threads() -> int:
+    """
+    returns the number of cores available to this process.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def find_command(compression: str) -> Optional[List[str]]:
+    """
+    returns the command line template of the preferred installed tool for a compression format,
+    or None if none of them is installed.
+    """
+    for command in COMMANDS[compression]:
+        if shutil.which(command[0]) is not None:
+            return command
+    return None
+
+
+def is_supported(compression: str) -> bool:
+    """
+    checks whether files of a compression format can be read and written (zstd requires the zstd
+    command or the zstandard module, the other formats are supported by the standard library).
+    """
+    return compression != "zstd" or find_command(compression) is not None or zstandard is not None
+
+
+class PipeIO(io.RawIOBase):
+    def __init__(self, command: List[str], path: str, mode: str):
+        """
+        reads the output of a decompression command or writes to the input of a compression
+        command running in a child process. errors of the command are raised as OSError at the end
+        of the file (reading) or when closing (writing).
+
+        Args:
+        command     the command line of the tool without the file.
+        path        the compressed file.
+        mode        "r" (the file is decompressed by the command), "w" or "a" (the output of the
+                        command is written to or appended to the file).
+        """
+        super().__init__()
+        self.name = path
+        self.command = command
+        self._reading = mode == "r"
+        self._position = 0
+        self._eof = False
+        if self._reading:
+            self._process = subprocess.Popen(command + [path], stdout=subprocess.PIPE, bufsize=0)
+            self._pipe = self._process.stdout
+        else:
+            with open(path, mode + "b") as outfile:
+                self._process = subprocess.Popen(
+                    command, stdin=subprocess.PIPE, stdout=outfile, bufsize=0
+                )
+            self._pipe = self._process.stdin
+
+    def readable(self) -> bool:
+        return self._reading
+
+    def writable(self) -> bool:
+        return not self._reading
+
+    def fileno(self) -> int:
+        return self._pipe.fileno()
+
+    def tell(self) -> int:
+        """
+        returns the number of uncompressed bytes read or written so far.
+        """
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        n_read = self._pipe.readinto(buffer)
+        self._position += n_read
+        if n_read == 0 and not self._eof:
+            self._eof = True
+            self._check(self._process.wait())
+        return n_read
+
+    def write(self, data) -> int:
+        n_written = self._pipe.write(data)
+        self._position += n_written
+        return n_written
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self._pipe.close()
+        returncode = self._process.wait()
+        # a reader closed before the end of the file terminates the command with SIGPIPE
+        if not self._reading or self._eof:
+            self._check(returncode)
+
+    def _check(self, returncode: int):
+        if returncode != 0:
+            raise OSError(
+                f"{' '.join(self.command)} failed on {self.name} (exit status {returncode})."
+            )
+
+
+class ModuleIO(io.RawIOBase):
+    def __init__(self, stream: IO, path: str, mode: str):
+        """
+        wraps a compressed file object of a python module (gzip, bz2, lzma or zstandard) with the
+        interface of PipeIO, so that all compressed files have a name and count uncompressed bytes
+        with tell().
+
+        Args:
+        stream      the file object of the module.
+        path        the compressed file.
+        mode        "r", "w" or "a".
+        """
+        super().__init__()
+        self.name = path
+        self._stream = stream
+        self._reading = mode == "r"
+        self._position = 0
+
+    def readable(self) -> bool:
+        return self._reading
+
+    def writable(self) -> bool:
+        return not self._reading
+
+    def tell(self) -> int:
+        """
+        returns the number of uncompressed bytes read or written so far.
+        """
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        n_read = self._stream.readinto(buffer)
+        self._position += n_read
+        return n_read
+
+    def write(self, data) -> int:
+        n_written = self._stream.write(data)
+        self._position += n_written
+        return n_written
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self._stream.close()
+
+
+def _open_compressed(
+    path: str, mode: str, compression: str, threads: Optional[int], level: Optional[int]
+) -> IO:
+    """
+    opens a compressed file for reading or writing bytes, with a command line tool if one is
+    installed and the python module of the format otherwise.
+    """
+    threads = threads or default_threads()
+    command = find_command(compression)
+    if command is not None:
+        command = [arg.format(threads=threads) for arg in command]
+        if mode == "r":
+            return PipeIO(command + ["-d", "-c"], path, mode)
+        return PipeIO(command + ["-c"] + ([f"-{level}"] if level is not None else []), path, mode)
+    return ModuleIO(_open_module(path, mode, compression, threads, level), path, mode)
+
+
+def _open_module(path: str, mode: str, compression: str, threads: int, level: Optional[int]) -> IO:
+    """
+    opens a compressed file with the python module of the format.
+    """
+    kwargs = {}
+    if compression == "gzip":
+        if level is not None and mode != "r":
+            kwargs["compresslevel"] = level
+        return gzip.open(path, mode + "b", **kwargs)
+    if compression == "bzip2":
+        if level is not None and mode != "r":
+            kwargs["compresslevel"] = level
+        return bz2.open(path, mode + "b", **kwargs)
+    if compression == "xz":
+        if mode != "r":
+            kwargs["preset"] = level
+        return lzma.open(path, mode + "b", **kwargs)
+    if zstandard is None:
+        raise ValueError(
+            f"Reading or writing {path} requires the zstd command or zstandard module."
+        )
+    if mode != "r":
+        kwargs["cctx"] = zstandard.ZstdCompressor(
+            level=level if level is not None else 3, threads=threads
+        )
+    return zstandard.open(path, mode + "b", **kwargs)
+
+
+def open_file(
+    path: str,
+    mode: str = "r",
+    encoding: str = "utf8",
+    newline: Optional[str] = None,
+    threads: Optional[int] = None,
+    level: Optional[int] = None,
+    buffer_size: int = BUFFER_SIZE,
+) -> IO:
+    """
+    opens a file like open() with a large buffer. files ending in .gz, .bz2, .zst or .xz are
+    decompressed while reading and compressed while writing (appending adds a compressed stream,
+    which is read like a single one). the positions of compressed files (tell()) count
+    uncompressed bytes and they cannot be seeked.
+
+    Args:
+        path:           the file to open.
+        mode:           "r", "w" or "a", with "b" for binary files.
+        encoding:       the encoding of text files.
+        newline:        the newline handling of text files (see open()).
+        threads:        the number of threads of multi-threaded compression tools (default: all
+                        available cores).
+        level:          the compression level (default: the default level of the format).
+        buffer_size:    the size of the read and write buffer in bytes.
+
+    Returns:
+        file:           a binary or text file object.
+    """
+    binary = "b" in mode
+    kind = mode.replace("b", "").replace("t", "")
+    assert kind in ("r", "w", "a"), f"Unsupported mode {mode}."
+    compression = compression_of(path)
+    if compression is None:
+        if binary:
+            return open(path, mode, buffering=buffer_size)
+        return open(path, mode, buffering=buffer_size, encoding=encoding, newline=newline)
+    raw = _open_compressed(path, kind, compression, threads, level)
+    if kind == "r":
+        buffered = io.BufferedReader(raw, buffer_size)
+    else:
+        buffered = io.BufferedWriter(raw, buffer_size)
+    if binary:
+        return buffered
+    return io.TextIOWrapper(buffered, encoding=encoding, newline=newline)
+
+
+def main(args: argparse.Namespace):
+    with open_file(args.input, "rb") as infile:
+        with open_file(args.output, "wb", threads=args.threads, level=args.level) as outfile:
+            shutil.copyfileobj(infile, outfile, BUFFER_SIZE)
+    sys.stderr.write(f"Copied {args.input} to {args.output}.\n")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator
+
+
+def bounded_imap(pool, func: Callable, iterable: Iterable, max_pending: int) -> Iterator[Any]:
+    """
+    like pool.imap, but only consumes the input iterable while fewer than @param max_pending
+    tasks are submitted and not yet returned. the results are yielded in input order, so
+    arbitrarily long streams can be processed with bounded memory.
+
+    Args:
+        pool:           a (pathos) multiprocessing pool.
+        func:           the function applied to every item.
+        iterable:       the input items.
+        max_pending:    the maximum number of submitted tasks without returned result.
+
+    Yields:
+        result:         the results of func in the order of the input items.
+    """
+    pending = deque()
+    for item in iterable:
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (item,)))
+    while pending:
+        yield pending.popleft().get()
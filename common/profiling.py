@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+
+def add_profiling_args(parser: argparse.ArgumentParser):
+    """
+    adds the arguments --profile, --cprofile and --tracemalloc to an argument parser.
+    """
+    parser.add_argument(
+        "--profile",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Output file for a json report with stage timings, counters and peak memory.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="Profile the main process with cProfile (requires --profile). The stats are written "
+        + "to <PATH>.prof and the slowest functions are added to the report.",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Trace memory allocations of the main process (requires --profile).",
+    )
+
+
+class Profiler(object):
+    def __init__(self, name: str = "", cprofile: bool = False, trace_memory: bool = False):
+        """
+        collects named stage timers and counters of a run. worker processes use their own
+        Profiler and return its summary(), which is merged into the Profiler of the main process.
+
+        Args:
+        name            the name of the run (e.g. the script name).
+        cprofile        profile the process with cProfile between start() and stop().
+        trace_memory    trace memory allocations with tracemalloc between start() and stop().
+        """
+        self.name = name
+        self.cprofile = cprofile
+        self.trace_memory = trace_memory
+        self.timers: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.workers: Dict[str, Dict[str, float]] = {}
+        self.started = None
+        self.wall_seconds = None
+        self._start_time = None
+        self._profile = None
+        self._memory = None
+
+    def __getstate__(self) -> Dict:
+        # profilers are pickled together with objects sent to worker processes, where a
+        # cProfile.Profile can not be restored
+        return {**self.__dict__, "_profile": None}
+
+    @classmethod
+    def from_args(cls, name: str, args: argparse.Namespace) -> "Profiler":
+        """
+        creates a Profiler from the arguments added by add_profiling_args.
+        """
+        return cls(
+            name,
+            cprofile=args.profile is not None and args.cprofile,
+            trace_memory=args.profile is not None and args.tracemalloc,
+        )
+
+    def start(self) -> "Profiler":
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._start_time = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            self._memory = {
+                "peak_mb": tracemalloc.get_traced_memory()[1] / 2**20,
+                "top": [
+                    {"location": str(stat.traceback), "size_mb": stat.size / 2**20}
+                    for stat in snapshot.statistics("lineno")[:20]
+                ],
+            }
+            tracemalloc.stop()
+        self.wall_seconds = time.perf_counter() - self._start_time
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        times the enclosed block and adds the duration to the timer @param name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        timer = self.timers.setdefault(name, {"seconds": 0.0, "calls": 0})
+        timer["seconds"] += seconds
+        timer["calls"] += calls
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_busy_time(self, seconds: float, tasks: int = 1, worker: Optional[str] = None):
+        """
+        adds the time a worker process (by default the current process) spent on tasks, to
+        measure the load balance between the workers.
+        """
+        busy = self.workers.setdefault(worker or str(os.getpid()), {"seconds": 0.0, "tasks": 0})
+        busy["seconds"] += seconds
+        busy["tasks"] += tasks
+
+    def summary(self) -> Dict:
+        """
+        returns the timers and counters (e.g. to be returned by a worker process).
+        """
+        return {"timers": self.timers, "counters": self.counters, "workers": self.workers}
+
+    def merge(self, summary: Dict):
+        """
+        adds the timers and counters of a summary() to this Profiler.
+        """
+        for name, timer in summary["timers"].items():
+            self.add_time(name, timer["seconds"], timer["calls"])
+        for name, n in summary["counters"].items():
+            self.count(name, n)
+        for worker, busy in summary.get("workers", {}).items():
+            self.add_busy_time(busy["seconds"], busy["tasks"], worker)
+
+    def load_balance(self) -> Optional[Dict]:
+        """
+        returns the busy time of every worker process and the imbalance (the maximum divided by
+        the mean busy time, 1 for a perfectly balanced run), or None without worker times.
+        """
+        if not self.workers:
+            return None
+        seconds = [busy["seconds"] for busy in self.workers.values()]
+        mean = sum(seconds) / len(seconds)
+        return {
+            "workers": self.workers,
+            "min_seconds": min(seconds),
+            "max_seconds": max(seconds),
+            "mean_seconds": mean,
+            "imbalance": max(seconds) / mean if mean else 1.0,
+        }
+
+    def report(self, stats_path: Optional[str] = None) -> Dict:
+        """
+        returns the report of a stopped run. stage times of worker processes are summed, their
+        share of the wall time can exceed 1 when running in parallel.
+        """
+        report = {
+            "name": self.name,
+            "started": self.started,
+            "wall_seconds": self.wall_seconds,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "max_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+            "stages": {
+                name: {**timer, "share": timer["seconds"] / self.wall_seconds}
+                for name, timer in sorted(
+                    self.timers.items(), key=lambda item: item[1]["seconds"], reverse=True
+                )
+            },
+            "counters": self.counters,
+            "throughput": {
+                name: n / self.wall_seconds
+                for name, n in self.counters.items()
+                if self.wall_seconds
+            },
+        }
+        if self.workers:
+            report["load_balance"] = self.load_balance()
+        if self._memory is not None:
+            report["tracemalloc"] = self._memory
+        if self._profile is not None:
+            if stats_path is not None:
+                self._profile.dump_stats(stats_path)
+            report["cprofile"] = {"stats_file": stats_path, "top": self._top_functions()}
+        return report
+
+    def write_report(self, path: str):
+        """
+        stops the run (if necessary) and writes the report as json. cProfile stats are written to
+        <path>.prof.
+        """
+        if self.wall_seconds is None:
+            self.stop()
+        with open(path, "w", encoding="utf8") as outfile:
+            json.dump(self.report(stats_path=path + ".prof"), outfile, indent=2)
+            outfile.write("\n")
+        print(f"INFO:\tProfiling report written to {path}.", file=sys.stderr)
+
+    def _top_functions(self, n: int = 25):
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+        return [
+            {
+                "function": f"{filename}:{line}({function})",
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+            for (filename, line, function), (_, calls, tottime, cumtime, _) in rows
+        ]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from typing import Any, Dict, List, Optional
+
+ENTRY_FILE = "entry.json"
+OBJECT_FILE = "object.pkl"
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def add_cache_args(parser: argparse.ArgumentParser):
+    """
+    adds the arguments --cache-dir, --cache-size and --cache-hash to an argument parser.
+    """
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Directory for cached stage outputs. Stages whose parameters and inputs have not "
+        + "changed since a cached run are skipped and their outputs are copied from the cache.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=str,
+        metavar="SIZE",
+        default="20G",
+        help="The maximum size of the cache directory (e.g. 500M, 20G). The least recently used "
+        + "entries are removed when it is exceeded. (default: 20G)",
+    )
+    parser.add_argument(
+        "--cache-hash",
+        action="store_true",
+        help="Identify inputs by a hash of their content instead of their path, size and "
+        + "modification time.",
+    )
+
+
+def parse_size(size: str) -> int:
+    """
+    parses a size with an optional unit (K, M, G, T) into bytes.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*", str(size).upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """
+    returns the blake2b hash of the content of a file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as infile:
+        for block in iter(lambda: infile.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache(object):
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = parse_size("20G"),
+        hash_inputs: bool = False,
+        verbose: int = 1,
+    ):
+        """
+        a content-addressed cache for the outputs of the stages of the data acquisition (output
+        files or picklable objects). entries are keyed by the stage name, the stage parameters and
+        fingerprints of the input files, so a stage is only skipped if it would produce the same
+        outputs again.
+
+        entries are stored in @param cache_dir/<key[:2]>/<key>/. reading an entry updates its
+        modification time, the least recently used entries are removed when the cache exceeds
+        @param max_bytes.
+
+        Args:
+        cache_dir       the cache directory (created if it does not exist).
+        max_bytes       the maximum size of all entries in bytes.
+        hash_inputs     fingerprint inputs by a hash of their content. otherwise the path, size
+                            and modification time of the inputs are used.
+        verbose         the verbosity level.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hash_inputs = hash_inputs
+        self.verbose = verbose
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> Optional["StageCache"]:
+        """
+        creates a StageCache from the arguments added by add_cache_args, or returns None if no
+        cache directory has been provided.
+        """
+        if args.cache_dir is None:
+            return None
+        return cls(
+            args.cache_dir,
+            max_bytes=parse_size(args.cache_size),
+            hash_inputs=args.cache_hash,
+            verbose=getattr(args, "verbose", 1),
+        )
+
+    def key(self, stage: str, params: Dict[str, Any], inputs: List[Optional[str]]) -> str:
+        """
+        returns the cache key of a stage run.
+
+        Args:
+        stage       the name of the stage.
+        params      the parameters of the stage which influence its outputs (must be json
+                        serializable).
+        inputs      the input files or directories of the stage. None entries are ignored.
+        """
+        description = {
+            "stage": stage,
+            "params": params,
+            "inputs": [self.fingerprint(path) for path in inputs if path is not None],
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode("utf8")
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def fingerprint(self, path: str) -> List:
+        """
+        returns the fingerprint of an input file or of all files in an input directory.
+        """
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.relpath(os.path.join(root, file), path)
+                for root, _, dir_files in os.walk(path)
+                for file in dir_files
+            )
+        else:
+            files = [""]
+        fingerprints = []
+        for file in files:
+            file_path = os.path.join(path, file) if file else path
+            if self.hash_inputs:
+                fingerprints.append([file, file_hash(file_path)])
+            else:
+                stat = os.stat(file_path)
+                fingerprints.append([file, stat.st_size, stat.st_mtime_ns])
+        # without hashing, the fingerprint is only unique together with the path
+        return fingerprints if self.hash_inputs else [os.path.abspath(path), fingerprints]
+
+    def restore(self, key: str, outputs: List[str]) -> bool:
+        """
+        copies the cached output files of @param key to @param outputs. returns False if there is
+        no entry for the key.
+        """
+        entry_dir = self._find_entry(key)
+        if entry_dir is None:
+            return False
+        for i, output in enumerate(outputs):
+            shutil.copyfile(os.path.join(entry_dir, f"output_{i}"), output)
+        self._debug(f"Restored {len(outputs)} output file(s) from the cache ({key}).")
+        return True
+
+    def store(self, key: str, outputs: List[str], stage: str = ""):
+        """
+        copies the output files of a stage run into the cache.
+        """
+
+        def write(entry_dir: str):
+            for i, output in enumerate(outputs):
+                shutil.copyfile(output, os.path.join(entry_dir, f"output_{i}"))
+
+        self._add_entry(key, stage, write)
+
+    def load(self, key: str) -> Optional[Any]:
+        """
+        returns the cached object of @param key, or None if there is no entry for the key.
+        """
+        entry_dir = self._find_entry(key)
+        if entry_dir is None:
+            return None
+        with open(os.path.join(entry_dir, OBJECT_FILE), "rb") as infile:
+            obj = pickle.load(infile)
+        self._debug(f"Loaded the output from the cache ({key}).", level=2)
+        return obj
+
+    def save(self, key: str, obj: Any, stage: str = ""):
+        """
+        stores a picklable object as the output of a stage run.
+        """
+
+        def write(entry_dir: str):
+            with open(os.path.join(entry_dir, OBJECT_FILE), "wb") as outfile:
+                pickle.dump(obj, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._add_entry(key, stage, write)
+
+    def _find_entry(self, key: str) -> Optional[str]:
+        entry_dir = os.path.join(self.cache_dir, key[:2], key)
+        if not os.path.exists(os.path.join(entry_dir, ENTRY_FILE)):
+            self._debug(f"No cached output found ({key}).")
+            return None
+        # the modification time of the entry is its last use
+        os.utime(entry_dir)
+        return entry_dir
+
+    def _add_entry(self, key: str, stage: str, write):
+        """
+        writes an entry into a temporary directory (with @param write) and moves it to its place in
+        the cache, so that interrupted runs never leave incomplete entries.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+        try:
+            write(tmp_dir)
+            size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+            if size > self.max_bytes:
+                self._debug(
+                    f"The output ({size} bytes) exceeds the cache size and is not cached.",
+                    prefix="WARNING:\t",
+                )
+                return
+            with open(os.path.join(tmp_dir, ENTRY_FILE), "w", encoding="utf8") as outfile:
+                json.dump({"stage": stage, "size": size, "created": time.time()}, outfile)
+            self._evict(self.max_bytes - size)
+            entry_dir = os.path.join(self.cache_dir, key[:2], key)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.rename(tmp_dir, entry_dir)
+            self._debug(f"Cached the output of {stage or 'the stage'} ({key}, {size} bytes).")
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+    def _evict(self, max_bytes: int):
+        """
+        removes the least recently used entries until all entries fit into @param max_bytes.
+        """
+        entries = []
+        for prefix in os.scandir(self.cache_dir):
+            if not prefix.is_dir() or prefix.name.startswith("."):
+                continue
+            for entry in os.scandir(prefix.path):
+                try:
+                    with open(os.path.join(entry.path, ENTRY_FILE), encoding="utf8") as infile:
+                        size = json.load(infile)["size"]
+                except (OSError, ValueError, KeyError):
+                    # removed by another process or incomplete
+                    continue
+                entries.append((entry.stat().st_mtime, size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self._debug(f"Removed the least recently used cache entry {os.path.basename(path)}.")
+
+    def _debug(
+        self,
+        message: str,
+        level: int = 1,
+        prefix: str = "INFO:\t",
+        spacing: str = "",
+        end_spacing: str = "",
+    ):
+        """
+        prints debug messages according to the verbosity level.
+        """
+        if self.verbose >= level:
+            output = sys.stderr if not self.verbose > 50 else sys.stdout
+            print(spacing + prefix + message + end_spacing, file=output)
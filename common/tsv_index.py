@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import mmap
+import numpy as np
+import os
+import sys
+
+from typing import List, Optional, Tuple
+
+INDEX_SUFFIX = ".idx.npz"
+BLOCK_SIZE = 1 << 22
+NEWLINE, TAB = ord("\n"), ord("\t")
+INDEX_DTYPE = np.dtype(
+    [
+        ("article_id", "<i8"),
+        ("section_id", "<i8"),
+        ("offset", "<i8"),
+        ("length", "<i8"),
+        ("n_lines", "<i8"),
+    ]
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "tsv",
+        nargs="+",
+        type=str,
+        metavar="PATH",
+        help="One or more parsed tsv files to index.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    args = parser.parse_args()
+    return args
+
+
+class TSVIndex(object):
+    """
+    an index over a parsed tsv file (article id and section id in the first two columns) mapping
+    every article and section to its position in the file. the index is kept sorted by article id
+    and stored next to the tsv file, where it is reused as long as size and mtime of the tsv file
+    do not change.
+
+    lookups return (byte_offset, n_bytes, n_lines) spans. rows of an article are assumed to be
+    contiguous in the tsv file (as in the output of parse_documents.py).
+    """
+
+    def __init__(self, tsv_path: str, verbose: int = 1):
+        """
+        Args:
+        tsv_path    the tsv file to index.
+        verbose     the verbosity level.
+        """
+        self.tsv_path = tsv_path
+        self.index_path = tsv_path + INDEX_SUFFIX
+        self.verbose = verbose
+        self.entries = None
+        self.article_ids = None
+
+    def load(self) -> "TSVIndex":
+        """
+        loads the index stored next to the tsv file or (re)builds it if it is missing or stale.
+        """
+        stat = os.stat(self.tsv_path)
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path) as stored:
+                if (
+                    int(stored["source_size"]) == stat.st_size
+                    and int(stored["source_mtime_ns"]) == stat.st_mtime_ns
+                ):
+                    self._set_entries(stored["entries"])
+                    self._debug(f"Loaded index {self.index_path}.")
+                    return self
+            self._debug(f"Index {self.index_path} is stale, rebuilding...")
+        self.build()
+        self.save(stat)
+        return self
+
+    def build(self, block_size: int = BLOCK_SIZE):
+        """
+        scans the tsv file once and creates one index entry for every run of lines with the same
+        article and section id. the file is scanned in blocks of whole lines with numpy: the
+        lines are split at the newlines, runs start where the bytes of the first two columns
+        differ from the previous line, and only the ids of the first line of every run are
+        decoded.
+
+        Args:
+        block_size  the approximate number of bytes scanned at once.
+        """
+        self._debug(f"Indexing {self.tsv_path}...")
+        run_offsets, run_lines, article_ids, section_ids = [], [], [], []
+        size = os.path.getsize(self.tsv_path)
+        n_lines = 0
+        if size:
+            with open(self.tsv_path, "rb") as infile:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    data = np.frombuffer(mm, dtype=np.uint8)
+                    last_key = None
+                    start = 0
+                    while start < size:
+                        # the block is extended to the end of its last line
+                        stop = size
+                        if start + block_size < size:
+                            stop = mm.find(b"\n", start + block_size - 1) + 1 or size
+                        line_starts, first_lines, block_articles, block_sections, last_key = (
+                            self._scan_block(data[start:stop], last_key)
+                        )
+                        run_offsets.append(line_starts[first_lines] + start)
+                        run_lines.append(first_lines + n_lines)
+                        article_ids.extend(block_articles)
+                        section_ids.extend(block_sections)
+                        n_lines += len(line_starts)
+                        start = stop
+                    # the array has to be released before the mmap is closed
+                    del data
+        offsets = np.concatenate(run_offsets) if run_offsets else np.empty(0, dtype=np.int64)
+        lines = np.concatenate(run_lines) if run_lines else np.empty(0, dtype=np.int64)
+        article_ids = np.array(article_ids, dtype=np.int64)
+        section_ids = np.array(section_ids, dtype=np.int64)
+        # runs whose ids only differ in their spelling (e.g. "01" and "1") are merged
+        keep = np.ones(len(offsets), dtype=bool)
+        keep[1:] = (article_ids[1:] != article_ids[:-1]) | (section_ids[1:] != section_ids[:-1])
+        offsets, lines = offsets[keep], lines[keep]
+        entries = np.empty(len(offsets), dtype=INDEX_DTYPE)
+        entries["article_id"] = article_ids[keep]
+        entries["section_id"] = section_ids[keep]
+        entries["offset"] = offsets
+        entries["length"] = np.diff(offsets, append=size)
+        entries["n_lines"] = np.diff(lines, append=n_lines)
+        self._set_entries(np.sort(entries, order=["article_id", "offset"]))
+        self._debug(
+            f"Indexed {len(np.unique(self.article_ids))} articles ({len(entries)} sections)."
+        )
+
+    def _scan_block(
+        self, block: np.ndarray, last_key: Optional[bytes]
+    ) -> Tuple[np.ndarray, np.ndarray, List[int], List[int], bytes]:
+        """
+        finds the runs of lines with the same first two columns in a block of whole lines.
+
+        Args:
+        block       the bytes of the lines.
+        last_key    the first two columns of the last line of the previous block.
+
+        Returns:
+        line_starts the byte offsets of all lines in the block.
+        first_lines the indices of the first lines of the runs.
+        article_ids the article ids of the runs.
+        section_ids the section ids of the runs.
+        last_key    the first two columns of the last line of the block.
+        """
+        newlines = np.flatnonzero(block == NEWLINE)
+        line_starts = np.concatenate(([0], newlines + 1))
+        line_starts = line_starts[line_starts < len(block)]
+        line_ends = np.append(newlines, len(block))[: len(line_starts)]
+        tabs = np.flatnonzero(block == TAB)
+        first_tab_idx = np.searchsorted(tabs, line_starts)
+        if first_tab_idx[-1] + 1 >= len(tabs):
+            raise ValueError(f"{self.tsv_path}: a line has less than three columns.")
+        first_tabs, second_tabs = tabs[first_tab_idx], tabs[first_tab_idx + 1]
+        if np.any(second_tabs >= line_ends):
+            raise ValueError(f"{self.tsv_path}: a line has less than three columns.")
+        # runs start where the first two columns differ in length or in a byte from the previous
+        # line. the columns are compared one byte position at a time (positions after the
+        # second tab are clipped to it).
+        key_lengths = second_tabs - line_starts
+        is_first = np.empty(len(line_starts), dtype=bool)
+        is_first[0] = block[line_starts[0] : second_tabs[0]].tobytes() != last_key
+        is_first[1:] = key_lengths[1:] != key_lengths[:-1]
+        for position in range(int(key_lengths.max())):
+            key_bytes = block[np.minimum(line_starts + position, second_tabs)]
+            is_first[1:] |= key_bytes[1:] != key_bytes[:-1]
+        first_lines = np.flatnonzero(is_first)
+        article_ids = [int(block[line_starts[i] : first_tabs[i]].tobytes()) for i in first_lines]
+        section_ids = [
+            int(block[first_tabs[i] + 1 : second_tabs[i]].tobytes()) for i in first_lines
+        ]
+        last_key = block[line_starts[-1] : second_tabs[-1]].tobytes()
+        return line_starts, first_lines, article_ids, section_ids, last_key
+
+    def save(self, stat: os.stat_result = None):
+        """
+        stores the index next to the tsv file together with the size and mtime of the tsv file.
+        """
+        stat = stat if stat is not None else os.stat(self.tsv_path)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as outfile:
+            np.savez(
+                outfile,
+                entries=self.entries,
+                source_size=np.int64(stat.st_size),
+                source_mtime_ns=np.int64(stat.st_mtime_ns),
+            )
+        os.replace(tmp_path, self.index_path)
+
+    def article_span(self, article_id: int) -> Optional[Tuple[int, int, int]]:
+        """
+        returns (byte_offset, n_bytes, n_lines) of an article or None if it is not in the index.
+        """
+        lo, hi = self._article_range(article_id)
+        if lo == hi:
+            return None
+        first, last = self.entries[lo], self.entries[hi - 1]
+        n_bytes = int(last["offset"] + last["length"] - first["offset"])
+        return int(first["offset"]), n_bytes, int(self.entries["n_lines"][lo:hi].sum())
+
+    def section_span(self, article_id: int, section_id: int) -> Optional[Tuple[int, int, int]]:
+        """
+        returns (byte_offset, n_bytes, n_lines) of a section or None if it is not in the index.
+        """
+        lo, hi = self._article_range(article_id)
+        for entry in self.entries[lo:hi]:
+            if entry["section_id"] == section_id:
+                return int(entry["offset"]), int(entry["length"]), int(entry["n_lines"])
+        return None
+
+    def read_lines(self, span: Tuple[int, int, int]) -> List[str]:
+        """
+        reads the lines of an article or section span from the tsv file.
+        """
+        with open(self.tsv_path, "rb") as infile:
+            infile.seek(span[0])
+            return infile.read(span[1]).decode("utf8").splitlines()
+
+    def __contains__(self, article_id: int) -> bool:
+        lo, hi = self._article_range(article_id)
+        return lo != hi
+
+    def __getitem__(self, article_id: int) -> Tuple[int, int]:
+        """
+        returns (byte_offset, n_lines) of an article like the former map_tsv dicts.
+        """
+        span = self.article_span(article_id)
+        if span is None:
+            raise KeyError(article_id)
+        return span[0], span[2]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _article_range(self, article_id: int) -> Tuple[int, int]:
+        lo = int(np.searchsorted(self.article_ids, article_id, side="left"))
+        hi = int(np.searchsorted(self.article_ids, article_id, side="right"))
+        return lo, hi
+
+    def _set_entries(self, entries: np.ndarray):
+        self.entries = entries
+        self.article_ids = entries["article_id"]
+
+    def _debug(
+        self,
+        message: str,
+        level: int = 1,
+        prefix: str = "INFO:\t",
+        spacing: str = "",
+        end_spacing: str = "",
+    ):
+        """
+        prints debug messages according to the verbosity level.
+        """
+        if self.verbose >= level:
+            output = sys.stderr if not self.verbose > 50 else sys.stdout
+            print(spacing + prefix + message + end_spacing, file=output)
+
+
+def main(args: argparse.Namespace):
+    for path in args.tsv:
+        TSVIndex(path, verbose=args.verbose).load()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import os
+import sys
+import tempfile
+
+from typing import List
+
+from compressed_io import (
+    COMPRESSIONS,
+    compression_of,
+    find_command,
+    is_compressed,
+    is_supported,
+    open_file,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        "--lines",
+        type=int,
+        metavar="INT",
+        default=100000,
+        help="The number of lines of the test file.",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def tool_of(path: str) -> str:
+    command = find_command(compression_of(path))
+    return command[0] if command is not None else "python"
+
+
+def write_file(path: str, lines: List[str]):
+    """
+    writes the first half of the lines like a script and appends the second half like the
+    BlockWriter of DocumentParser (binary appends at the position reported by tell()).
+    """
+    half = len(lines) // 2
+    with open_file(path, "w") as outfile:
+        outfile.writelines(lines[:half])
+    with open_file(path, "ab") as outfile:
+        assert is_compressed(outfile.name), f"{path}: the stream has no compressed name."
+        assert outfile.tell() == 0, f"{path}: an appended stream starts at {outfile.tell()}."
+        data = "".join(lines[half:]).encode("utf8")
+        outfile.write(data)
+        assert outfile.tell() == len(data), f"{path}: tell() returns {outfile.tell()}."
+
+
+def read_file(path: str) -> List[str]:
+    with open_file(path, "r") as infile:
+        assert infile.buffer.name == path, f"{path}: the stream is named {infile.buffer.name}."
+        return list(infile)
+
+
+def set_path(path: str):
+    """
+    changes the PATH in which the command line tools are searched (the python modules are used
+    if none is found).
+    """
+    os.environ["PATH"] = path
+    find_command.cache_clear()
+
+
+def check(path: str, lines: List[str]) -> int:
+    """
+    returns 1 (an error) if the file is not read back identically and 0 otherwise.
+    """
+    if read_file(path) != lines:
+        print(f"ERROR: {os.path.basename(path)} is not read back identically with {tool_of(path)}.")
+        return 1
+    return 0
+
+
+def main(args: argparse.Namespace):
+    lines = [f"{i}\tline {i} ä\n" for i in range(args.lines)]
+    suffixes = [suffix for suffix in COMPRESSIONS if is_supported(compression_of("file" + suffix))]
+    errors = 0
+    path = os.environ.get("PATH", "")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tools, python = [], []
+        for suffix in suffixes:
+            tools.append(os.path.join(tmp_dir, "tools" + suffix))
+            write_file(tools[-1], lines)
+            errors += check(tools[-1], lines)
+        # the files written by the tools are read with the modules and the other way round
+        set_path(tempfile.mkdtemp(prefix="empty_path_", dir=tmp_dir))
+        for suffix, tools_file in zip(suffixes, tools):
+            if not is_supported(compression_of(tools_file)):
+                print(f"Skipping {suffix} without the tools: zstandard is not installed.")
+                continue
+            python.append(os.path.join(tmp_dir, "python" + suffix))
+            write_file(python[-1], lines)
+            errors += check(python[-1], lines) + check(tools_file, lines)
+        set_path(path)
+        for python_file in python:
+            errors += check(python_file, lines)
+    if errors:
+        sys.exit(1)
+    print(
+        f"OK: {args.lines} lines round-trip in {len(tools)} formats with the tools and in "
+        + f"{len(python)} formats with the python modules."
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
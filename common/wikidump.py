@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import bz2
+import io
+import os
+import sys
+
+from lxml import etree
+from typing import IO, Iterator, List, NamedTuple, Tuple, Union
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import open_file  # noqa: E402
+
+
+class Page(NamedTuple):
+    page_id: str
+    ns: str
+    title: str
+    text: str
+
+
+def open_dump(path: str) -> IO:
+    """
+    opens a wikipedia xml dump for binary reading. compressed dumps (e.g. .bz2) are decompressed on
+    the fly, with a parallel decompressor if one is installed (see compressed_io.py).
+    """
+    return open_file(path, "rb")
+
+
+def iter_pages(source: Union[str, IO]) -> Iterator[Page]:
+    """
+    iterates over the pages of a wikipedia xml dump with constant memory. every page element is
+    cleared (and removed from the tree) after it has been read.
+
+    Args:
+        source:     the path to a .xml or compressed (e.g. .xml.bz2) dump or a binary file object.
+
+    Yields:
+        page:       a Page with id, namespace, title and wikitext of the latest revision.
+    """
+    infile = open_dump(source) if isinstance(source, str) else source
+    try:
+        for _, elem in etree.iterparse(infile, events=("end",), tag="{*}page"):
+            yield Page(
+                elem.findtext("{*}id"),
+                elem.findtext("{*}ns"),
+                elem.findtext("{*}title"),
+                elem.findtext("{*}revision/{*}text") or "",
+            )
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    finally:
+        if isinstance(source, str):
+            infile.close()
+
+
+def read_url_base(source: str) -> str:
+    """
+    reads the base url of a wiki from the siteinfo of a dump (e.g. https://simple.wikipedia.org/wiki)
+    to create article urls of the form <base>?curid=<id> like the WikiExtractor.
+    """
+    with open_dump(source) as infile:
+        for _, elem in etree.iterparse(infile, events=("end",), tag="{*}base"):
+            return elem.text[: elem.text.rfind("/")]
+    raise ValueError(f"No <base> element found in the siteinfo of {source}.")
+
+
+def read_multistream_ranges(dump_path: str, index_path: str) -> List[Tuple[int, int]]:
+    """
+    reads the index of a multistream dump (lines of the form offset:page_id:title) and returns the
+    byte ranges of all bz2 streams containing pages, in the order of the dump.
+
+    Args:
+        dump_path:  the path to the pages-articles-multistream.xml.bz2 dump.
+        index_path: the path to the corresponding multistream index (.txt or .txt.bz2).
+
+    Returns:
+        ranges:     a list of (start, end) byte offsets.
+    """
+    offsets = set()
+    with open_file(index_path) as infile:
+        for line in infile:
+            offsets.add(int(line.split(":", 1)[0]))
+    offsets = sorted(offsets) + [os.path.getsize(dump_path)]
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def iter_stream_pages(dump_path: str, start: int, end: int) -> Iterator[Page]:
+    """
+    decompresses the bz2 stream(s) between two byte offsets of a multistream dump and iterates
+    over the pages they contain.
+    """
+    with open(dump_path, "rb") as infile:
+        infile.seek(start)
+        data = bz2.decompress(infile.read(end - start))
+    # streams contain bare <page> elements, the last one is followed by the closing root tag
+    data = b"<pages>" + data.replace(b"</mediawiki>", b"") + b"</pages>"
+    return iter_pages(io.BytesIO(data))
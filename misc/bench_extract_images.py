@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import csv
+import io
+import re
+import sys
+import time
+
+from typing import Callable, IO, List
+
+from extract_images import extract_images_from_xml_dump
+
+# benchmarks extract_images.py against the original character-by-character implementation.
+# a reproducible synthetic dump is written by ../benchmarks/generate_corpora.py
+# (pages-articles.xml), a recorded sample of a real dump can be created with e.g.:
+# bzcat simplewiki-latest-pages-articles.xml.bz2 | head -n 500000 > sample.xml
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        required=True,
+        metavar="PATH",
+        help="recorded sample of an xml dump",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        metavar="INT",
+        help="number of runs per implementation, the fastest run is reported (default: 3)",
+    )
+    parser.add_argument(
+        "-n-neighbors",
+        type=int,
+        default=10,
+        help="number of neighboring lines to search for sentences (default: 10)",
+    )
+    args = parser.parse_args()
+    return args
+
+
+class ReferenceFileWindow(object):
+    """
+    the original list based FileWindow.
+    """
+
+    def __init__(self, infile: IO, window_size: int = 10):
+        self.__infile = infile
+        self.__window_size = window_size
+        self.window = [None for _ in range(2 * self.__window_size + 1)]
+        for n, line in enumerate(self.__infile):
+            self.window[self.__window_size + n] = line
+            if n == self.__window_size:
+                break
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.window[self.__window_size] is None:
+            prev = self.window[: self.__window_size]
+            curr = self.window[self.__window_size]
+            later = self.window[self.__window_size + 1 :]
+            self.window.pop(0)
+            try:
+                self.window.append(next(self.__infile))
+            except StopIteration:
+                self.window.append(None)
+            return prev, curr, later
+        else:
+            raise StopIteration
+
+
+def reference_extract_images_from_xml_dump(infile: IO, outfile: IO, neighboring_lines: int = 10):
+    """
+    the original extraction loop.
+    """
+    writer = csv.writer(outfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
+    url_prefix = "https://simple.wikipedia.org/wiki/"
+    current_id = ""
+    current_article = ""
+    current_section = ""
+    last_line = ""
+    for before, line, after in ReferenceFileWindow(infile, neighboring_lines):
+        line = line.strip()
+        if line.startswith("<title>") and last_line == "<page>":
+            current_article = line[7:-8]
+            current_section = "Summary"
+        if line.startswith("<id>") and last_line.startswith("<ns>"):
+            current_id = line[4:-5]
+        elif line.startswith("== "):
+            current_section = line[3:-3]
+        elif "[[File:" in line:
+            filename = re.search(r"\[\[((?:File|Image):[^|]*)", line).group(1)
+            rest = re.search(r"\[\[(?:File|Image):[^|]*(.*$)", line).group(1)
+            caption = reference_clean_caption(reference_extract_caption(rest))
+            if caption:
+                sents_before = "\n".join(reference_find_neighboring_sents(before, "previous"))
+                sents_after = "\n".join(reference_find_neighboring_sents(after, "later"))
+                writer.writerow(
+                    [
+                        current_id,
+                        current_article,
+                        current_section,
+                        url_prefix + filename,
+                        caption,
+                        sents_before,
+                        sents_after,
+                    ]
+                )
+        last_line = line
+
+
+def reference_find_neighboring_sents(lines: List[str], mode: str = "previous") -> List[str]:
+    length = len(lines)
+    pos = length - 1 if mode == "previous" else 0
+    sents = []
+    while (mode == "previous" and pos != -1) or (mode == "later" and pos != length):
+        if lines[pos] is None:
+            break
+        line = lines[pos].strip()
+        if line.startswith("== ") or line.startswith("<"):
+            break
+        if reference_valid_line(line):
+            sents.append(line.replace("[", "").replace("]", ""))
+        pos = pos - 1 if mode == "previous" else pos + 1
+    return sents[::-1] if mode == "previous" else sents
+
+
+def reference_valid_line(line: str) -> bool:
+    if line:
+        invalid_starts = ["|", "=", "[", "]", "<", ">", "{", "}", "**", "*"]
+        for elem in invalid_starts:
+            if line.startswith(elem):
+                return False
+        return True
+    return False
+
+
+def reference_extract_caption(line: str) -> str:
+    brackets = 2
+    curr_field = ""
+    for char in line:
+        if char == "]":
+            brackets -= 1
+            if brackets == 0:
+                return curr_field
+        elif char == "[":
+            brackets += 1
+        elif char == "|":
+            curr_field = ""
+        else:
+            curr_field += char
+    return ""
+
+
+def reference_clean_caption(caption: str) -> str:
+    non_captions = ["px", "thumb", "frameless", "center", "left", "right"]
+    for ending in non_captions:
+        if caption.endswith(ending):
+            return ""
+    return caption.replace("[", "").replace("]", "")
+
+
+def run(extract: Callable, lines: List[str], neighboring_lines: int, repeat: int):
+    """
+    runs an extraction function on the sample and returns the csv output and the fastest run time.
+    """
+    best = None
+    for _ in range(repeat):
+        outfile = io.StringIO()
+        start = time.perf_counter()
+        extract(iter(lines), outfile, neighboring_lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return outfile.getvalue(), best
+
+
+def main(args: argparse.Namespace):
+    with open(args.input, encoding="utf8") as infile:
+        lines = infile.readlines()
+    reference_csv, reference_time = run(
+        reference_extract_images_from_xml_dump, lines, args.n_neighbors, args.repeat
+    )
+    current_csv, current_time = run(
+        extract_images_from_xml_dump, lines, args.n_neighbors, args.repeat
+    )
+    identical = reference_csv.encode("utf8") == current_csv.encode("utf8")
+    print(f"lines:\t\t{len(lines)}")
+    print(f"reference:\t{reference_time:.3f}s")
+    print(f"current:\t{current_time:.3f}s")
+    print(f"speedup:\t{reference_time / current_time:.2f}x")
+    print(f"identical:\t{identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -1,9 +1,19 @@
 import argparse
 import csv
+import io
+import json
+import mmap
 import os
+import pathos.multiprocessing as mp
 import re
 import sys
-from typing import Dict, IO, Tuple
+import tarfile
+from typing import Dict, IO, Iterator, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import is_compressed, open_file  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.tsv_index import TSVIndex  # noqa: E402
 
 
 def parse_args():  # python3 create_parallel_docs.py --simple-tsv simplede_all.tsv --de-tsv de.tsv --out-dir my_out
@@ -23,50 +33,42 @@ def parse_args():  # python3 create_parallel_docs.py --simple-tsv simplede_all.t
     parser.add_argument(
         "--out-dir", type=str, metavar="PATH", help="output directory for article pairs"
     )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="number of worker processes writing article pairs (default: 1, serial mode)",
+    )
+    parser.add_argument(
+        "--shard-format",
+        type=str,
+        choices=["tar", "jsonl"],
+        default=None,
+        help="pack article pairs into shard files instead of writing two files per pair "
+        + "(parallel mode only)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        metavar="INT",
+        default=1000,
+        help="number of article pairs handled per worker task and written to each shard (default: 1000)",
+    )
+    parser.add_argument(
+        "--output-stream",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="write all article pairs as jsonl records into a single stream instead of --out-dir "
+        + "(compressed if PATH ends with .gz, .bz2, .zst or .xz, '-' for stdout)",
+    )
+    add_profiling_args(parser)
     args = parser.parse_args()
     return args
 
 
-def map_tsv(tsv_file: IO) -> Dict[int, Tuple[int, int]]:
-    """
-    creates a dict mapping article ids to the position in the file where the article starts
-    and the number of lines the article contains.
-    """
-    sys.stderr.write("Mapping articles to lines in the de tsv file...\n")
-    last_id = None
-    document_start = 0
-    current_line = 0
-    mapping_dict = dict()
-    article_length = 0
-    mapped_articles = 0
-
-    line = tsv_file.readline()
-    while line:
-        article_id = int(line.split("\t")[0])
-        # new article begins
-        if article_id != last_id:
-            if last_id is None:
-                mapping_dict[article_id] = (document_start, article_length)
-            else:
-                mapping_dict[last_id] = (document_start, article_length)
-            document_start = current_line
-            article_length = 0
-            last_id = article_id
-            mapped_articles += 1
-
-            if mapped_articles % 100000 == 0:
-                sys.stderr.write(f"Mapped {mapped_articles} de articles...\n")
-
-        article_length += 1
-        current_line = tsv_file.tell()
-        line = tsv_file.readline()
-
-    mapping_dict[last_id] = (document_start, article_length)
-
-    sys.stderr.write(f"Done, mapped {len(mapping_dict)} unique articles to lines.\n")
-    return mapping_dict
-
-
 def write_de_article(start: int, n_lines: int, tsv_file: IO, output_path: str):
     """
     writes the de article to the specified file.
@@ -88,11 +90,10 @@ def write_de_article(start: int, n_lines: int, tsv_file: IO, output_path: str):
             outfile.write(line["de_sent"] + "\n")
 
 
-def create_doc_pairs(
-    simple_tsv: IO, de_tsv: IO, lookup_dict: Dict[int, Tuple[int, int]], output_dir: str
-):
+def create_doc_pairs(simple_tsv: IO, de_tsv: IO, lookup_dict: TSVIndex, output_dir: str):
     """
-    creates parallel document pairs with unique indices
+    creates parallel document pairs with unique indices. @param lookup_dict maps de article ids
+    to the position in @param de_tsv where the article starts and the number of lines it contains.
     """
     sys.stderr.write("Creating output documents...\n")
     id_regex = re.compile(r".*wiki\?curid=(\d+)")
@@ -161,9 +162,241 @@ def create_doc_pairs(
     sys.stderr.write(f"Done, created {completed} output documents.\n")
 
 
+ArticleSpan = Tuple[int, int, int]
+ArticlePair = Tuple[str, str, ArticleSpan, ArticleSpan]
+
+# read-only memory maps of the tsv files, opened once per worker process
+_worker_mmaps: Dict[str, mmap.mmap] = {}
+
+
+def collect_article_pairs(simple_index: TSVIndex, de_index: TSVIndex) -> List[ArticlePair]:
+    """
+    collects the simple articles with a matching de article in the order of the simple tsv.
+    returns tuples of (simple article id, de article id, simple span, de span).
+    """
+    sys.stderr.write("Collecting article pairs...\n")
+    id_regex = re.compile(r".*wiki\?curid=(\d+)")
+    article_ids = sorted(
+        {int(article_id) for article_id in simple_index.article_ids},
+        key=lambda article_id: simple_index.article_span(article_id)[0],
+    )
+    pairs = []
+    with open(simple_index.tsv_path, "rb") as infile:
+        for article_id in article_ids:
+            simple_span = simple_index.article_span(article_id)
+            infile.seek(simple_span[0])
+            first_line = next(csv.reader([infile.readline().decode("utf8")], delimiter="\t"))
+            # no exact match (see https://github.com/nicolasspring/simplewiki_project/blob/master/parsing/README.md#output)
+            if first_line[8] == "NOT_FOUND":
+                continue
+            de_article_id = int(id_regex.findall(first_line[8])[0])
+            de_span = de_index.article_span(de_article_id)
+            if de_span is not None:
+                pairs.append((str(article_id), str(de_article_id), simple_span, de_span))
+    sys.stderr.write(f"Found {len(pairs)} article pairs.\n")
+    return pairs
+
+
+def read_article_column(tsv_path: str, span: ArticleSpan, column: int) -> List[str]:
+    """
+    reads one column of all lines in an article span using the worker's memory map of the file.
+    """
+    if tsv_path not in _worker_mmaps:
+        with open(tsv_path, "rb") as infile:
+            _worker_mmaps[tsv_path] = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    data = _worker_mmaps[tsv_path][span[0] : span[0] + span[1]].decode("utf8")
+    return [line[column] for line in csv.reader(io.StringIO(data), delimiter="\t")]
+
+
+def pair_record(simple_id: str, de_id: str, simpde_lines: List[str], de_lines: List[str]) -> str:
+    """
+    serializes an article pair as a jsonl record.
+    """
+    record = {"simple_id": simple_id, "de_id": de_id, "simpde": simpde_lines, "de": de_lines}
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def read_pair_slice(simple_path: str, de_path: str, pairs: List[ArticlePair]) -> str:
+    """
+    reads a slice of article pairs and returns their concatenated jsonl records.
+    """
+    records = []
+    for simple_id, de_id, simple_span, de_span in pairs:
+        simpde_lines = read_article_column(simple_path, simple_span, 9)
+        de_lines = read_article_column(de_path, de_span, 6)
+        records.append(pair_record(simple_id, de_id, simpde_lines, de_lines))
+    return "".join(records)
+
+
+def open_pair_stream(path: str, mode: str) -> IO:
+    """
+    opens a jsonl stream of article pairs. paths ending with .gz, .bz2, .zst or .xz are
+    (de)compressed (see compressed_io.py), '-' refers to stdin or stdout.
+    """
+    if path == "-":
+        return open(
+            (sys.stdin if "r" in mode else sys.stdout).fileno(),
+            mode,
+            encoding="utf8",
+            closefd=False,
+        )
+    return open_file(path, mode)
+
+
+def iter_doc_pairs(path: str) -> Iterator[Dict]:
+    """
+    iterates over the article pairs in a stream written with --output-stream. every pair is a dict
+    with the keys simple_id, de_id, simpde (list of sentences) and de (list of sentences).
+    """
+    with open_pair_stream(path, "rt") as stream:
+        for line in stream:
+            yield json.loads(line)
+
+
+def write_pair_slice(
+    simple_path: str,
+    de_path: str,
+    pairs: List[ArticlePair],
+    output_dir: str,
+    shard_format: str = None,
+    shard_index: int = 0,
+) -> int:
+    """
+    writes a slice of article pairs either as two files per pair or into a single shard file.
+    """
+    if shard_format == "tar":
+        shard = tarfile.open(os.path.join(output_dir, f"pairs.{shard_index:05d}.tar"), "w")
+    elif shard_format == "jsonl":
+        shard = open(
+            os.path.join(output_dir, f"pairs.{shard_index:05d}.jsonl"), "w", encoding="utf8"
+        )
+    for simple_id, de_id, simple_span, de_span in pairs:
+        simpde_lines = read_article_column(simple_path, simple_span, 9)
+        de_lines = read_article_column(de_path, de_span, 6)
+        prefix = simple_id + "_" + de_id
+        if shard_format == "tar":
+            for extension, lines in ((".simpde", simpde_lines), (".de", de_lines)):
+                data = "".join(line + "\n" for line in lines).encode("utf8")
+                info = tarfile.TarInfo(prefix + extension)
+                info.size = len(data)
+                shard.addfile(info, io.BytesIO(data))
+        elif shard_format == "jsonl":
+            shard.write(pair_record(simple_id, de_id, simpde_lines, de_lines))
+        else:
+            for extension, lines in ((".simpde", simpde_lines), (".de", de_lines)):
+                with open(
+                    os.path.join(output_dir, prefix + extension), "w", encoding="utf8"
+                ) as outfile:
+                    for line in lines:
+                        outfile.write(line + "\n")
+    if shard_format is not None:
+        shard.close()
+    return len(pairs)
+
+
+def create_doc_pairs_parallel(
+    simple_path: str,
+    de_path: str,
+    output_dir: str,
+    n_processes: int,
+    shard_format: str = None,
+    shard_size: int = 1000,
+    profiler: Profiler = None,
+):
+    """
+    creates parallel document pairs with worker processes. every task is a slice of
+    @param shard_size article pairs, workers read both tsv files through their own memory maps.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    with profiler.stage("index"):
+        simple_index = TSVIndex(simple_path).load()
+        de_index = TSVIndex(de_path).load()
+    with profiler.stage("collect pairs"):
+        pairs = collect_article_pairs(simple_index, de_index)
+    slices = [pairs[i : i + shard_size] for i in range(0, len(pairs), shard_size)]
+    sys.stderr.write(f"Creating output documents in {len(slices)} slices...\n")
+    completed = 0
+    slices_done = 0
+    with profiler.stage("write"), mp.Pool(processes=n_processes) as pool:
+        tasks = [
+            (simple_path, de_path, pair_slice, output_dir, shard_format, i)
+            for i, pair_slice in enumerate(slices)
+        ]
+        for done in pool.imap_unordered(lambda task: write_pair_slice(*task), tasks):
+            completed += done
+            slices_done += 1
+            if slices_done % 100 == 0:
+                sys.stderr.write(f"Completed {completed} simpde articles...\n")
+    profiler.count("article pairs", completed)
+    sys.stderr.write(f"Done, created {completed} output documents.\n")
+
+
+def stream_doc_pairs(
+    simple_path: str,
+    de_path: str,
+    output_stream: str,
+    n_processes: int,
+    shard_size: int = 1000,
+    profiler: Profiler = None,
+):
+    """
+    writes all article pairs as jsonl records into a single (compressed) stream in the order of
+    the simple tsv. slices of @param shard_size pairs are read by worker processes.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    with profiler.stage("index"):
+        simple_index = TSVIndex(simple_path).load()
+        de_index = TSVIndex(de_path).load()
+    with profiler.stage("collect pairs"):
+        pairs = collect_article_pairs(simple_index, de_index)
+    slices = [pairs[i : i + shard_size] for i in range(0, len(pairs), shard_size)]
+    sys.stderr.write(f"Streaming article pairs to {output_stream}...\n")
+    completed = 0
+    with profiler.stage("write"), mp.Pool(processes=n_processes) as pool, open_pair_stream(
+        output_stream, "wt"
+    ) as outfile:
+        tasks = [(simple_path, de_path, pair_slice) for pair_slice in slices]
+        for i, records in enumerate(pool.imap(lambda task: read_pair_slice(*task), tasks)):
+            outfile.write(records)
+            completed += len(slices[i])
+            if (i + 1) % 100 == 0:
+                sys.stderr.write(f"Completed {completed} simpde articles...\n")
+    profiler.count("article pairs", completed)
+    sys.stderr.write(f"Done, streamed {completed} article pairs.\n")
+
+
 def main(args: argparse.Namespace):
-    de_lines = map_tsv(args.de_tsv)
-    create_doc_pairs(args.simple_tsv, args.de_tsv, de_lines, os.path.abspath(args.out_dir))
+    assert not is_compressed(args.simple_tsv.name) and not is_compressed(args.de_tsv.name), (
+        "The articles are read from the tsv files at the byte offsets of their index. "
+        + "Please decompress the tsv files."
+    )
+    profiler = Profiler.from_args("create_parallel_docs", args).start()
+    if args.output_stream is not None:
+        stream_doc_pairs(
+            args.simple_tsv.name,
+            args.de_tsv.name,
+            args.output_stream,
+            args.processes,
+            shard_size=args.shard_size,
+            profiler=profiler,
+        )
+    elif args.processes > 1 or args.shard_format is not None:
+        create_doc_pairs_parallel(
+            args.simple_tsv.name,
+            args.de_tsv.name,
+            os.path.abspath(args.out_dir),
+            args.processes,
+            shard_format=args.shard_format,
+            shard_size=args.shard_size,
+            profiler=profiler,
+        )
+    else:
+        with profiler.stage("index"):
+            de_lines = TSVIndex(args.de_tsv.name).load()
+        with profiler.stage("write"):
+            create_doc_pairs(args.simple_tsv, args.de_tsv, de_lines, os.path.abspath(args.out_dir))
+    if args.profile:
+        profiler.write_report(args.profile)
 
 
 if __name__ == "__main__":
@@ -4,10 +4,23 @@
 
 import argparse
 import csv
+import os
+import pathos.multiprocessing as mp
 import re
 import sys
 
-from typing import List, IO
+from itertools import islice
+from typing import Iterator, List, IO, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import open_file  # noqa: E402
+from common.wikidump import iter_pages, iter_stream_pages, read_multistream_ranges  # noqa: E402
+
+IMAGE_REGEX = re.compile(r"\[\[((?:File|Image):[^|]*)(.*)$")
+CAPTION_DELIMITER_REGEX = re.compile(r"[][|]")
+INVALID_STARTS = ("|", "=", "[", "]", "<", ">", "{", "}", "*")
+SECTION_BORDERS = ("== ", "<")
+NON_CAPTIONS = ("px", "thumb", "frameless", "center", "left", "right")
 
 
 def parse_args() -> argparse.Namespace:
@@ -15,18 +28,43 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "-i",
         "--input",
-        type=argparse.FileType("r"),
-        help="input file (default: stdin)",
-        default=sys.stdin,
+        type=str,
+        help="input file (default: stdin), decompressed if PATH ends with .gz, .bz2, .zst or .xz",
+        default=None,
         metavar="PATH",
     )
     parser.add_argument(
         "-o",
         "--output",
-        type=argparse.FileType("w"),
-        help="output file (default: stdout)",
-        default=sys.stdout,
+        type=str,
+        help="output file (default: stdout), compressed if PATH ends with .gz, .bz2, .zst or .xz",
+        default=None,
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "-d",
+        "--dump",
+        type=str,
+        default=None,
         metavar="PATH",
+        help="xml dump (.xml, .xml.bz2 or otherwise compressed) parsed page by page with a streaming xml parser "
+        + "instead of reading --input line by line",
+    )
+    parser.add_argument(
+        "--multistream-index",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="index of a multistream --dump. the bz2 streams are decompressed and processed "
+        + "in parallel",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=mp.cpu_count(),
+        metavar="INT",
+        help="number of processes for --multistream-index (default: number of cpus)",
     )
     parser.add_argument(
         "-n-neighbors",
@@ -48,6 +86,8 @@ class FileWindow(object):
         the window is being padded with None at the beginning and end of the file.
     """
 
+    COMPACT_EVERY = 4096
+
     def __init__(self, infile: IO, window_size: int = 10):
         """
         infile          file to loop over
@@ -58,29 +98,50 @@ class FileWindow(object):
         self.__initialize_window()
 
     def __initialize_window(self):
-        self.window = [None for _ in range(2 * self.__window_size + 1)]
-        for n, line in enumerate(self.__infile):
-            self.window[self.__window_size + n] = line
-            if n == self.__window_size:
-                break
+        # the buffer is a list which only grows at the end and is compacted every COMPACT_EVERY
+        # lines: advancing the window does not shift all lines like list.pop(0), and unlike a
+        # bounded deque, the neighboring lines are plain slices
+        self.window = [None] * self.__window_size
+        self.window.extend(islice(self.__infile, self.__window_size + 1))
+        self.window.extend([None] * (2 * self.__window_size + 1 - len(self.window)))
+        self.__pos = self.__window_size
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        if not self.window[self.__window_size] is None:
-            prev = self.window[: self.__window_size]
-            curr = self.window[self.__window_size]
-            later = self.window[self.__window_size + 1 :]
-            self.window.pop(0)
-            try:
-                self.window.append(next(self.__infile))
-            except StopIteration:
-                self.window.append(None)
+        curr = self.window[self.__pos]
+        if curr is not None:
+            prev, later = self.before(), self.after()
+            self.__advance()
             return prev, curr, later
         else:
             raise StopIteration
 
+    def lines(self) -> Iterator[str]:
+        """
+        iterates over the lines only. the neighboring lines of the line that was yielded last can
+        be requested with before() and after(), so they are only copied when needed.
+        """
+        curr = self.window[self.__pos]
+        while curr is not None:
+            yield curr
+            self.__advance()
+            curr = self.window[self.__pos]
+
+    def before(self) -> List[str]:
+        return self.window[self.__pos - self.__window_size : self.__pos]
+
+    def after(self) -> List[str]:
+        return self.window[self.__pos + 1 : self.__pos + self.__window_size + 1]
+
+    def __advance(self):
+        self.window.append(next(self.__infile, None))
+        self.__pos += 1
+        if self.__pos > self.COMPACT_EVERY:
+            del self.window[: self.__pos - self.__window_size]
+            self.__pos = self.__window_size
+
 
 def extract_images_from_xml_dump(infile: IO, outfile: IO, neighboring_lines: int = 10):
     """
@@ -97,7 +158,8 @@ def extract_images_from_xml_dump(infile: IO, outfile: IO, neighboring_lines: int
     current_article = ""
     current_section = ""
     last_line = ""
-    for before, line, after in FileWindow(infile, neighboring_lines):
+    window = FileWindow(infile, neighboring_lines)
+    for line in window.lines():
         line = line.strip()
         # beginning of a new article
         if line.startswith("<title>") and last_line == "<page>":
@@ -111,12 +173,9 @@ def extract_images_from_xml_dump(infile: IO, outfile: IO, neighboring_lines: int
             current_section = line[3:-3]
         # images
         elif "[[File:" in line:
-            filename = re.search(r"\[\[((?:File|Image):[^|]*)", line).group(1)
-            rest = re.search(r"\[\[(?:File|Image):[^|]*(.*$)", line).group(1)
-            caption = clean_caption(extract_caption(rest))
-            if caption:
-                sents_before = "\n".join(find_neighboring_sents_in_section(before, "previous"))
-                sents_after = "\n".join(find_neighboring_sents_in_section(after, "later"))
+            image = extract_image(line, window.before(), window.after())
+            if image:
+                filename, caption, sents_before, sents_after = image
                 writer.writerow(
                     [
                         current_id,
@@ -131,6 +190,131 @@ def extract_images_from_xml_dump(infile: IO, outfile: IO, neighboring_lines: int
         last_line = line
 
 
+def extract_images_from_pages(dump_path: str, outfile: IO, neighboring_lines: int = 10):
+    """
+    extracts article titles, links and image captions for all image in a Wikipedia dump XML file.
+    the dump (optionally bz2 compressed) is parsed page by page with a streaming xml parser, so
+    only the current page is held in memory.
+
+    Args:
+        dump_path           path to the xml (or xml.bz2) dump
+        outfile             csv output file
+        neighboring_lines   max number of neighboring lines to an image to search for text
+    """
+    writer = csv.writer(outfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
+    for page in iter_pages(dump_path):
+        writer.writerows(
+            extract_images_from_page(page.page_id, page.title, page.text, neighboring_lines)
+        )
+
+
+def extract_images_from_multistream(
+    dump_path: str,
+    index_path: str,
+    outfile: IO,
+    neighboring_lines: int = 10,
+    n_processes: int = mp.cpu_count(),
+):
+    """
+    extracts article titles, links and image captions for all image in a multistream Wikipedia
+    dump. the independent bz2 streams listed in the multistream index are decompressed and
+    processed by a pool of worker processes, the rows are written in the order of the dump.
+
+    Args:
+        dump_path           path to the pages-articles-multistream.xml.bz2 dump
+        index_path          path to the multistream index of the dump
+        outfile             csv output file
+        neighboring_lines   max number of neighboring lines to an image to search for text
+        n_processes         number of worker processes
+    """
+    writer = csv.writer(outfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_NONNUMERIC)
+    ranges = read_multistream_ranges(dump_path, index_path)
+    sys.stderr.write(f"Processing {len(ranges)} streams with {n_processes} processes...\n")
+    tasks = [(dump_path, start, end, neighboring_lines) for start, end in ranges]
+    with mp.Pool(processes=n_processes) as pool:
+        for rows in pool.imap(lambda task: extract_images_from_stream(*task), tasks):
+            writer.writerows(rows)
+
+
+def extract_images_from_stream(
+    dump_path: str, start: int, end: int, neighboring_lines: int = 10
+) -> List[List[str]]:
+    """
+    extracts the csv rows for all pages in a single bz2 stream of a multistream dump.
+    """
+    rows = []
+    for page in iter_stream_pages(dump_path, start, end):
+        rows += extract_images_from_page(page.page_id, page.title, page.text, neighboring_lines)
+    return rows
+
+
+def extract_images_from_page(
+    page_id: str, title: str, text: str, neighboring_lines: int = 10
+) -> List[List[str]]:
+    """
+    extracts the csv rows for all images with a caption in the wikitext of a single page.
+
+    Args:
+        page_id             the id of the page
+        title               the title of the page
+        text                the wikitext of the page
+        neighboring_lines   max number of neighboring lines to an image to search for text
+
+    Returns:
+        rows                a list of csv rows
+    """
+    url_prefix = "https://simple.wikipedia.org/wiki/"
+    current_section = "Summary"
+    rows = []
+    window = FileWindow(iter(text.split("\n")), neighboring_lines)
+    for line in window.lines():
+        line = line.strip()
+        # beginning of a new section
+        if line.startswith("== "):
+            current_section = line[3:-3]
+        # images
+        elif "[[File:" in line:
+            image = extract_image(line, window.before(), window.after())
+            if image:
+                filename, caption, sents_before, sents_after = image
+                rows.append(
+                    [
+                        page_id,
+                        title,
+                        current_section,
+                        url_prefix + filename,
+                        caption,
+                        sents_before,
+                        sents_after,
+                    ]
+                )
+    return rows
+
+
+def extract_image(
+    line: str, before: List[str], after: List[str]
+) -> Optional[Tuple[str, str, str, str]]:
+    """
+    extracts file name, caption and neighboring sentences of an image in a line.
+
+    Args:
+        line    a line containing an image
+        before  the lines before @param line
+        after   the lines after @param line
+
+    Returns:
+                a tuple (filename, caption, sents before, sents after) or None if the image has
+                no caption
+    """
+    filename, rest = IMAGE_REGEX.search(line).groups()
+    caption = clean_caption(extract_caption(rest))
+    if not caption:
+        return None
+    sents_before = "\n".join(find_neighboring_sents_in_section(before, "previous"))
+    sents_after = "\n".join(find_neighboring_sents_in_section(after, "later"))
+    return filename, caption, sents_before, sents_after
+
+
 def find_neighboring_sents_in_section(lines: List[str], mode: str = "previous") -> List[str]:
     """
     finds text sentences that still belong to the same section in the article. argument
@@ -154,7 +338,7 @@ def find_neighboring_sents_in_section(lines: List[str], mode: str = "previous")
             break
         line = lines[pos].strip()
         # section marker or beginning of article
-        if line.startswith("== ") or line.startswith("<"):
+        if line.startswith(SECTION_BORDERS):
             break
         if valid_line(line):
             sents.append(line.replace("[", "").replace("]", ""))
@@ -169,13 +353,7 @@ def valid_line(line: str) -> bool:
     Returns:
             whether or not the input is a valid line
     """
-    if line:
-        invalid_starts = ["|", "=", "[", "]", "<", ">", "{", "}", "**", "*"]
-        for elem in invalid_starts:
-            if line.startswith(elem):
-                return False
-        return True
-    return False
+    return bool(line) and not line.startswith(INVALID_STARTS)
 
 
 def extract_caption(line: str) -> str:
@@ -188,19 +366,26 @@ def extract_caption(line: str) -> str:
     Returns:
                 the last field
     """
+    # fast path: no nested brackets before the closing brackets of the image
+    end = line.find("]]")
+    if end != -1 and line.find("[", 0, end) == -1 and line.find("]", 0, end) == -1:
+        return line[line.rfind("|", 0, end) + 1 : end]
     brackets = 2
-    curr_field = ""
-    for char in line:
+    field_parts = []
+    pos = 0
+    # only brackets and field separators change the state, the text in between is copied at once
+    for delimiter in CAPTION_DELIMITER_REGEX.finditer(line):
+        char = delimiter.group()
+        field_parts.append(line[pos : delimiter.start()])
+        pos = delimiter.end()
         if char == "]":
             brackets -= 1
             if brackets == 0:
-                return curr_field
+                return "".join(field_parts)
         elif char == "[":
             brackets += 1
-        elif char == "|":
-            curr_field = ""
         else:
-            curr_field += char
+            field_parts = []
     return ""
 
 
@@ -215,15 +400,28 @@ def clean_caption(caption: str) -> str:
     Returns:
                     the cleaned caption
     """
-    non_captions = ["px", "thumb", "frameless", "center", "left", "right"]
-    for ending in non_captions:
-        if caption.endswith(ending):
-            return ""
+    if caption.endswith(NON_CAPTIONS):
+        return ""
     return caption.replace("[", "").replace("]", "")
 
 
 def main(args: argparse.Namespace):
-    extract_images_from_xml_dump(args.input, args.output, args.n_neighbors)
+    outfile = open_file(args.output, "w") if args.output is not None else sys.stdout
+    try:
+        if args.multistream_index is not None:
+            extract_images_from_multistream(
+                args.dump, args.multistream_index, outfile, args.n_neighbors, args.processes
+            )
+        elif args.dump is not None:
+            extract_images_from_pages(args.dump, outfile, args.n_neighbors)
+        elif args.input is not None:
+            with open_file(args.input) as infile:
+                extract_images_from_xml_dump(infile, outfile, args.n_neighbors)
+        else:
+            extract_images_from_xml_dump(sys.stdin, outfile, args.n_neighbors)
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,17 @@
 import argparse
 import csv
-from typing import IO
+import io
+import os
+import pathos.multiprocessing as mp
+import sys
+from typing import Dict, IO, Iterator, List, Tuple
 
 from mosestokenizer import MosesSentenceSplitter
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import open_file  # noqa: E402
+from common.parallel import bounded_imap  # noqa: E402
+
 # intended to run on simplede_all.tsv as input, change column definitions if necessary
 
 
@@ -11,15 +19,17 @@ def parse_args():  # python3 resegment_sents.py --input-tsv simplede_all.tsv --o
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--input-tsv",
-        type=argparse.FileType("r"),
+        type=str,
         metavar="PATH",
-        help="input tsv with old segmentation",
+        help="input tsv with old segmentation (decompressed if PATH ends with .gz, .bz2, .zst "
+        + "or .xz)",
     )
     parser.add_argument(
         "--output-tsv",
-        type=argparse.FileType("w"),
+        type=str,
         metavar="PATH",
-        help="output tsv with new segmentation",
+        help="output tsv with new segmentation (compressed if PATH ends with .gz, .bz2, .zst "
+        + "or .xz)",
     )
     parser.add_argument(
         "-l",
@@ -29,6 +39,22 @@ def parse_args():  # python3 resegment_sents.py --input-tsv simplede_all.tsv --o
         default="de",
         help="language for the moses sentence splitter to use",
     )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="number of worker processes resplitting sections (default: 1, serial mode)",
+    )
+    parser.add_argument(
+        "--sections",
+        type=int,
+        metavar="INT",
+        default=1000,
+        help="minimum number of sections per worker task, tasks end at article borders "
+        + "(default: 1000)",
+    )
     args = parser.parse_args()
     return args
 
@@ -83,7 +109,8 @@ def create_new_segmentation(infile: IO, outfile: IO, lang: str):
             last_section_id = line["simple_section_id"]
             last_line = line
 
-        for sent in splitsents([section_content]):
+        sent_id = 1
+        for sent in splitsents([section_content]) if section_content.strip() else []:
             out_line = last_line
             out_line.update(
                 {"simple_sent": "NOT_PARALLEL", "simplede_sent": sent, "simple_sent_id": sent_id}
@@ -92,8 +119,95 @@ def create_new_segmentation(infile: IO, outfile: IO, lang: str):
             sent_id += 1
 
 
+N_COLUMNS = 10
+Section = Tuple[List[str], List[str]]
+
+# one persistent sentence splitter per worker process and language
+_worker_splitters: Dict[str, MosesSentenceSplitter] = {}
+
+
+def iter_sections(infile: IO) -> Iterator[Section]:
+    """
+    reads the input tsv row by row and yields one section at a time as a tuple of its last row and
+    the simplede sentences of all its rows.
+    """
+    last_row = None
+    sents = []
+    for row in csv.reader(infile, delimiter="\t"):
+        row = (row + [""] * N_COLUMNS)[:N_COLUMNS]
+        # new section begins at article borders or within articles at section borders
+        if last_row is not None and row[:2] != last_row[:2]:
+            yield last_row, sents
+            sents = []
+        sents.append(row[9].strip())
+        last_row = row
+    if last_row is not None:
+        yield last_row, sents
+
+
+def iter_section_batches(sections: Iterator[Section], min_sections: int) -> Iterator[List[Section]]:
+    """
+    groups sections into batches of at least @param min_sections sections. batches only end at
+    article borders.
+    """
+    batch = []
+    for section in sections:
+        if len(batch) >= min_sections and section[0][0] != batch[-1][0][0]:
+            yield batch
+            batch = []
+        batch.append(section)
+    if batch:
+        yield batch
+
+
+def resegment_batch(lang: str, batch: List[Section]) -> str:
+    """
+    resplits the sections of a batch with the splitter of the worker process and returns the
+    output rows as tsv.
+    """
+    if lang not in _worker_splitters:
+        _worker_splitters[lang] = MosesSentenceSplitter(lang)
+    splitsents = _worker_splitters[lang]
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter="\t")
+    for last_row, sents in batch:
+        section_content = " ".join(sents)
+        if not section_content.strip():
+            continue
+        for sent_id, sent in enumerate(splitsents([section_content]), 1):
+            writer.writerow(
+                last_row[:2] + [sent_id] + last_row[3:6] + ["NOT_PARALLEL"] + last_row[7:9] + [sent]
+            )
+    return output.getvalue()
+
+
+def create_new_segmentation_parallel(
+    infile: IO, outfile: IO, lang: str, n_processes: int, min_sections: int = 1000
+):
+    """
+    streams the input and resplits batches of sections in worker processes. the output is written in
+    the order of the input, at most 2 * @param n_processes batches are held in memory.
+    """
+    batches = iter_section_batches(iter_sections(infile), min_sections)
+    done = 0
+    with mp.Pool(processes=n_processes) as pool:
+        for rows in bounded_imap(
+            pool, lambda batch: resegment_batch(lang, batch), batches, 2 * n_processes
+        ):
+            outfile.write(rows)
+            done += 1
+            if done % 100 == 0:
+                sys.stderr.write(f"Resegmented {done} batches...\n")
+
+
 def main(args: argparse.Namespace):
-    create_new_segmentation(args.input_tsv, args.output_tsv, args.language)
+    with open_file(args.input_tsv) as infile, open_file(args.output_tsv, "w") as outfile:
+        if args.processes > 1:
+            create_new_segmentation_parallel(
+                infile, outfile, args.language, args.processes, args.sections
+            )
+        else:
+            create_new_segmentation(infile, outfile, args.language)
 
 
 if __name__ == "__main__":
@@ -3,17 +3,252 @@
 # Author: Nicolas Spring
 
 import csv
+import fcntl
+import hashlib
+import heapq
+import io
+import json
 import mysql.connector
+import numpy as np
 import os
 import pathos.multiprocessing as mp
 import re
 import sys
-from typing import Dict, List, Optional, Tuple
+import time
+import traceback
+from typing import Callable, Dict, IO, Iterator, List, NamedTuple, Optional, Tuple
 
 from mosestokenizer import MosesSentenceSplitter
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import is_compressed, open_file  # noqa: E402
+from common.profiling import Profiler  # noqa: E402
+from common.stage_cache import StageCache  # noqa: E402
+
+COLUMN_DICT = {
+    "article_id": 0,
+    "section_id": 1,
+    "sent_id": 2,
+    "orig_url": 3,
+    "orig_title": 4,
+    "orig_section": 5,
+    "orig_sent": 6,
+    "other_title": 7,
+}
+
+MANIFEST_DTYPE = np.dtype(
+    [
+        ("article_id", "<i8"),
+        ("content_hash", "<u8"),
+        ("matched", "?"),
+        ("offset", "<i8"),
+        ("length", "<i8"),
+    ]
+)
+
+# the positions of the articles of a task in the shard files of a worker process
+SHARD_DTYPE = np.dtype(
+    [
+        ("article_id", "<i8"),
+        ("content_hash", "<u8"),
+        ("matched", "?"),
+        ("reused", "?"),
+        ("offset", "<i8"),
+        ("length", "<i8"),
+    ]
+)
+
+# previous manifests and output files are opened once per process. manifests loaded by the parent
+# before the pool is created are shared with the (forked) worker processes.
+_previous_manifests: Dict[str, Tuple[Dict[str, str], np.ndarray]] = {}
+_previous_outputs: Dict[str, int] = {}
+# the shard files of a worker process, opened on its first task
+_shard_files: Dict[str, IO] = {}
+
+
+class ArticleBlock(NamedTuple):
+    article_id: str
+    content_hash: int
+    matched: bool
+    data: bytes
+    reused: bool
+
+
+class TaskFailure(NamedTuple):
+    # the traceback of the last attempt
+    error: str
+    attempts: int
+
+
+class ShardBlocks(NamedTuple):
+    # output ("match" or "no_match") -> (shard file, offset, length) of the rows of a task
+    ranges: Dict[str, Tuple[str, int, int]]
+    # one entry per article (see SHARD_DTYPE), offsets are relative to the range of its output
+    entries: np.ndarray
+
+
+def article_hash(attrs: Dict[str, str], text: str) -> int:
+    """
+    returns a 64 bit hash of the metadata and the text of an article.
+    """
+    content = "\t".join((attrs["id"], attrs["url"], attrs["title"])) + "\n" + text
+    return int.from_bytes(hashlib.blake2b(content.encode("utf8"), digest_size=8).digest(), "little")
+
+
+def read_manifest(path: str) -> Tuple[Dict[str, str], np.ndarray]:
+    """
+    reads a manifest written by the DocumentParser.
+
+    Args:
+        path:       the path to the manifest.
+
+    Returns:
+        header:     the settings of the run (input_lang, match_lang) and the paths of its outputs
+                        (match, no_match).
+        entries:    a structured array (see MANIFEST_DTYPE) with one entry per article, sorted by
+                        article id.
+    """
+    header = {}
+    rows = []
+    with open(path, encoding="utf8") as infile:
+        for line in infile:
+            fields = line.rstrip("\n").split("\t")
+            if line.startswith("#"):
+                header[fields[0][1:]] = fields[1]
+            else:
+                rows.append(
+                    (
+                        int(fields[0]),
+                        int(fields[1], 16),
+                        fields[2] == "1",
+                        int(fields[3]),
+                        int(fields[4]),
+                    )
+                )
+    entries = np.array(rows, dtype=MANIFEST_DTYPE)
+    entries.sort(order="article_id")
+    return header, entries
+
+
+def _load_previous_manifest(path: str) -> Tuple[Dict[str, str], np.ndarray]:
+    if path not in _previous_manifests:
+        _previous_manifests[path] = read_manifest(path)
+    return _previous_manifests[path]
+
+
+def copy_range(in_fd: int, out_fd: int, offset: int, length: int):
+    """
+    appends @param length bytes of a file starting at @param offset to another file without
+    reading them into python (with sendfile where possible).
+    """
+    # linux does not support sendfile to files opened in append mode
+    use_sendfile = hasattr(os, "sendfile") and not fcntl.fcntl(out_fd, fcntl.F_GETFL) & os.O_APPEND
+    while length > 0:
+        if use_sendfile:
+            n_copied = os.sendfile(out_fd, in_fd, offset, length)
+        else:
+            n_copied = os.write(out_fd, os.pread(in_fd, min(length, 1 << 24), offset))
+        if n_copied == 0:
+            raise EOFError(f"Shard file ended before offset {offset + length}.")
+        offset += n_copied
+        length -= n_copied
+
+
+def append_range(in_fd: int, outfile: IO, offset: int, length: int):
+    """
+    appends @param length bytes of a file starting at @param offset to an output file opened with
+    open_file. the bytes are passed through the compressor of compressed outputs and copied with
+    copy_range otherwise.
+    """
+    if is_compressed(outfile.name):
+        for start in range(offset, offset + length, 1 << 24):
+            outfile.write(os.pread(in_fd, min(1 << 24, offset + length - start), start))
+        return
+    outfile.flush()
+    copy_range(in_fd, outfile.fileno(), offset, length)
+    outfile.seek(0, os.SEEK_END)
+
+
+def partition_by_size(sizes: List[int], n_parts: int) -> List[List[int]]:
+    """
+    assigns items to parts with balanced total sizes (longest processing time first: the largest
+    remaining item is added to the part with the smallest total). ties are broken by index, so
+    the assignment only depends on the sizes.
+
+    Args:
+        sizes:      the sizes of the items (e.g. in bytes).
+        n_parts:    the number of parts.
+
+    Returns:
+        parts:      the sorted indices of the items of every part.
+    """
+    totals = [(0, part) for part in range(n_parts)]
+    parts = [[] for _ in range(n_parts)]
+    for index in sorted(range(len(sizes)), key=lambda i: (-sizes[i], i)):
+        total, part = heapq.heappop(totals)
+        parts[part].append(index)
+        heapq.heappush(totals, (total + sizes[index], part))
+    return [sorted(part) for part in parts]
+
+
+def split_document_file(
+    path: str, split_size: int, block_size: int = 1 << 20
+) -> List[Tuple[int, int]]:
+    """
+    splits a file in medialab document format into byte ranges of about @param split_size bytes.
+    the ranges end after a "</doc>" line, so they only contain complete articles.
+
+    Args:
+        path:           a file in medialab document format.
+        split_size:     the minimum size of a range in bytes (except for the last one).
+        block_size:     the number of bytes read at once when searching for the end of an article.
+
+    Returns:
+        spans:          the (start, end) byte offsets of the ranges, covering the whole file.
+    """
+    size = os.path.getsize(path)
+    points = [0]
+    with open(path, "rb") as infile:
+        while points[-1] + split_size < size:
+            # the preceding line break is included to find "</doc>" at the start of the range
+            position = points[-1] + split_size - 1
+            infile.seek(position)
+            buffer = b""
+            point = None
+            while point is None:
+                block = infile.read(block_size)
+                if not block:
+                    break
+                buffer += block
+                index = buffer.find(b"\n</doc>")
+                end = buffer.find(b"\n", index + 1) if index >= 0 else -1
+                if end >= 0:
+                    point = position + end + 1
+            if point is None or point >= size:
+                break
+            points.append(point)
+    points.append(size)
+    return list(zip(points[:-1], points[1:]))
+
+
+def shard_manifest_path(match_file: str) -> str:
+    """
+    returns the path of the shard manifest written next to the match file of a shard.
+    """
+    return match_file + ".shard.json"
+
+
+def _serialize_rows(rows: List[List]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter="\t", quotechar='"')
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf8")
+
 
 class DocumentParser(object):
+    # the query (with mysql.connector placeholders) for the title of an article in another language
+    LANGLINKS_QUERY = "SELECT * FROM langlinks WHERE ll_from = %s AND ll_lang = %s"
+
     def __init__(
         self,
         input_dir: str,
@@ -24,21 +259,75 @@ class DocumentParser(object):
         mysql_dict: Dict = None,
         n_processes: int = mp.cpu_count(),
         n_files: int = 1,
+        manifest_file: str = None,
+        previous_manifest: str = None,
+        deleted_file: str = None,
+        profiler: Profiler = None,
+        cache: StageCache = None,
+        shard_dir: str = None,
+        shard_index: int = None,
+        num_shards: int = None,
+        schedule: str = "chunks",
+        split_size: int = None,
+        journal_file: str = None,
+        max_retries: int = 2,
         verbose: int = 1,
     ):
         """
         Args:
         input_dir       a directory containing files in the medialab document format.
                             http://medialab.di.unipi.it/wiki/Document_Format
+                            files ending in .gz, .bz2, .zst or .xz are decompressed.
         input_lang      language the input (used for sentence splitting)
         match_file      output file for articles with a match. if no @param match_lang is provided,
-                            all output will be written to this file.
+                            all output will be written to this file. the outputs are compressed if
+                            they end in .gz, .bz2, .zst or .xz (not with manifests, shards or a
+                            journal).
         match_lang      the wikipedia language code for which titles will be queried in the langlinks table.
         no_match_file   output file for articles with no match.
         mysql_dict      a dictionary containing arguments for the mysql.connector used to access the langlinks table
                             in a mysql databank.
         n_processes     the number of parallel processes to be run.
         n_files         the number of files handled per process before writing to the output file.
+        manifest_file   output file for the content hashes and output positions of all articles. it
+                            can be used as @param previous_manifest for the next dump version.
+        previous_manifest
+                        the manifest of a previous run. articles with unchanged content are not split
+                            and looked up again, their rows are copied from the outputs of the previous
+                            run (which must not be overwritten by this run).
+        deleted_file    output file for the ids of articles of the previous run which no longer exist.
+        profiler        a Profiler collecting stage timings and counters of the run (including the
+                            worker processes).
+        cache           a StageCache. if the input files, languages and langlinks database have
+                            not changed since a cached run, the outputs are copied from the cache.
+                            changes of the content of the langlinks table are not detected.
+        shard_dir       a directory for shard files. if provided, every worker process appends the
+                            rows it generates to its own shard files and only returns their
+                            positions. the main process copies the rows to the output files in
+                            order, without receiving or serializing them. the shard files are
+                            removed at the end of the run.
+        shard_index     the index of the shard of the input files parsed by this run (0 to
+                            @param num_shards - 1). the files are assigned to the shards by size,
+                            see partition_by_size. every shard writes its own outputs and a shard
+                            manifest (see shard_manifest_path) with the output positions of its
+                            files, which are merged by merge_shards.py.
+        num_shards      the number of shards.
+        schedule        how the files are distributed to the worker processes. "chunks": in chunks of
+                            n_processes*n_files files in the order of the files. "lpt": one file at
+                            a time, the largest files first, to whichever process is free. the
+                            results are buffered and written in the order of the files (with little
+                            memory when a @param shard_dir is provided).
+        split_size      with schedule "lpt", files larger than this many bytes are split into
+                            parts of about this size (after "</doc>" lines) which are parsed as
+                            separate tasks.
+        journal_file    an append-only journal of the parsed files and the positions of their rows
+                            in the outputs. if the journal exists, the run is resumed: the outputs
+                            are truncated after the last file in the journal and the files in the
+                            journal are skipped. files which fail are recorded in the journal and
+                            in <journal_file>.quarantine instead of stopping the run.
+        max_retries     with a @param journal_file, the number of times a failed file is parsed
+                            again (e.g. after a dropped database connection) before it is
+                            quarantined.
         verbose         the verbosity level.
         """
         self.input_dir = input_dir
@@ -49,9 +338,24 @@ class DocumentParser(object):
         self.mysql_dict = mysql_dict
         self.n_processes = n_processes
         self.n_files = n_files
+        self.manifest_file = manifest_file
+        self.previous_manifest = previous_manifest
+        self.deleted_file = deleted_file
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.cache = cache
+        self.shard_dir = shard_dir
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        self.schedule = schedule
+        self.split_size = split_size
+        self.journal_file = journal_file
+        self.max_retries = max_retries
         self.verbose = verbose
         self.chunks = None
         self.all_files = None
+        self.file_indices = None
+        self.n_total_files = None
+        self.todo_files = None
 
         self.find_corresponding_article_title = self.match_lang is not None
 
@@ -63,92 +367,498 @@ class DocumentParser(object):
             self._debug("Arguments required for this: no_match_file, mysql_dict.")
             assert self.no_match_file is not None and self.mysql_dict is not None
             self._debug("Testing access to the langlinks table...")
-            cnx = mysql.connector.connect(**self.mysql_dict)
+            cnx = self._connect_langlinks()
             cnx.close()
             self._debug("langlinks table can be accessed.")
+        if self.previous_manifest is not None:
+            self._debug(f"Reading the manifest of the previous run ({self.previous_manifest})...")
+            header, entries = _load_previous_manifest(self.previous_manifest)
+            assert header["input_lang"] == self.input_lang and header["match_lang"] == (
+                self.match_lang or ""
+            ), "The previous run has been made with a different --input-lang or --match-lang."
+            new_outputs = {os.path.abspath(path) for path in (match_file, no_match_file) if path}
+            assert not new_outputs & {header["match"], header["no_match"]}, (
+                "The outputs of the previous run are read for unchanged articles "
+                + "and must not be overwritten."
+            )
+            self._debug(f"{len(entries)} articles found in the previous run.")
+
+        if self.num_shards is not None:
+            assert (
+                self.shard_index is not None and 0 <= self.shard_index < self.num_shards
+            ), "Please provide a shard index between 0 and the number of shards - 1."
+            assert (
+                self.previous_manifest is None and self.manifest_file is None
+            ), "Article manifests are not supported when parsing shards."
+        assert self.schedule in ("chunks", "lpt"), f"Unknown schedule {self.schedule}."
+        assert (
+            self.split_size is None or self.schedule == "lpt"
+        ), "Files can only be split with the lpt schedule."
+        if self.journal_file is not None:
+            assert (
+                self.previous_manifest is None and self.manifest_file is None
+            ), "Article manifests are not supported with a journal."
+        if any(is_compressed(path) for path in (match_file, no_match_file) if path):
+            assert (
+                self.manifest_file is None and self.num_shards is None and journal_file is None
+            ), (
+                "Article manifests, shards and journals record byte offsets in the outputs, "
+                + "which cannot be compressed."
+            )
+        if self.shard_dir is not None:
+            os.makedirs(self.shard_dir, exist_ok=True)
 
-        # emptying output files
+        # with a journal, the outputs are emptied by _open_journal unless the run is resumed
+        if self.journal_file is None:
+            self._empty_outputs()
+
+    def _empty_outputs(self):
+        """
+        empties the output files.
+        """
         open(self.match_file, "w").close()
         if self.find_corresponding_article_title:
-            open(no_match_file, "w").close()
+            open(self.no_match_file, "w").close()
 
     def parse_documents(self) -> Dict[str, int]:
         """
         parses the documents and writes the parsed line into tsv files.
         """
-        self._create_chunks()
+        if self._restore_cached_outputs():
+            return dict(COLUMN_DICT)
+        journal = self._open_journal()
+        self._create_chunks(journal)
+        file_ranges = []
+        # the outputs are opened after the worker processes have been forked, which would otherwise
+        # inherit (and flush) their buffers
+        with mp.Pool(processes=self.n_processes) as pool:
+            writer = self._open_outputs()
+            try:
+                if self.schedule == "lpt":
+                    results = self._schedule_largest_first(pool)
+                else:
+                    results = self._schedule_chunks(pool)
+                start = None
+                failure = None
+                for doc_file, last_part, (blocks, summary) in results:
+                    self.profiler.merge(summary)
+                    with self.profiler.stage("write"):
+                        if start is None:
+                            start = writer.positions()
+                        if isinstance(blocks, TaskFailure):
+                            # the rows of previous parts of the file are removed
+                            writer.truncate(start)
+                            failure = blocks
+                        elif failure is None:
+                            writer.write(blocks)
+                        if last_part:
+                            file_ranges.append((doc_file, start, writer.positions()))
+                            if journal is not None:
+                                self._record_file(journal, doc_file, start, writer, failure)
+                            start = None
+                            failure = None
+            finally:
+                self._close_outputs(writer)
+                if journal is not None:
+                    journal.close()
+        self._report_load_balance()
+        if journal is not None:
+            file_ranges = self._journal_ranges(journal)
+        if self.num_shards is not None:
+            self._write_shard_manifest(file_ranges)
+        self._store_cached_outputs()
+        return dict(COLUMN_DICT)
+
+    def _schedule_chunks(self, pool) -> Iterator[Tuple[str, bool, Tuple]]:
+        """
+        parses the chunks of files one after the other and yields the file name, True (every file
+        is parsed as a whole) and the result of every file in the order of the files.
+        """
         done = 0
-        match_results = []
-        no_match_results = []
         for chunk in self.chunks:
-            with mp.Pool(processes=self.n_processes) as pool:
-                results = pool.starmap_async(self._parse_document_file, [(file,) for file in chunk])
-                results = results.get()
-            for file in results:
-                match_results += file[0]
-                no_match_results += file[1]
-            self._write_output_tsv(self.match_file, match_results)
-            if self.find_corresponding_article_title:
-                self._write_output_tsv(self.no_match_file, no_match_results)
-            match_results = []
-            no_match_results = []
+            results = pool.map(self._task(self._parse_document_file), chunk)
+            for doc_file, result in zip(chunk, results):
+                yield doc_file, True, result
             done += len(chunk)
-            self._debug(f"Parsed {done}/{len(self.all_files)} files.")
-        column_dict = {
-            "article_id": 0,
-            "section_id": 1,
-            "sent_id": 2,
-            "orig_url": 3,
-            "orig_title": 4,
-            "orig_section": 5,
-            "orig_sent": 6,
-            "other_title": 7,
-        }
-        return column_dict
+            self._debug(f"Parsed {done}/{len(self.todo_files)} files.")
+
+    def _schedule_largest_first(self, pool) -> Iterator[Tuple[str, bool, Tuple]]:
+        """
+        submits the files (or parts of files) to the pool from the largest to the smallest. every
+        process takes the next task as soon as it is free. the results are yielded in the order of
+        the files (and parts) with the file name and whether the part is the last of its file.
+        """
+        tasks = []
+        for file_index, doc_file in enumerate(self.todo_files):
+            size = os.path.getsize(doc_file)
+            # compressed files cannot be read from an offset
+            if (
+                self.split_size is not None
+                and size > self.split_size
+                and not is_compressed(doc_file)
+            ):
+                spans = split_document_file(doc_file, self.split_size)
+            else:
+                spans = [None]
+            for part, span in enumerate(spans):
+                length = size if span is None else span[1] - span[0]
+                tasks.append((length, (file_index, part), doc_file, span, part == len(spans) - 1))
+        self._debug(
+            f"Scheduling {len(tasks)} tasks ({len(tasks) - len(self.todo_files)} additional parts "
+            + f"of large files) on {self.n_processes} processes, largest first..."
+        )
+        tasks.sort(key=lambda task: (-task[0], task[1]))
+        run = self._task(lambda task: self._parse_document_file(task[2], task[3]))
+        pending = {}
+        order = iter(sorted(task[1:] for task in tasks))
+        next_key, doc_file, _, last_part = next(order, (None, None, None, None))
+        done = 0
+        for key, result in pool.imap_unordered(lambda task: (task[1], run(task)), tasks):
+            pending[key] = result
+            # the results which are complete up to the next task in order are yielded
+            while next_key in pending:
+                yield doc_file, last_part, pending.pop(next_key)
+                if last_part:
+                    done += 1
+                    if done % self.n_processes == 0 or done == len(self.todo_files):
+                        self._debug(f"Parsed {done}/{len(self.todo_files)} files.")
+                next_key, doc_file, _, last_part = next(order, (None, None, None, None))
+
+    def _report_load_balance(self):
+        """
+        prints the busy time of the worker processes.
+        """
+        load_balance = self.profiler.load_balance()
+        if load_balance is None:
+            return
+        self._debug(
+            f"Busy time of {len(load_balance['workers'])} worker processes: "
+            + f"{load_balance['min_seconds']:.1f}s (min), {load_balance['mean_seconds']:.1f}s "
+            + f"(mean), {load_balance['max_seconds']:.1f}s (max), imbalance (max/mean): "
+            + f"{load_balance['imbalance']:.2f}."
+        )
+
+    def parse_file(self, doc_file: str) -> Tuple[List[List[str]], List[List[str]]]:
+        """
+        parses a single file in medialab document format without writing to the output files.
 
-    def _create_chunks(self):
+        Args:
+        doc_file    a file in medialab document format.
+
+        Returns:
+        match_rows      the rows of articles with a match (all rows if no match_lang is provided).
+        no_match_rows   the rows of articles with no match.
+        """
+        blocks, _ = self._parse_document_file(doc_file)
+        match_rows = []
+        no_match_rows = []
+        for block in blocks:
+            rows = csv.reader(io.StringIO(block.data.decode("utf8")), delimiter="\t")
+            (match_rows if block.matched else no_match_rows).extend(rows)
+        return match_rows, no_match_rows
+
+    def _create_chunks(self, journal: "ParseJournal" = None):
         """
-        creates chunks of file names of size n_processes*n_files.
+        creates chunks of file names of size n_processes*n_files (for the "chunks" schedule). the
+        files are sorted by path, so the order of the outputs does not depend on the order of the
+        directory listing. the files in the @param journal are skipped.
         """
-        self.all_files = [
+        self.all_files = sorted(
             os.path.join(root, file) for root, _, files in os.walk(self.input_dir) for file in files
-        ]
+        )
+        self.n_total_files = len(self.all_files)
+        self.file_indices = list(range(self.n_total_files))
         self._debug(f"Number of files found:\t{len(self.all_files)}")
+        if self.num_shards is not None:
+            sizes = [os.path.getsize(path) for path in self.all_files]
+            self.file_indices = partition_by_size(sizes, self.num_shards)[self.shard_index]
+            self.all_files = [self.all_files[i] for i in self.file_indices]
+            self._debug(
+                f"Shard {self.shard_index}/{self.num_shards}: {len(self.all_files)} files, "
+                + f"{sum(sizes[i] for i in self.file_indices)}/{sum(sizes)} bytes."
+            )
+        self.todo_files = self.all_files
+        if journal is not None:
+            self.todo_files = self._skip_journaled_files(journal)
+        if self.schedule != "chunks":
+            return
         self._debug(
             f"Trying to create chunks of size {self.n_processes*self.n_files} "
             + f"({self.n_files} file(s) each for {self.n_processes} processes)..."
         )
         chunk_size = self.n_processes * self.n_files
         self.chunks = [
-            self.all_files[i * chunk_size : (i + 1) * chunk_size]
-            for i in range((len(self.all_files) + chunk_size - 1) // chunk_size)
+            self.todo_files[i * chunk_size : (i + 1) * chunk_size]
+            for i in range((len(self.todo_files) + chunk_size - 1) // chunk_size)
         ]
         self._debug(f"Created {len(self.chunks)} chunk(s).")
 
-    def _parse_document_file(self, doc_file: str) -> Tuple[List[Tuple[str]], List[Tuple[str]]]:
+    def _journal_header(self) -> Dict:
         """
-        extracts lines and metadata from raw articles and generates lines ready for output.
+        returns the settings of the run recorded at the top of the journal.
         """
-        cnx = (
-            mysql.connector.connect(**self.mysql_dict)
-            if self.find_corresponding_article_title
-            else None
-        )
-        cursor = cnx.cursor() if self.find_corresponding_article_title else None
-        articles = self._extract_articles(doc_file)
-        match_lines, no_match_lines = self._generate_lines(
-            articles, self.match_lang, self.input_lang, cursor
+        outputs = {"match": os.path.abspath(self.match_file)}
+        if self.find_corresponding_article_title:
+            outputs["no_match"] = os.path.abspath(self.no_match_file)
+        return {
+            "input_dir": os.path.abspath(self.input_dir),
+            "input_lang": self.input_lang,
+            "match_lang": self.match_lang or "",
+            "shard": [self.shard_index, self.num_shards],
+            "outputs": outputs,
+        }
+
+    def _open_journal(self) -> Optional["ParseJournal"]:
+        """
+        opens the journal of the run (or returns None without a journal_file). if the journal
+        exists, the rows written after the last file in the journal are removed from the outputs,
+        otherwise the outputs are emptied. the journal is kept outside of the parser, which is
+        pickled for every task, and entries are only recorded by the main process.
+        """
+        if self.journal_file is None:
+            return None
+        journal = ParseJournal(self.journal_file, self._journal_header())
+        if not journal.load():
+            self._empty_outputs()
+            return journal
+        self._debug(
+            f"Resuming the run in {self.journal_file}: {len(journal.entries)} files "
+            + f"done ({len(journal.failures())} quarantined)."
         )
+        for output, path in self._journal_header()["outputs"].items():
+            position = journal.positions().get(output, 0)
+            assert os.path.getsize(path) >= position, (
+                f"{path} is shorter than recorded in the journal. "
+                + "Please remove the journal to start a new run."
+            )
+            os.truncate(path, position)
+        return journal
+
+    def _skip_journaled_files(self, journal: "ParseJournal") -> List[str]:
+        """
+        returns the files which are not in the journal yet. files in the journal must not have
+        changed since they have been parsed.
+        """
+        todo_files = []
+        for doc_file in self.all_files:
+            entry = journal.entries.get(os.path.relpath(doc_file, self.input_dir))
+            if entry is None:
+                todo_files.append(doc_file)
+                continue
+            assert entry["size"] == os.path.getsize(doc_file), (
+                f"{doc_file} has changed since it has been parsed. "
+                + "Please remove the journal to start a new run."
+            )
+        if len(todo_files) < len(self.all_files):
+            self._debug(f"Skipping {len(self.all_files) - len(todo_files)} files in the journal.")
+        return todo_files
+
+    def _record_file(
+        self,
+        journal: "ParseJournal",
+        doc_file: str,
+        start: Dict[str, int],
+        writer: "BlockWriter",
+        failure: Optional[TaskFailure],
+    ):
+        """
+        records a parsed (or failed) file in the journal after its rows have been written to disk.
+        """
+        writer.sync()
+        end = writer.positions()
+        entry = {
+            "file": os.path.relpath(doc_file, self.input_dir),
+            "size": os.path.getsize(doc_file),
+        }
+        for output in end:
+            entry[output] = [start[output], end[output]]
+        if failure is not None:
+            entry["error"] = failure.error
+            entry["attempts"] = failure.attempts
+            self._debug(
+                f"Quarantined {doc_file} after {failure.attempts} attempts: "
+                + failure.error.strip().split("\n")[-1],
+                prefix="WARNING:\t",
+            )
+        journal.record(entry)
+
+    def _journal_ranges(
+        self, journal: "ParseJournal"
+    ) -> List[Tuple[str, Dict[str, int], Dict[str, int]]]:
+        """
+        returns the ranges of the rows of all files of the run (including the files parsed
+        before it has been resumed) from the journal.
+        """
+        file_ranges = []
+        for doc_file in self.all_files:
+            entry = journal.entries[os.path.relpath(doc_file, self.input_dir)]
+            outputs = [output for output in ("match", "no_match") if output in entry]
+            file_ranges.append(
+                (
+                    doc_file,
+                    {output: entry[output][0] for output in outputs},
+                    {output: entry[output][1] for output in outputs},
+                )
+            )
+        return file_ranges
+
+    def _write_shard_manifest(self, file_ranges: List[Tuple[str, Dict[str, int], Dict[str, int]]]):
+        """
+        writes the shard manifest: the settings of the run, the sizes of the outputs and the input
+        files of the shard with the ranges of their rows in the outputs.
+        """
+        outputs = {"match": self.match_file}
+        if self.find_corresponding_article_title:
+            outputs["no_match"] = self.no_match_file
+        files = []
+        for index, (doc_file, start, end) in zip(self.file_indices, file_ranges):
+            entry = {
+                "path": os.path.relpath(doc_file, self.input_dir),
+                "index": index,
+                "size": os.path.getsize(doc_file),
+            }
+            for output in outputs:
+                entry[output] = [start[output], end[output]]
+            files.append(entry)
+        manifest = {
+            "shard_index": self.shard_index,
+            "num_shards": self.num_shards,
+            "n_files": self.n_total_files,
+            "input_dir": os.path.abspath(self.input_dir),
+            "input_lang": self.input_lang,
+            "match_lang": self.match_lang or "",
+            "outputs": {
+                output: {"path": os.path.abspath(path), "size": os.path.getsize(path)}
+                for output, path in outputs.items()
+            },
+            "files": files,
+        }
+        path = shard_manifest_path(self.match_file)
+        # the manifest marks the shard as complete, it is replaced atomically
+        with open(path + ".tmp", "w", encoding="utf8") as outfile:
+            json.dump(manifest, outfile, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def _task(self, func: Callable) -> Callable:
+        """
+        returns the function run by the worker processes for a task: @param func, followed by
+        writing its blocks to the shard files of the worker if a shard_dir is provided. the busy
+        time of the worker is added to the profiler summary of the task. with a journal, failed
+        tasks are retried and a TaskFailure is returned instead of the blocks after the last
+        attempt.
+        """
+
+        # the workers only need to know whether failed tasks are quarantined and how often they
+        # are retried, the journal itself stays in the main process
+        quarantine = self.journal_file is not None
+        max_retries = self.max_retries
+
+        def run(item) -> Tuple[List[ArticleBlock], Dict]:
+            start = time.perf_counter()
+            profiler = Profiler()
+            for attempt in range(1, max_retries + 2):
+                try:
+                    blocks, summary = func(item)
+                    break
+                except Exception:
+                    # without a journal, a failed file stops the run
+                    if not quarantine:
+                        raise
+                    if attempt > max_retries:
+                        profiler.count("failed tasks")
+                        profiler.add_busy_time(time.perf_counter() - start)
+                        return TaskFailure(traceback.format_exc(), attempt), profiler.summary()
+                    profiler.count("retried tasks")
+                    time.sleep(2**attempt)
+            profiler.merge(summary)
+            if self.shard_dir is not None:
+                with profiler.stage("write shard"):
+                    blocks = self._write_shard(blocks)
+            profiler.add_busy_time(time.perf_counter() - start)
+            return blocks, profiler.summary()
+
+        return run
+
+    def _write_shard(self, blocks: List[ArticleBlock]) -> ShardBlocks:
+        """
+        appends the rows of a task to the shard files of the worker process and returns their
+        positions.
+        """
+        entries = np.zeros(len(blocks), dtype=SHARD_DTYPE)
+        ranges = {}
+        for i, block in enumerate(blocks):
+            output = "match" if block.matched else "no_match"
+            path = os.path.join(self.shard_dir, f"shard-{os.getpid()}.{output}.tsv")
+            if path not in _shard_files:
+                _shard_files[path] = open(path, "wb")
+            if output not in ranges:
+                ranges[output] = (path, _shard_files[path].tell(), 0)
+            _, start, length = ranges[output]
+            _shard_files[path].write(block.data)
+            entries[i] = (
+                int(block.article_id),
+                block.content_hash,
+                block.matched,
+                block.reused,
+                length,
+                len(block.data),
+            )
+            ranges[output] = (path, start, length + len(block.data))
+        # the main process reads the rows as soon as the task has returned
+        for path, _, _ in ranges.values():
+            _shard_files[path].flush()
+        return ShardBlocks(ranges, entries)
+
+    def _parse_document_file(
+        self, doc_file: str, span: Tuple[int, int] = None
+    ) -> Tuple[List[ArticleBlock], Dict]:
+        """
+        extracts lines and metadata from raw articles (of the whole file or the byte range
+        @param span) and generates lines ready for output. returns the blocks and the profiler
+        summary of the task.
+        """
+        profiler = Profiler()
+        articles = self._extract_articles(doc_file, profiler, span)
+        return self._parse_articles(articles, profiler), profiler.summary()
+
+    def _parse_articles(
+        self, articles: List[Tuple[Dict[str, str], str]], profiler: Profiler
+    ) -> List[ArticleBlock]:
+        """
+        generates the output rows of a list of articles, one ArticleBlock per article.
+        """
+        cnx = None
+        cursor = None
+        if self.find_corresponding_article_title:
+            with profiler.stage("langlinks lookup"):
+                cnx = self._connect_langlinks()
+                cursor = cnx.cursor()
+        blocks = self._generate_blocks(articles, cursor, profiler)
         if self.find_corresponding_article_title:
             cursor.close()
             cnx.close()
-        return match_lines, no_match_lines
+        return blocks
 
-    def _extract_articles(self, doc_file: str) -> List[Tuple[Dict[str, str], str]]:
+    def _extract_articles(
+        self, doc_file: str, profiler: Profiler, span: Tuple[int, int] = None
+    ) -> List[Tuple[Dict[str, str], str]]:
         """
-        opens a file in medialab document format and returns tuples of metadata and lines
+        opens a file in medialab document format (or reads the byte range @param span of it) and
+        returns tuples of metadata and lines
         """
-        with open(doc_file, encoding="utf8") as infile:
+        start = time.perf_counter()
+        header_seconds = 0.0
+        if span is None:
+            infile = open_file(doc_file)
+            n_bytes = os.path.getsize(doc_file)
+        else:
+            with open(doc_file, "rb") as rawfile:
+                rawfile.seek(span[0])
+                data = rawfile.read(span[1] - span[0])
+            # decoded like open(), with universal newlines
+            infile = io.TextIOWrapper(io.BytesIO(data), encoding="utf8")
+            n_bytes = len(data)
+        with infile:
             articles = []
             contents = ""
             attributes = {}
@@ -157,79 +867,146 @@ class DocumentParser(object):
                     articles.append(({**attributes}, contents))
                     contents = ""
                 elif line.startswith("<doc "):
+                    header_start = time.perf_counter()
                     head = line.lstrip("<doc ").rstrip(">")
                     attributes["id"] = re.search(r"id=(\S*)", head).group(1).strip('">')
                     attributes["url"] = re.search(r"url=(\S*)", head).group(1).strip('">')
                     attributes["title"] = re.search(r"title=(\S*)", head).group(1).strip('">')
+                    header_seconds += time.perf_counter() - header_start
                 else:
                     contents += line
+        profiler.add_time("read", time.perf_counter() - start - header_seconds)
+        profiler.add_time("header parse", header_seconds, len(articles))
+        profiler.count("bytes read", n_bytes)
         return articles
 
-    def _generate_lines(
+    def _generate_blocks(
         self,
         articles: List[Tuple[Dict[str, str], str]],
-        match_lang: str,
-        input_lang: str,
         cursor: "CMySQLCursor",
-    ) -> Tuple[List[Tuple[str]], List[Tuple[str]]]:
+        profiler: Profiler,
+    ) -> List[ArticleBlock]:
         """
-        generates tuples representing lines in a final output file
+        generates the serialized tsv rows of every article. the rows of articles which are unchanged
+        since the previous run are copied from its outputs.
         """
-        match_lines = []
-        no_match_lines = []
-        with MosesSentenceSplitter(input_lang) as splitsents:
+        blocks = []
+        with MosesSentenceSplitter(self.input_lang) as splitsents:
             for attrs, text in articles:
-                lines = []
-                section_name = "Summary"
-                section_id = 1
-                sent_id = 1
-                section_str = ""
-                for line in text.split("\n"):
-                    # filtering out empty lines and the title line
-                    if not line.startswith("\n") and not line == attrs["title"]:
-                        # the beginning of a new section
-                        if line.startswith("Section::::"):
-                            if section_str.strip():
-                                for sent in splitsents([section_str]):
-                                    lin = [
-                                        attrs["id"],
-                                        section_id,
-                                        sent_id,
-                                        attrs["url"],
-                                        attrs["title"],
-                                        section_name,
-                                        sent,
-                                    ]
-                                    lines.append(lin)
-                                    sent_id += 1
-                            section_str = ""
-                            section_id += 1
-                            section_name = line.replace("Section::::", "").rstrip(".")
-                        # normal text rows
-                        else:
-                            section_str += " " + line.strip()
-                if section_str.strip():
-                    for sent in splitsents([section_str]):
-                        lin = [
-                            attrs["id"],
-                            section_id,
-                            sent_id,
-                            attrs["url"],
-                            attrs["title"],
-                            section_name,
-                            sent,
-                        ]
-                        lines.append(lin)
-                        sent_id += 1
+                profiler.count("articles")
+                with profiler.stage("hash"):
+                    content_hash = article_hash(attrs, text)
+                    previous = self._find_previous_entry(attrs["id"])
+                if previous is not None and previous["content_hash"] == content_hash:
+                    with profiler.stage("reuse"):
+                        data = self._read_previous_rows(previous)
+                    blocks.append(
+                        ArticleBlock(
+                            attrs["id"], content_hash, bool(previous["matched"]), data, True
+                        )
+                    )
+                    profiler.count("reused articles")
+                    profiler.count("bytes written", len(data))
+                    continue
+                with profiler.stage("split"):
+                    lines = self._split_article(attrs, text, splitsents)
+                profiler.count("sentences", len(lines))
+                matched = True
                 if self.find_corresponding_article_title:
-                    matched_title = self._find_other_lang_title(attrs["id"], cursor, match_lang)
+                    with profiler.stage("langlinks lookup"):
+                        matched_title = self._find_other_lang_title(
+                            attrs["id"], cursor, self.match_lang
+                        )
                     if matched_title:
-                        match_lines += [tuple(line + [matched_title]) for line in lines]
+                        lines = [line + [matched_title] for line in lines]
                     else:
-                        no_match_lines += [tuple(line) for line in lines]
+                        matched = False
+                with profiler.stage("serialize"):
+                    data = _serialize_rows(lines)
+                blocks.append(ArticleBlock(attrs["id"], content_hash, matched, data, False))
+                profiler.count("bytes written", len(data))
+        return blocks
+
+    def _split_article(
+        self, attrs: Dict[str, str], text: str, splitsents: MosesSentenceSplitter
+    ) -> List[List]:
+        """
+        splits the text of an article into sentences and generates lists representing lines in a
+        final output file
+        """
+        lines = []
+        section_name = "Summary"
+        section_id = 1
+        sent_id = 1
+        section_str = ""
+        for line in text.split("\n"):
+            # filtering out empty lines and the title line
+            if not line.startswith("\n") and not line == attrs["title"]:
+                # the beginning of a new section
+                if line.startswith("Section::::"):
+                    if section_str.strip():
+                        for sent in splitsents([section_str]):
+                            lin = [
+                                attrs["id"],
+                                section_id,
+                                sent_id,
+                                attrs["url"],
+                                attrs["title"],
+                                section_name,
+                                sent,
+                            ]
+                            lines.append(lin)
+                            sent_id += 1
+                    section_str = ""
+                    section_id += 1
+                    section_name = line.replace("Section::::", "").rstrip(".")
+                # normal text rows
                 else:
-                    match_lines += [tuple(line) for line in lines]
-        return match_lines, no_match_lines
+                    section_str += " " + line.strip()
+        if section_str.strip():
+            for sent in splitsents([section_str]):
+                lin = [
+                    attrs["id"],
+                    section_id,
+                    sent_id,
+                    attrs["url"],
+                    attrs["title"],
+                    section_name,
+                    sent,
+                ]
+                lines.append(lin)
+                sent_id += 1
+        return lines
+
+    def _find_previous_entry(self, article_id: str) -> Optional[np.void]:
+        """
+        returns the manifest entry of an article in the previous run (or None).
+        """
+        if self.previous_manifest is None:
+            return None
+        entries = _load_previous_manifest(self.previous_manifest)[1]
+        article_id = int(article_id)
+        index = np.searchsorted(entries["article_id"], article_id)
+        if index < len(entries) and entries["article_id"][index] == article_id:
+            return entries[index]
+        return None
+
+    def _read_previous_rows(self, entry: np.void) -> bytes:
+        """
+        reads the rows of an article from the outputs of the previous run.
+        """
+        header = _load_previous_manifest(self.previous_manifest)[0]
+        path = header["match"] if entry["matched"] else header["no_match"]
+        if path not in _previous_outputs:
+            _previous_outputs[path] = os.open(path, os.O_RDONLY)
+        # pread does not move the file position shared with other processes
+        return os.pread(_previous_outputs[path], int(entry["length"]), int(entry["offset"]))
+
+    def _connect_langlinks(self) -> "CMySQLConnection":
+        """
+        opens a connection to the database containing the langlinks table.
+        """
+        return mysql.connector.connect(**self.mysql_dict)
 
     def _find_other_lang_title(
         self, article_id: str, cursor: "CMySQLCursor", match_lang: str
@@ -237,19 +1014,95 @@ class DocumentParser(object):
         """
         queries the langlinks table for the title of a specific article in another language
         """
-        query = "SELECT * FROM langlinks WHERE ll_from = %s AND ll_lang = %s"
-        cursor.execute(query, (article_id, match_lang))
+        cursor.execute(self.LANGLINKS_QUERY, (article_id, match_lang))
         results = cursor.fetchall()
         return results[0][2] if len(results) > 0 else None
 
-    def _write_output_tsv(self, outfile: str, lines: List[Tuple[str]]):
+    def _open_outputs(self) -> "BlockWriter":
+        """
+        opens the output files (and the manifest) for appending serialized rows. the writer is kept
+        outside of the parser, which is pickled for every task.
+        """
+        header = {
+            "input_lang": self.input_lang,
+            "match_lang": self.match_lang or "",
+            "match": os.path.abspath(self.match_file),
+            "no_match": os.path.abspath(self.no_match_file) if self.no_match_file else "",
+        }
+        return BlockWriter(
+            self.match_file,
+            self.no_match_file if self.find_corresponding_article_title else None,
+            self.manifest_file,
+            header,
+        )
+
+    def _close_outputs(self, writer: "BlockWriter"):
         """
-        writes the tuples (each representing a line) in a list into a tsv
+        closes the output files and reports reused and deleted articles of the previous run.
         """
-        with open(outfile, "a", encoding="utf8") as outfile:
-            writer = csv.writer(outfile, delimiter="\t", quotechar='"')
-            for line in lines:
-                writer.writerow(line)
+        writer.close()
+        if self.previous_manifest is None:
+            return
+        parsed_ids = writer.parsed_ids()
+        self._debug(
+            f"Reused {writer.n_reused} unchanged articles, "
+            + f"parsed {len(parsed_ids) - writer.n_reused} changed or new articles."
+        )
+        previous_ids = _load_previous_manifest(self.previous_manifest)[1]["article_id"]
+        deleted_ids = np.setdiff1d(previous_ids, parsed_ids)
+        self._debug(f"{len(deleted_ids)} articles of the previous run have been deleted.")
+        if self.deleted_file is not None:
+            with open(self.deleted_file, "w", encoding="utf8") as outfile:
+                for article_id in deleted_ids:
+                    outfile.write(f"{article_id}\n")
+
+    def _cache_key(self) -> str:
+        """
+        returns the key of the outputs of this run in the stage cache.
+        """
+        params = {
+            "input_lang": self.input_lang,
+            "match_lang": self.match_lang,
+            "database": {
+                key: value
+                for key, value in (self.mysql_dict or {}).items()
+                if key in ("host", "database")
+            },
+            "outputs": [path is not None for path in self._output_files(all_outputs=True)],
+        }
+        if self.num_shards is not None:
+            params["shard"] = [self.shard_index, self.num_shards]
+        if self.manifest_file is not None or self.num_shards is not None:
+            # the headers of the manifests contain the paths of the outputs
+            params["output_paths"] = [os.path.abspath(path) for path in self._output_files()]
+        return self.cache.key(type(self).__name__, params, [self.input_dir, self.previous_manifest])
+
+    def _output_files(self, all_outputs: bool = False) -> List[Optional[str]]:
+        """
+        returns the paths of the output files written by this run (or of all outputs, including
+        None for the outputs which are not written).
+        """
+        outputs = [
+            self.match_file,
+            self.no_match_file if self.find_corresponding_article_title else None,
+            self.manifest_file,
+            self.deleted_file if self.previous_manifest is not None else None,
+        ]
+        if self.num_shards is not None:
+            outputs.append(shard_manifest_path(self.match_file))
+        return outputs if all_outputs else [path for path in outputs if path is not None]
+
+    def _restore_cached_outputs(self) -> bool:
+        if self.cache is None:
+            return False
+        with self.profiler.stage("cache"):
+            return self.cache.restore(self._cache_key(), self._output_files())
+
+    def _store_cached_outputs(self):
+        if self.cache is None:
+            return
+        with self.profiler.stage("cache"):
+            self.cache.store(self._cache_key(), self._output_files(), type(self).__name__)
 
     def _debug(
         self,
@@ -265,3 +1118,198 @@ class DocumentParser(object):
         if self.verbose >= level:
             output = sys.stderr if not self.verbose > 50 else sys.stdout
             print(spacing + prefix + message + end_spacing, file=output)
+
+
+class BlockWriter(object):
+    def __init__(
+        self, match_file: str, no_match_file: str, manifest_file: str, header: Dict[str, str]
+    ):
+        """
+        appends the serialized rows of articles to the output files and records their positions in
+        a manifest.
+
+        Args:
+        match_file      output file for articles with a match.
+        no_match_file   output file for articles with no match (or None).
+        manifest_file   output file for the manifest (or None).
+        header          the settings and output paths of the run written at the top of the manifest.
+        """
+        self.outputs = {"match": open_file(match_file, "ab")}
+        if no_match_file is not None:
+            self.outputs["no_match"] = open_file(no_match_file, "ab")
+        self.manifest = None
+        if manifest_file is not None:
+            self.manifest = open(manifest_file, "w", encoding="utf8")
+            for key, value in header.items():
+                self.manifest.write(f"#{key}\t{value}\n")
+        self.n_articles = 0
+        self.n_reused = 0
+        self._parsed_ids = []
+        self._shards: Dict[str, int] = {}
+
+    def write(self, blocks: List[ArticleBlock]):
+        """
+        appends the rows of a list of articles (or of the ShardBlocks of a task) to the outputs.
+        """
+        if isinstance(blocks, ShardBlocks):
+            self._write_shard(blocks)
+            return
+        for block in blocks:
+            outfile = self.outputs["match" if block.matched else "no_match"]
+            offset = outfile.tell()
+            outfile.write(block.data)
+            if self.manifest is not None:
+                self.manifest.write(
+                    f"{block.article_id}\t{block.content_hash:016x}\t{int(block.matched)}\t"
+                    + f"{offset}\t{len(block.data)}\n"
+                )
+            self.n_reused += block.reused
+        self.n_articles += len(blocks)
+        self._parsed_ids.append(np.array([int(block.article_id) for block in blocks], dtype="<i8"))
+
+    def _write_shard(self, shard: ShardBlocks):
+        """
+        copies the rows of a task from the shard files of a worker process to the outputs.
+        """
+        starts = {}
+        for output, (path, offset, length) in shard.ranges.items():
+            outfile = self.outputs[output]
+            if path not in self._shards:
+                self._shards[path] = os.open(path, os.O_RDONLY)
+            starts[output] = outfile.tell()
+            append_range(self._shards[path], outfile, offset, length)
+        entries = shard.entries
+        if self.manifest is not None:
+            for entry in entries:
+                start = starts["match" if entry["matched"] else "no_match"]
+                self.manifest.write(
+                    f"{entry['article_id']}\t{entry['content_hash']:016x}\t{int(entry['matched'])}\t"
+                    + f"{start + entry['offset']}\t{entry['length']}\n"
+                )
+        self.n_reused += int(entries["reused"].sum())
+        self.n_articles += len(entries)
+        self._parsed_ids.append(entries["article_id"].astype("<i8"))
+
+    def truncate(self, positions: Dict[str, int]):
+        """
+        removes the rows written after @param positions from the outputs.
+        """
+        for output, outfile in self.outputs.items():
+            outfile.flush()
+            os.ftruncate(outfile.fileno(), positions[output])
+            outfile.seek(0, os.SEEK_END)
+
+    def sync(self):
+        """
+        flushes the outputs to disk.
+        """
+        for outfile in self.outputs.values():
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    def positions(self) -> Dict[str, int]:
+        """
+        returns the current sizes of the outputs.
+        """
+        return {output: outfile.tell() for output, outfile in self.outputs.items()}
+
+    def parsed_ids(self) -> np.ndarray:
+        """
+        returns the ids of all articles written so far.
+        """
+        return np.concatenate(self._parsed_ids) if self._parsed_ids else np.array([], dtype="<i8")
+
+    def close(self):
+        for outfile in self.outputs.values():
+            outfile.close()
+        if self.manifest is not None:
+            self.manifest.close()
+        # the shard files have been copied to the outputs
+        for path, fd in self._shards.items():
+            os.close(fd)
+            os.remove(path)
+
+
+class ParseJournal(object):
+    def __init__(self, path: str, header: Dict):
+        """
+        an append-only journal of the files parsed by a run. the first line contains the settings
+        of the run, every further line a parsed (or quarantined) file with the ranges of its rows
+        in the outputs. a line is only added after the rows have been written to disk, so the
+        outputs are complete up to the positions of the last line.
+
+        Args:
+        path        the journal file (json lines).
+        header      the settings of the run, which must be the same when the run is resumed.
+        """
+        self.path = path
+        self.header = header
+        self.entries: Dict[str, Dict] = {}
+        self._outfile = None
+
+    def load(self) -> bool:
+        """
+        reads the entries of an existing journal. a line which has not been written completely
+        (e.g. when the run has been killed) is removed. returns False if there is no journal.
+        """
+        if not os.path.exists(self.path):
+            return False
+        n_valid = 0
+        with open(self.path, "rb") as infile:
+            for i, line in enumerate(infile):
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                if i == 0:
+                    assert record == self.header, (
+                        f"The journal {self.path} belongs to a run with different settings "
+                        + f"({record}). Please remove it to start a new run."
+                    )
+                else:
+                    self.entries[record["file"]] = record
+                n_valid += len(line)
+        os.truncate(self.path, n_valid)
+        return n_valid > 0
+
+    def failures(self) -> List[Dict]:
+        """
+        returns the entries of the quarantined files.
+        """
+        return [entry for entry in self.entries.values() if "error" in entry]
+
+    def positions(self) -> Dict[str, int]:
+        """
+        returns the end positions of the rows of the last file in the journal.
+        """
+        positions = {}
+        for entry in self.entries.values():
+            for output in self.header["outputs"]:
+                positions[output] = max(positions.get(output, 0), entry[output][1])
+        return positions
+
+    def record(self, entry: Dict):
+        """
+        appends an entry to the journal and flushes it to disk. quarantined files are also
+        written to <journal>.quarantine.
+        """
+        if self._outfile is None:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._outfile = open(self.path, "a", encoding="utf8")
+            if new:
+                self._outfile.write(json.dumps(self.header) + "\n")
+        self._outfile.write(json.dumps(entry) + "\n")
+        self._outfile.flush()
+        os.fsync(self._outfile.fileno())
+        self.entries[entry["file"]] = entry
+        if "error" in entry:
+            with open(self.path + ".quarantine", "a", encoding="utf8") as outfile:
+                error = entry["error"].strip().split("\n")[-1]
+                outfile.write(f"{entry['file']}\t{entry['attempts']}\t{error}\n")
+
+    def close(self):
+        if self._outfile is not None:
+            self._outfile.close()
+            self._outfile = None
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import html
+import os
+import pathos.multiprocessing as mp
+import re
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from DocumentParser import COLUMN_DICT, ArticleBlock, DocumentParser
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.parallel import bounded_imap  # noqa: E402
+from common.profiling import Profiler  # noqa: E402
+from common.stage_cache import StageCache  # noqa: E402
+from common.wikidump import Page, iter_pages, read_url_base  # noqa: E402
+
+COMMENT_REGEX = re.compile(r"<!--.*?-->", re.DOTALL)
+REF_REGEX = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+TEMPLATE_REGEX = re.compile(r"\{\{[^{}]*\}\}")
+TABLE_REGEX = re.compile(r"\{\|(?:(?!\{\|).)*?\|\}", re.DOTALL)
+# files, categories and interlanguage links (e.g. [[File:...]], [[Kategorie:...]], [[de:...]])
+LINK_PREFIX = r"\s*(?:File|Image|Media|Category|Datei|Bild|Kategorie|[a-z]{2,3}(?:-[a-z]+)?):"
+LINK_REGEX = re.compile(
+    r"\[\[(?!" + LINK_PREFIX + r")(?:[^\[\]|]*\|)?([^\[\]]*)\]\]", re.IGNORECASE
+)
+PREFIXED_LINK_REGEX = re.compile(r"\[\[" + LINK_PREFIX + r"[^\[\]]*\]\]", re.IGNORECASE)
+EXTERNAL_LINK_REGEX = re.compile(r"\[(?:https?:)?//[^\s\]]+(?: ([^\]]*))?\]")
+FORMATTING_REGEX = re.compile(r"'{2,}")
+TAG_REGEX = re.compile(r"<[^>]*>")
+HEADING_REGEX = re.compile(r"^(={2,6})\s*(.*?)\s*\1\s*$")
+SKIPPED_LINE_STARTS = ("*", "#", ":", ";", "{", "|", "!")
+
+
+def strip_wikitext(text: str) -> List[str]:
+    """
+    converts wikitext to plain text lines. headings are converted to section markers of the form
+    "Section::::<title>." as produced by the WikiExtractor (with --sections). like the
+    WikiExtractor, lists, tables and headings of empty sections are dropped.
+
+    Args:
+        text    the wikitext of a page
+
+    Returns:
+        lines   a list of plain text lines
+    """
+    text = COMMENT_REGEX.sub("", text)
+    text = REF_REGEX.sub("", text)
+    # nested templates and tables are removed from the inside out
+    for regex in (TEMPLATE_REGEX, TABLE_REGEX):
+        n_subs = 1
+        while n_subs:
+            text, n_subs = regex.subn("", text)
+    # links inside of file captions are resolved first, then files, categories and interwiki links
+    # are removed
+    n_subs = 1
+    while n_subs:
+        text, n_subs = LINK_REGEX.subn(r"\1", text)
+        text, removed = PREFIXED_LINK_REGEX.subn("", text)
+        n_subs += removed
+    text = EXTERNAL_LINK_REGEX.sub(lambda match: match.group(1) or "", text)
+    text = FORMATTING_REGEX.sub("", text)
+    text = html.unescape(TAG_REGEX.sub("", text))
+
+    lines = []
+    headings = {}
+    for line in text.split("\n"):
+        line = line.strip()
+        heading = HEADING_REGEX.match(line)
+        if heading:
+            level = len(heading.group(1))
+            headings = {lev: title for lev, title in headings.items() if lev < level}
+            headings[level] = heading.group(2)
+        elif line and not line.startswith(SKIPPED_LINE_STARTS):
+            for level in sorted(headings):
+                lines.append(f"Section::::{headings[level]}.")
+            headings = {}
+            lines.append(line)
+    return lines
+
+
+class DumpParser(DocumentParser):
+    def __init__(
+        self,
+        dump_file: str,
+        input_lang: str,
+        match_file: str,
+        match_lang: str = None,
+        no_match_file: str = None,
+        mysql_dict: Dict = None,
+        n_processes: int = mp.cpu_count(),
+        n_pages: int = 1000,
+        manifest_file: str = None,
+        previous_manifest: str = None,
+        deleted_file: str = None,
+        profiler: Profiler = None,
+        cache: StageCache = None,
+        shard_dir: str = None,
+        verbose: int = 1,
+    ):
+        """
+        parses the articles of a wikipedia xml dump directly, without extracting them to files in
+        medialab document format first. the output is the same as for DocumentParser.
+
+        Args:
+        dump_file       a wikipedia xml dump (.xml or .xml.bz2).
+        input_lang      language the input (used for sentence splitting)
+        match_file      output file for articles with a match. if no @param match_lang is provided,
+                            all output will be written to this file.
+        match_lang      the wikipedia language code for which titles will be queried in the langlinks table.
+        no_match_file   output file for articles with no match.
+        mysql_dict      a dictionary containing arguments for the mysql.connector used to access the langlinks table
+                            in a mysql databank.
+        n_processes     the number of parallel processes to be run.
+        n_pages         the number of pages handled per task.
+        manifest_file   output file for the content hashes and output positions of all articles.
+        previous_manifest
+                        the manifest of a previous run, see DocumentParser.
+        deleted_file    output file for the ids of articles of the previous run which no longer exist.
+        profiler        a Profiler collecting stage timings and counters of the run.
+        cache           a StageCache for the outputs of the run, see DocumentParser.
+        shard_dir       a directory for the shard files of the worker processes, see DocumentParser.
+        verbose         the verbosity level.
+        """
+        super().__init__(
+            dump_file,
+            input_lang,
+            match_file,
+            match_lang=match_lang,
+            no_match_file=no_match_file,
+            mysql_dict=mysql_dict,
+            n_processes=n_processes,
+            manifest_file=manifest_file,
+            previous_manifest=previous_manifest,
+            deleted_file=deleted_file,
+            profiler=profiler,
+            cache=cache,
+            shard_dir=shard_dir,
+            verbose=verbose,
+        )
+        self.dump_file = dump_file
+        self.n_pages = n_pages
+        self.url_base = None
+
+    def parse_documents(self) -> Dict[str, int]:
+        """
+        parses the articles in the dump and writes the parsed lines into tsv files. pages are read
+        by a streaming xml parser and handed to the worker processes in batches.
+        """
+        if self._restore_cached_outputs():
+            return dict(COLUMN_DICT)
+        self.url_base = read_url_base(self.dump_file)
+        self._debug(f"Parsing {self.dump_file} (article urls: {self.url_base}?curid=<id>)...")
+        with mp.Pool(processes=self.n_processes) as pool:
+            writer = self._open_outputs()
+            try:
+                for blocks, summary in bounded_imap(
+                    pool,
+                    self._task(self._parse_page_batch),
+                    self._page_batches(),
+                    2 * self.n_processes,
+                ):
+                    self.profiler.merge(summary)
+                    with self.profiler.stage("write"):
+                        writer.write(blocks)
+                    self._debug(f"Parsed {writer.n_articles} articles.")
+            finally:
+                self._close_outputs(writer)
+        self._store_cached_outputs()
+        return dict(COLUMN_DICT)
+
+    def _page_batches(self) -> Iterator[List[Page]]:
+        """
+        yields batches of n_pages articles (namespace 0, no redirects) from the dump.
+        """
+        batch = []
+        start = time.perf_counter()
+        for page in iter_pages(self.dump_file):
+            if page.ns != "0" or page.text.lstrip()[:9].upper() == "#REDIRECT":
+                continue
+            batch.append(page)
+            if len(batch) == self.n_pages:
+                self.profiler.add_time("read", time.perf_counter() - start)
+                yield batch
+                batch = []
+                start = time.perf_counter()
+        if batch:
+            self.profiler.add_time("read", time.perf_counter() - start)
+            yield batch
+
+    def _parse_page_batch(self, pages: List[Page]) -> Tuple[List[ArticleBlock], Dict]:
+        """
+        strips the wikitext of a batch of pages and generates lines ready for output. returns the
+        blocks and the profiler summary of the task.
+        """
+        profiler = Profiler()
+        articles = []
+        with profiler.stage("strip wikitext"):
+            for page in pages:
+                attrs = {
+                    "id": page.page_id,
+                    "url": f"{self.url_base}?curid={page.page_id}",
+                    "title": page.title,
+                }
+                articles.append((attrs, "\n".join(strip_wikitext(page.text))))
+        return self._parse_articles(articles, profiler), profiler.summary()
@@ -7,15 +7,22 @@ import pandas as pd
 import re
 import sys
 
-from typing import Dict
+from typing import Dict, List, Set
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.columnar import read_table  # noqa: E402
+from common.compressed_io import open_file  # noqa: E402
+from common.stage_cache import StageCache  # noqa: E402
 
 
 class URLFinder(object):
-    def __init__(self, verbose: int = 1):
+    def __init__(self, cache: StageCache = None, verbose: int = 1):
         """
         Args:
+        cache       an optional StageCache for the URL dictionaries of document directories.
         verbose     the verbosity level.
         """
+        self.cache = cache
         self.verbose = verbose
         self.all_files = None
         self.column_idx = None
@@ -34,6 +41,13 @@ class URLFinder(object):
                         http://medialab.di.unipi.it/wiki/Document_Format
         """
         self.document_dir = document_dir
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key("create_url_dict", {}, [document_dir])
+            self.url_dict = self.cache.load(cache_key)
+            if self.url_dict is not None:
+                self._debug(f"Loaded the URLs for {len(self.url_dict)} articles from the cache.")
+                return
         self.all_files = [
             os.path.join(root, file)
             for root, _, files in os.walk(self.document_dir)
@@ -47,46 +61,70 @@ class URLFinder(object):
             result_list += [result]
         self.url_dict = {key: value for d in result_list for key, value in d.items()}
         self._debug(f"Sucessfully extracted the URLs for {len(self.url_dict)} articles.")
+        if cache_key is not None:
+            self.cache.save(cache_key, self.url_dict, "create_url_dict")
 
     def add_url_column(self, input_file: str, column_idx: int, output_file: str):
         """
         Adds a column containing the URLs for every title in a specified (by index) column.
 
         Args:
-        input_file      the name of a tsv file containig a column of article title to be mapped to URLs.
+        input_file      the name of a tsv (or parquet) file containig a column of article title to be mapped to URLs.
         column_idx      the index of the column containing the article titles.
-        output_file     the output file where the new file will be saved.
+        output_file     the output file where the new file will be saved (compressed if it ends in
+                            .gz, .bz2, .zst or .xz).
         """
         self._debug(f"Adding a column with URLs and saving to {output_file}...")
         self.input_file = input_file
         self.column_idx = column_idx
         self.output_file = output_file
-        self.df = pd.read_csv(input_file, sep="\t", quotechar='"', header=None)
-        url_list = []
-        warned = []
-        for _, row in self.df.iterrows():
-            try:
-                url_list.append(self.url_dict[row[column_idx]])
-            except KeyError:
-                url_list.append("NOT_FOUND")
-                if row[column_idx] not in warned:
-                    self._debug(
-                        f'Could not find the URL for article title "{row[column_idx]}".',
-                        prefix="WARNING:\t",
-                    )
-                    warned.append(row[column_idx])
+        self.df = read_table(input_file)
+        warned = set()
+        url_list = [self._lookup_url(row[column_idx], warned) for _, row in self.df.iterrows()]
         self.df_url = self.df.copy()
         self.df_url.insert(column_idx + 1, column_idx + 1, pd.Series(url_list))
-        self.df_url.to_csv(output_file, sep="\t", quotechar='"', index=False, header=False)
+        with open_file(output_file, "w", newline="") as outfile:
+            self.df_url.to_csv(outfile, sep="\t", quotechar='"', index=False, header=False)
         self._debug(f"Failed to find URLs for {len(warned)} articles.", prefix="WARNING\t")
         self._debug(f"Task completed and output saved to {output_file}.")
 
+    def add_urls(self, rows: List[List[str]], column_idx: int, warned: Set[str]) -> List[List[str]]:
+        """
+        Inserts the URL for the article title in a specified (by index) column after this column
+        into every row of a list (like add_url_column).
+
+        Args:
+        rows            the rows.
+        column_idx      the index of the column containing the article titles.
+        warned          the set of titles without URL which have already been reported.
+        """
+        return [
+            row[: column_idx + 1]
+            + [self._lookup_url(row[column_idx], warned)]
+            + row[column_idx + 1 :]
+            for row in rows
+        ]
+
+    def _lookup_url(self, title: str, warned: Set[str]) -> str:
+        """
+        returns the URL for an article title or the placeholder NOT_FOUND.
+        """
+        try:
+            return self.url_dict[title]
+        except KeyError:
+            if title not in warned:
+                self._debug(
+                    f'Could not find the URL for article title "{title}".', prefix="WARNING:\t"
+                )
+                warned.add(title)
+            return "NOT_FOUND"
+
     def _find_title_url(self, doc_file: str) -> Dict[str, str]:
         """
         Searches a file in medialab document format and returns a dictionary with article
         names as keys and URLs as values.
         """
-        with open(doc_file, encoding="utf8") as infile:
+        with open_file(doc_file) as infile:
             part_dict = {}
             for line in infile:
                 if line.startswith("<doc id="):
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import os
+import sys
+
+from typing import Dict, List
+
+from DocumentParser import append_range, partition_by_size, shard_manifest_path
+from URLFinder import URLFinder
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.compressed_io import open_file  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.stage_cache import StageCache, add_cache_args  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        nargs="+",
+        metavar="PATH",
+        required=True,
+        help="The shard manifests (<match file>.shard.json) or match files of all shards.",
+    )
+    parser.add_argument(
+        "-m",
+        "--match",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="Output file for the merged articles with a match.",
+    )
+    parser.add_argument(
+        "-n",
+        "--no-match",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Output file for the merged articles with no match.",
+    )
+    parser.add_argument(
+        "--input-urls",
+        type=str,
+        metavar="STRING",
+        help="A directory containing files in medialab document format for extracting other language URLs.",
+    )
+    parser.add_argument(
+        "--output-url-file",
+        type=str,
+        metavar="STRING",
+        help="The output file for the tsv with added URL for corresponding articles in other language.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="The verbosity level.",
+    )
+    add_profiling_args(parser)
+    add_cache_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+def read_shard_manifests(paths: List[str]) -> List[Dict]:
+    """
+    reads the shard manifests (a match file can be given instead of its manifest), sorted by
+    shard index.
+    """
+    manifests = []
+    for path in paths:
+        if not path.endswith(".shard.json"):
+            path = shard_manifest_path(path)
+        if not os.path.exists(path):
+            raise ValueError(f"{path} does not exist. Has the shard been parsed completely?")
+        with open(path, encoding="utf8") as infile:
+            manifests.append(json.load(infile))
+    return sorted(manifests, key=lambda manifest: manifest["shard_index"])
+
+
+def validate_shard_manifests(manifests: List[Dict]):
+    """
+    checks that the manifests belong to the shards of the same run, that every input file has been
+    parsed by the shard it is assigned to and that the outputs of the shards are complete. raises a
+    ValueError otherwise.
+    """
+    first = manifests[0]
+    for manifest in manifests:
+        for key in ("num_shards", "n_files", "input_lang", "match_lang"):
+            if manifest[key] != first[key]:
+                raise ValueError(
+                    f"Shard {manifest['shard_index']} has been parsed with {key}={manifest[key]}, "
+                    + f"shard {first['shard_index']} with {key}={first[key]}."
+                )
+        if set(manifest["outputs"]) != set(first["outputs"]):
+            raise ValueError("Only some of the shards have been parsed with --match-lang.")
+    indices = [manifest["shard_index"] for manifest in manifests]
+    if indices != list(range(first["num_shards"])):
+        missing = sorted(set(range(first["num_shards"])) - set(indices))
+        raise ValueError(f"Missing or duplicate shards (missing: {missing}, given: {indices}).")
+
+    sizes = [None] * first["n_files"]
+    for manifest in manifests:
+        for entry in manifest["files"]:
+            if not 0 <= entry["index"] < len(sizes) or sizes[entry["index"]] is not None:
+                raise ValueError(f"{entry['path']} has an invalid or duplicate file index.")
+            sizes[entry["index"]] = entry["size"]
+    if None in sizes:
+        raise ValueError(f"{sizes.count(None)} input files have not been parsed by any shard.")
+    # the assignment of the files is recomputed to detect shards of different input directories
+    for manifest, part in zip(manifests, partition_by_size(sizes, first["num_shards"])):
+        if [entry["index"] for entry in manifest["files"]] != part:
+            raise ValueError(
+                f"The files of shard {manifest['shard_index']} do not match the files assigned to "
+                + "it. Have the shards been parsed from the same input files?"
+            )
+
+    for manifest in manifests:
+        for output, info in manifest["outputs"].items():
+            if not os.path.exists(info["path"]) or os.path.getsize(info["path"]) != info["size"]:
+                raise ValueError(
+                    f"{info['path']} is missing or has been modified since shard "
+                    + f"{manifest['shard_index']} has been parsed."
+                )
+            position = 0
+            for entry in manifest["files"]:
+                if entry[output][0] != position or entry[output][1] < position:
+                    raise ValueError(
+                        f"The ranges of {output} rows in shard {manifest['shard_index']} are not "
+                        + "contiguous."
+                    )
+                position = entry[output][1]
+            if position != info["size"]:
+                raise ValueError(
+                    f"The ranges of {output} rows in shard {manifest['shard_index']} do not cover "
+                    + f"{info['path']}."
+                )
+
+
+def merge_shards(manifests: List[Dict], output_files: Dict[str, str]) -> Dict[str, int]:
+    """
+    concatenates the rows of all input files from the outputs of the shards in the order of the
+    input files, i.e. like a single run over all files.
+
+    Args:
+        manifests:      the validated shard manifests.
+        output_files:   the merged output file of every output ("match" and "no_match"), compressed
+                        if it ends in .gz, .bz2, .zst or .xz.
+
+    Returns:
+        sizes:          the number of (uncompressed) bytes written to every output.
+    """
+    entries = sorted(
+        (entry["index"], entry, manifest) for manifest in manifests for entry in manifest["files"]
+    )
+    inputs = {}
+    outputs = {output: open_file(path, "wb") for output, path in output_files.items()}
+    try:
+        for _, entry, manifest in entries:
+            for output, outfile in outputs.items():
+                path = manifest["outputs"][output]["path"]
+                if path not in inputs:
+                    inputs[path] = os.open(path, os.O_RDONLY)
+                start, end = entry[output]
+                append_range(inputs[path], outfile, start, end - start)
+        return {output: outfile.tell() for output, outfile in outputs.items()}
+    finally:
+        for outfile in outputs.values():
+            outfile.close()
+        for fd in inputs.values():
+            os.close(fd)
+
+
+def main(args: argparse.Namespace):
+    assert bool(args.input_urls) == bool(args.output_url_file), (
+        "URL extraction requires an input directory (arg --input-urls) and an output file "
+        + "(arg --output-url-file)."
+    )
+
+    profiler = Profiler.from_args("merge_shards", args).start()
+
+    with profiler.stage("validate"):
+        manifests = read_shard_manifests(args.input)
+        validate_shard_manifests(manifests)
+    output_files = {"match": args.match}
+    if "no_match" in manifests[0]["outputs"]:
+        assert args.no_match is not None, (
+            "The shards have been parsed with --match-lang. "
+            + "Please provide an output file for articles with no match (arg --no-match)."
+        )
+        output_files["no_match"] = args.no_match
+    with profiler.stage("merge"):
+        sizes = merge_shards(manifests, output_files)
+    for output, n_bytes in sizes.items():
+        profiler.count(f"{output} bytes", n_bytes)
+    if args.verbose >= 1:
+        print(
+            f"INFO:\tMerged {manifests[0]['n_files']} files of {len(manifests)} shards "
+            + f"({', '.join(f'{output}: {n} bytes' for output, n in sizes.items())}).",
+            file=sys.stderr,
+        )
+
+    if args.input_urls:
+        # adding a column with URLs of articles in the other language
+        with profiler.stage("url lookup"):
+            finder = URLFinder(cache=StageCache.from_args(args), verbose=args.verbose)
+            finder.create_url_dict(args.input_urls)
+            finder.add_url_column(args.match, 7, args.output_url_file)
+
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
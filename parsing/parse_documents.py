@@ -3,11 +3,18 @@
 # Author: Nicolas Spring
 
 import argparse
+import os
 import pathos.multiprocessing as mp
+import sys
 
 from DocumentParser import DocumentParser
+from DumpParser import DumpParser
 from URLFinder import URLFinder
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.stage_cache import StageCache, add_cache_args  # noqa: E402
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
@@ -24,8 +31,8 @@ def parse_args() -> argparse.Namespace:
         "--input",
         type=str,
         metavar="PATH",
-        required=True,
-        help="A directory containing files in medialab document format for parsing.",
+        help="A directory containing files in medialab document format for parsing "
+        + "(files ending in .gz, .bz2, .zst or .xz are decompressed).",
     )
     parser.add_argument(
         "-m",
@@ -33,7 +40,8 @@ def parse_args() -> argparse.Namespace:
         type=str,
         metavar="PATH",
         help="Output file for articles with a match. "
-        + "If no --match-lang is provided, all output will be written to this file.",
+        + "If no --match-lang is provided, all output will be written to this file. "
+        + "Compressed if PATH ends in .gz, .bz2, .zst or .xz.",
     )
     parser.add_argument(
         "-n",
@@ -77,6 +85,91 @@ def parse_args() -> argparse.Namespace:
         metavar="STRING",
         help="The host of the databank containing the langlinks table.",
     )
+    parser.add_argument(
+        "--input-dump",
+        type=str,
+        metavar="PATH",
+        help="A Wikipedia xml dump (.xml or .xml.bz2) to parse directly instead of --input.",
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        metavar="INT",
+        default=1000,
+        help="The number of pages handled per task when parsing --input-dump.",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        metavar="PATH",
+        help="Output file for the content hashes of all articles, "
+        + "used as --previous-manifest for the next dump version.",
+    )
+    parser.add_argument(
+        "--previous-manifest",
+        type=str,
+        metavar="PATH",
+        help="The manifest of a previous run. Unchanged articles are copied from its outputs "
+        + "instead of being parsed again.",
+    )
+    parser.add_argument(
+        "--deleted",
+        type=str,
+        metavar="PATH",
+        help="Output file for the ids of articles of the previous run which have been deleted.",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        type=str,
+        metavar="PATH",
+        help="A directory for shard files. The worker processes write their rows to shard files "
+        + "which are copied to the output files, instead of sending them to the main process.",
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        metavar="INT",
+        help="Only parse this shard of the input files (0 to --num-shards - 1), e.g. on one node "
+        + "of many. The shards are merged with merge_shards.py.",
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        metavar="INT",
+        help="The number of shards the input files are split into (balanced by size).",
+    )
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        choices=["chunks", "lpt"],
+        default="chunks",
+        help="How files are distributed to the processes: in chunks of --processes * --files "
+        + "files (chunks), or the largest files first to whichever process is free (lpt). "
+        + "(default: chunks)",
+    )
+    parser.add_argument(
+        "--split-size",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="With --schedule lpt, files larger than this many MB are split into parts of about "
+        + "this size, which are parsed as separate tasks.",
+    )
+    parser.add_argument(
+        "--journal",
+        type=str,
+        metavar="PATH",
+        help="A journal of the parsed files. If it exists, the run is resumed after the last file "
+        + "in the journal. Files which fail are quarantined instead of stopping the run.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        metavar="INT",
+        default=2,
+        help="With --journal, the number of retries of a failed file before it is quarantined. "
+        + "(default: 2)",
+    )
     parser.add_argument(
         "--input-lang",
         type=str,
@@ -107,6 +200,8 @@ def parse_args() -> argparse.Namespace:
         metavar="STRING",
         help="The output file for the tsv with added URL for corresponding articles in other language.",
     )
+    add_profiling_args(parser)
+    add_cache_args(parser)
     args = parser.parse_args()
     return args
 
@@ -117,26 +212,77 @@ def main(args: argparse.Namespace):
         + "Use arg --no-urls to skip foreign URL extraction."
     )
 
+    assert bool(args.input) != bool(
+        args.input_dump
+    ), "Please provide either an input directory (arg --input) or a dump (arg --input-dump)."
+
+    assert args.num_shards is None or (args.input and args.no_urls), (
+        "Shards can only be parsed from an input directory (arg --input) without URL lookups "
+        + "(arg --no-urls). URLs are added when merging the shards with merge_shards.py."
+    )
+
+    assert (
+        args.journal is None or args.input
+    ), "A journal can only be used when parsing an input directory (arg --input)."
+
+    profiler = Profiler.from_args("parse_documents", args).start()
+    cache = StageCache.from_args(args)
+
     # parsing the documents and writing to a tsv file
     databank_login = {"user": args.db_user, "host": args.db_host, "database": args.db_database}
-    doc_parser = DocumentParser(
-        args.input,
-        args.input_lang,
-        args.match,
-        match_lang=args.match_lang,
-        no_match_file=args.no_match,
-        mysql_dict=databank_login,
-        n_processes=args.processes,
-        n_files=args.files,
-        verbose=args.verbose,
-    )
+    if args.input_dump:
+        doc_parser = DumpParser(
+            args.input_dump,
+            args.input_lang,
+            args.match,
+            match_lang=args.match_lang,
+            no_match_file=args.no_match,
+            mysql_dict=databank_login,
+            n_processes=args.processes,
+            n_pages=args.pages,
+            manifest_file=args.manifest,
+            previous_manifest=args.previous_manifest,
+            deleted_file=args.deleted,
+            profiler=profiler,
+            cache=cache,
+            shard_dir=args.shard_dir,
+            verbose=args.verbose,
+        )
+    else:
+        doc_parser = DocumentParser(
+            args.input,
+            args.input_lang,
+            args.match,
+            match_lang=args.match_lang,
+            no_match_file=args.no_match,
+            mysql_dict=databank_login,
+            n_processes=args.processes,
+            n_files=args.files,
+            manifest_file=args.manifest,
+            previous_manifest=args.previous_manifest,
+            deleted_file=args.deleted,
+            profiler=profiler,
+            cache=cache,
+            shard_dir=args.shard_dir,
+            shard_index=args.shard_index,
+            num_shards=args.num_shards,
+            schedule=args.schedule,
+            split_size=args.split_size * 2**20 if args.split_size else None,
+            journal_file=args.journal,
+            max_retries=args.retries,
+            verbose=args.verbose,
+        )
     doc_parser.parse_documents()
 
     if not args.no_urls:
         # adding a column with URLs of articles in the other language
-        finder = URLFinder(verbose=args.verbose)
-        finder.create_url_dict(args.input_urls)
-        finder.add_url_column(args.match, 7, args.output_url_file)
+        with profiler.stage("url lookup"):
+            finder = URLFinder(cache=cache, verbose=args.verbose)
+            finder.create_url_dict(args.input_urls)
+            finder.add_url_column(args.match, 7, args.output_url_file)
+
+    if args.profile:
+        profiler.write_report(args.profile)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import csv
+import os
+import pathos.multiprocessing as mp
+import queue
+import sys
+import threading
+
+from collections import deque
+from typing import Any, Callable, Iterator, List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.parallel import bounded_imap  # noqa: E402
+from common.profiling import Profiler  # noqa: E402
+
+Rows = List[List[str]]
+
+# marks the end of the batches passed between two stages
+END = object()
+
+
+class Stage(object):
+    # the line ending of the written rows, the same as in the output of the separate script (rows
+    # written with pandas end in "\n", rows written with the csv module in "\r\n")
+    lineterminator = "\n"
+
+    def __init__(self, name: str, n_processes: int = 0):
+        """
+        a stage of the pipeline. every stage runs in its own thread, which receives batches of rows
+        from the previous stage and passes batches of rows to the next stage. the expensive part
+        of a stage (worker()) can be run in a process pool of its own.
+
+        a batch is handled in three steps:
+            task = prepare(batch)       in the stage thread
+            result = worker()(task)     in a worker process (or in the stage thread)
+            rows = emit(batch, result)  in the stage thread, rows are passed to the next stage
+
+        Args:
+        name            the name of the stage (used for materialized outputs and profiling).
+        n_processes     the size of the process pool of the stage. 0 runs the worker in the stage
+                            thread.
+        """
+        self.name = name
+        self.n_processes = n_processes
+
+    def source(self) -> Iterator[Any]:
+        """
+        the input of the first stage of a pipeline.
+        """
+        raise NotImplementedError(f"Stage {self.name} can not be the first stage of a pipeline.")
+
+    def open(self):
+        """
+        called in the stage thread before the first batch (e.g. to load lookup tables or open
+        output files). everything opened here stays in the main process.
+        """
+        pass
+
+    def prepare(self, batch: Any) -> Any:
+        return batch
+
+    def worker(self) -> Optional[Callable[[Any], Any]]:
+        """
+        returns the function run for every task (it is pickled and sent to the worker processes),
+        or None if the stage has no expensive step.
+        """
+        return None
+
+    def emit(self, batch: Any, result: Any) -> Optional[Rows]:
+        return result
+
+    def close(self):
+        pass
+
+
+class Pipeline(object):
+    def __init__(
+        self,
+        stages: List[Stage],
+        output_file: str = None,
+        materialize_dir: str = None,
+        queue_size: int = 4,
+        profiler: Profiler = None,
+        verbose: int = 1,
+    ):
+        """
+        connects stages with bounded queues and runs them concurrently.
+
+        Args:
+        stages          the stages, the first stage provides the input (see Stage.source).
+        output_file     optional tsv file for the rows emitted by the last stage.
+        materialize_dir optional directory for the rows emitted by every stage (<name>.tsv).
+        queue_size      the maximum number of batches waiting between two stages.
+        profiler        a Profiler collecting the time spent in every stage.
+        verbose         the verbosity level.
+        """
+        self.stages = stages
+        self.output_file = output_file
+        self.materialize_dir = materialize_dir
+        self.queue_size = queue_size
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.verbose = verbose
+        self._failed = threading.Event()
+        self._errors = []
+
+    def run(self):
+        """
+        runs all stages until the input of the first stage is exhausted.
+        """
+        if self.materialize_dir is not None:
+            os.makedirs(self.materialize_dir, exist_ok=True)
+        # the pools are created before any thread is started or any output file is opened, so that
+        # the forked worker processes neither inherit locks held by other threads nor file buffers
+        pools = [
+            mp.Pool(processes=stage.n_processes) if stage.n_processes > 0 else None
+            for stage in self.stages
+        ]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            inputs = stage.source() if i == 0 else self._iter_queue(queues[i - 1])
+            output = queues[i] if i < len(queues) else None
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(stage, inputs, output, pools[i]),
+                    name=stage.name,
+                )
+            )
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for pool in pools:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _run_stage(self, stage: Stage, inputs: Iterator, output: queue.Queue, pool):
+        outfiles = []
+        try:
+            stage.open()
+            if output is None and self.output_file is not None:
+                outfiles.append(open(self.output_file, "w", encoding="utf8", newline=""))
+            if self.materialize_dir is not None:
+                path = os.path.join(self.materialize_dir, stage.name + ".tsv")
+                outfiles.append(open(path, "w", encoding="utf8", newline=""))
+            writers = [
+                csv.writer(
+                    outfile, delimiter="\t", quotechar='"', lineterminator=stage.lineterminator
+                )
+                for outfile in outfiles
+            ]
+            for rows in self._stage_results(stage, inputs, pool):
+                if rows is None:
+                    continue
+                self.profiler.count(f"{stage.name} rows", len(rows))
+                for writer in writers:
+                    writer.writerows(rows)
+                if output is not None:
+                    self._put(output, rows)
+            stage.close()
+            self._debug(f"Stage {stage.name} finished.")
+        except BaseException as e:
+            self._errors.append(e)
+            self._failed.set()
+        finally:
+            for outfile in outfiles:
+                outfile.close()
+            if output is not None:
+                self._put(output, END, force=True)
+
+    def _stage_results(self, stage: Stage, inputs: Iterator, pool) -> Iterator[Optional[Rows]]:
+        """
+        yields the emitted rows of all batches in input order.
+        """
+        pending = deque()
+
+        def tasks():
+            for batch in inputs:
+                pending.append(batch)
+                with self.profiler.stage(f"{stage.name} prepare"):
+                    task = stage.prepare(batch)
+                yield task
+
+        worker = stage.worker()
+        if worker is None:
+            results = tasks()
+        elif pool is None:
+            results = map(worker, tasks())
+        else:
+            results = bounded_imap(pool, worker, tasks(), 2 * stage.n_processes)
+        while True:
+            # in the stage thread, the worker time is included in the time waiting for results
+            with self.profiler.stage(f"{stage.name} wait"):
+                result = next(results, END)
+            if result is END:
+                break
+            with self.profiler.stage(f"{stage.name} emit"):
+                rows = stage.emit(pending.popleft(), result)
+            self.profiler.count(f"{stage.name} batches")
+            yield rows
+
+    def _iter_queue(self, batches: queue.Queue) -> Iterator[Rows]:
+        while True:
+            batch = batches.get()
+            if batch is END:
+                return
+            yield batch
+
+    def _put(self, batches: queue.Queue, batch: Any, force: bool = False):
+        """
+        puts a batch into a bounded queue. gives up when another stage has failed (unless
+        @param force is set), so that no thread blocks forever.
+        """
+        while True:
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                if self._failed.is_set() and not force:
+                    raise RuntimeError("Pipeline aborted because a stage failed.")
+                if self._failed.is_set():
+                    # making room for the end marker, the batches will not be used anymore
+                    try:
+                        batches.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _debug(
+        self,
+        message: str,
+        level: int = 1,
+        prefix: str = "INFO:\t",
+        spacing: str = "",
+        end_spacing: str = "",
+    ):
+        """
+        prints debug messages according to the verbosity level.
+        """
+        if self.verbose >= level:
+            output = sys.stderr if not self.verbose > 50 else sys.stdout
+            print(spacing + prefix + message + end_spacing, file=output)
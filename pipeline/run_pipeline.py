@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import os
+import pathos.multiprocessing as mp
+import sys
+
+from pipeline import Pipeline
+from stages import AlignStage, PairStage, ParseStage, TranslateStage, URLStage
+from DeepLConnector import DeepLConnector
+from DocumentParser import DocumentParser
+from TranslationHandler import TranslationHandler
+from URLFinder import URLFinder
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.stage_cache import StageCache, add_cache_args  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="A directory containing files in medialab document format for parsing.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        help="Output file for the rows of articles with a match after the last stage.",
+    )
+    parser.add_argument(
+        "-n",
+        "--no-match",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Output file for articles with no match.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes parsing files.",
+    )
+    parser.add_argument(
+        "-q",
+        "--queue-size",
+        type=int,
+        metavar="INT",
+        default=4,
+        help="The maximum number of batches (files) waiting between two stages.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    parser.add_argument(
+        "--materialize",
+        type=str,
+        metavar="PATH",
+        help="Optional directory for the intermediate output of every stage (<stage>.tsv).",
+    )
+    parser.add_argument(
+        "--input-lang",
+        type=str,
+        metavar="STRING",
+        default="en",
+        help="The language of the input files",
+    )
+    parser.add_argument(
+        "--match-lang",
+        type=str,
+        metavar="STRING",
+        help="The Wikipedia language code for title matches.",
+    )
+    parser.add_argument(
+        "--db-user",
+        type=str,
+        metavar="STRING",
+        help="The mysql databank user with access to the langlinks table.",
+    )
+    parser.add_argument(
+        "--db-database",
+        type=str,
+        metavar="STRING",
+        help="The mysql database containing the langlinks table.",
+    )
+    parser.add_argument(
+        "--db-host",
+        type=str,
+        metavar="STRING",
+        help="The host of the databank containing the langlinks table.",
+    )
+    parser.add_argument(
+        "--alignment-files",
+        type=str,
+        nargs="+",
+        metavar="PATH",
+        help="Alignment files of the Parallel Wikipedia Dataset. Adds a stage finding their simple "
+        + "sentences in the parsed articles (like find_unchanged.py).",
+    )
+    parser.add_argument(
+        "--unchanged-output",
+        type=str,
+        metavar="PATH",
+        help="Output file for the sentences found in the --alignment-files.",
+    )
+    parser.add_argument(
+        "--input-urls",
+        type=str,
+        metavar="PATH",
+        help="A directory containing files in medialab document format for extracting other "
+        + "language URLs. Adds a stage inserting the URLs after the title column.",
+    )
+    parser.add_argument(
+        "--auth-key",
+        type=str,
+        metavar="STRING",
+        help="The authentication key for the DeepL API. Adds a stage translating the sentences.",
+    )
+    parser.add_argument(
+        "--save-file",
+        type=str,
+        metavar="PATH",
+        help="Save file for copies of freshly translated sentences.",
+    )
+    parser.add_argument(
+        "--source-lang",
+        type=str,
+        metavar="STRING",
+        default="EN",
+        help="DeepL API language code for the source language.",
+    )
+    parser.add_argument(
+        "--target-lang",
+        type=str,
+        metavar="STRING",
+        default="DE",
+        help="DeepL API language code for the target language.",
+    )
+    parser.add_argument(
+        "--translate-processes",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="The number of processes sending requests to the DeepL API.",
+    )
+    parser.add_argument(
+        "--previous",
+        type=str,
+        metavar="PATH",
+        help="A previously translated tsv (or parquet) file. Translations of unchanged sentences "
+        + "are reused.",
+    )
+    parser.add_argument(
+        "--de-tsv",
+        type=str,
+        metavar="PATH",
+        help="The parsed tsv of the matching articles. Adds a stage writing document pairs (like "
+        + "create_parallel_docs.py), requires --input-urls and --auth-key.",
+    )
+    parser.add_argument(
+        "--pairs-dir",
+        type=str,
+        metavar="PATH",
+        help="Output directory for the document pairs.",
+    )
+    add_profiling_args(parser)
+    add_cache_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+def main(args: argparse.Namespace):
+    assert (
+        not args.alignment_files or args.unchanged_output
+    ), "Finding unchanged sentences requires an output file (arg --unchanged-output)."
+    assert (
+        not args.auth_key or args.save_file
+    ), "Translating requires a save file (arg --save-file)."
+    assert (
+        not args.input_urls or args.match_lang
+    ), "Adding URLs requires the titles of the matching articles (arg --match-lang)."
+    assert not args.de_tsv or (args.pairs_dir and args.input_urls and args.auth_key), (
+        "Creating document pairs requires an output directory (arg --pairs-dir), "
+        + "URLs (arg --input-urls) and translations (arg --auth-key)."
+    )
+
+    profiler = Profiler.from_args("run_pipeline", args).start()
+
+    # the rows are passed on instead of being written to the match file
+    databank_login = {"user": args.db_user, "host": args.db_host, "database": args.db_database}
+    doc_parser = DocumentParser(
+        args.input,
+        args.input_lang,
+        os.devnull,
+        match_lang=args.match_lang,
+        no_match_file=args.no_match,
+        mysql_dict=databank_login,
+        n_processes=args.processes,
+        profiler=profiler,
+        verbose=args.verbose,
+    )
+    stages = [ParseStage(doc_parser, args.no_match if args.match_lang else None, args.processes)]
+    if args.alignment_files:
+        stages.append(AlignStage(args.alignment_files, args.unchanged_output))
+    if args.input_urls:
+        finder = URLFinder(cache=StageCache.from_args(args), verbose=args.verbose)
+        stages.append(URLStage(finder, args.input_urls))
+    if args.auth_key:
+        # the save file is emptied once, the connectors of all processes append to it
+        open(args.save_file, "w").close()
+        api_connector = DeepLConnector(
+            auth_key=args.auth_key,
+            save_path=args.save_file,
+            empty_save_file=False,
+            verbose=args.verbose,
+        )
+        translation_handler = TranslationHandler(verbose=args.verbose)
+        if args.previous:
+            translation_handler.read_previous_translations(args.previous, 6)
+        stages.append(
+            TranslateStage(
+                translation_handler,
+                api_connector,
+                6,
+                args.source_lang.upper(),
+                args.target_lang.upper(),
+                n_processes=args.translate_processes,
+            )
+        )
+    if args.de_tsv:
+        stages.append(PairStage(args.de_tsv, args.pairs_dir))
+
+    Pipeline(
+        stages,
+        output_file=args.output,
+        materialize_dir=args.materialize,
+        queue_size=args.queue_size,
+        profiler=profiler,
+        verbose=args.verbose,
+    ).run()
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
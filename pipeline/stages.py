@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import csv
+import os
+import re
+import sys
+
+from collections import deque
+from typing import Iterator, List, Optional, Set, Tuple
+
+from pipeline import Rows, Stage
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for directory in ("parsing", "translation", "alignment", "misc"):
+    sys.path.append(os.path.join(REPO_DIR, directory))
+sys.path.append(REPO_DIR)
+from DocumentParser import DocumentParser  # noqa: E402
+from URLFinder import URLFinder  # noqa: E402
+from TranslationHandler import TranslationHandler, sentence_keys  # noqa: E402
+from find_unchanged import (  # noqa: E402
+    make_sent_lookup_dict,
+    match_sentence,
+    merge_dfs,
+    read_alignment_file,
+)
+from create_parallel_docs import read_article_column  # noqa: E402
+from common.tsv_index import TSVIndex  # noqa: E402
+
+
+class ParseStage(Stage):
+    # like the match and no match files of parse_documents.py
+    lineterminator = "\r\n"
+
+    def __init__(self, parser: DocumentParser, no_match_file: str = None, n_processes: int = 1):
+        """
+        parses the files of a DocumentParser (one batch per file) and passes the rows of articles
+        with a match to the next stage.
+
+        Args:
+        parser          a DocumentParser. its output files are not written.
+        no_match_file   optional output file for the rows of articles with no match.
+        n_processes     the number of processes parsing files.
+        """
+        super().__init__("parse", n_processes)
+        self.parser = parser
+        self.no_match_file = no_match_file
+        self._no_match_outfile = None
+        self._no_match_writer = None
+
+    def source(self) -> Iterator[str]:
+        self.parser._create_chunks()
+        return iter(self.parser.all_files)
+
+    def open(self):
+        if self.no_match_file is not None:
+            self._no_match_outfile = open(self.no_match_file, "w", encoding="utf8", newline="")
+            self._no_match_writer = csv.writer(
+                self._no_match_outfile,
+                delimiter="\t",
+                quotechar='"',
+                lineterminator=self.lineterminator,
+            )
+
+    def worker(self):
+        return self.parser.parse_file
+
+    def emit(self, doc_file: str, result: Tuple[Rows, Rows]) -> Rows:
+        match_rows, no_match_rows = result
+        if self._no_match_writer is not None:
+            self._no_match_writer.writerows(no_match_rows)
+        return match_rows
+
+    def close(self):
+        if self._no_match_outfile is not None:
+            self._no_match_outfile.close()
+
+
+class AlignStage(Stage):
+    def __init__(
+        self, alignment_files: List[str], output_file: str, column_idx: int = 6, fuzzy: bool = True
+    ):
+        """
+        finds the sentences of the alignment files in the rows (like find_pendants) and writes the
+        matches to @param output_file. the rows are passed on unchanged.
+
+        Args:
+        alignment_files the tsv files containing simplewiki corpus alignments.
+        output_file     the output file for the sentences found in the alignment files.
+        column_idx      the index of the column containing the sentences.
+        fuzzy           ignore casing and punctuation.
+        """
+        super().__init__("align")
+        self.alignment_files = alignment_files
+        self.output_file = output_file
+        self.column_idx = column_idx
+        self.fuzzy = fuzzy
+        self.sent_lookup = None
+        self._outfile = None
+        self._writer = None
+
+    def open(self):
+        alignment_df = merge_dfs([read_alignment_file(path) for path in self.alignment_files])
+        self.sent_lookup = make_sent_lookup_dict(alignment_df, "simple", self.fuzzy)
+        self._outfile = open(self.output_file, "w", encoding="utf8")
+        self._writer = csv.writer(self._outfile, delimiter="\t", quotechar='"', lineterminator="\n")
+
+    def emit(self, batch: Rows, result: Rows) -> Rows:
+        for row in batch:
+            found = match_sentence(row[self.column_idx], self.sent_lookup, self.fuzzy)
+            if found is not None:
+                self._writer.writerow(
+                    [found["filename"], found["simple"], found["en"]]
+                    + row[:3]
+                    + [row[self.column_idx]]
+                )
+        return batch
+
+    def close(self):
+        self._outfile.close()
+
+
+class URLStage(Stage):
+    def __init__(self, finder: URLFinder, document_dir: str, column_idx: int = 7):
+        """
+        inserts the URL for the article title in column @param column_idx after this column (like
+        URLFinder.add_url_column).
+
+        Args:
+        finder          a URLFinder.
+        document_dir    a directory with the articles in the other language in medialab document format.
+        column_idx      the index of the column containing the article titles.
+        """
+        super().__init__("urls")
+        self.finder = finder
+        self.document_dir = document_dir
+        self.column_idx = column_idx
+        self.warned: Set[str] = set()
+
+    def open(self):
+        self.finder.create_url_dict(self.document_dir)
+
+    def emit(self, batch: Rows, result: Rows) -> Rows:
+        return self.finder.add_urls(batch, self.column_idx, self.warned)
+
+    def close(self):
+        sys.stderr.write(f"WARNING:\tFailed to find URLs for {len(self.warned)} articles.\n")
+
+
+class TranslateStage(Stage):
+    def __init__(
+        self,
+        handler: TranslationHandler,
+        api_connector,
+        column_idx: int,
+        source_lang: str,
+        target_lang: str,
+        n_processes: int = 1,
+    ):
+        """
+        appends the translation of column @param column_idx to every row (like
+        TranslationHandler.add_translation_column). previous translations read by the handler
+        (TranslationHandler.read_previous_translations) are reused.
+
+        Args:
+        handler         a TranslationHandler.
+        api_connector   an instance implementing translate_sentences (see TranslationHandler).
+        column_idx      the index of the column to be translated.
+        source_lang     the source language.
+        target_lang     the target language.
+        n_processes     the number of processes sending requests to the api.
+        """
+        super().__init__("translate", n_processes)
+        self.handler = handler
+        self.api_connector = api_connector
+        self.column_idx = column_idx
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        # keys of the batches between prepare and emit (both run in the stage thread in order)
+        self._pending_keys = deque()
+
+    def prepare(self, batch: Rows) -> List[str]:
+        sents = [row[self.column_idx] for row in batch]
+        if self.handler.previous_translations is None:
+            return sents
+        keys = sentence_keys([row[0] for row in batch], sents)
+        new_keys, new_sents = self.handler.find_new_sentences(keys, sents)
+        self._pending_keys.append((keys, new_keys))
+        return new_sents
+
+    def worker(self):
+        return _TranslationTask(self.api_connector, self.source_lang, self.target_lang)
+
+    def emit(self, batch: Rows, translations: List[str]) -> Rows:
+        if self.handler.previous_translations is not None:
+            keys, new_keys = self._pending_keys.popleft()
+            translations = self.handler.merge_translations(keys, new_keys, translations)
+        return [row + [translation] for row, translation in zip(batch, translations)]
+
+
+class _TranslationTask(object):
+    # only the connector is sent to the worker processes, not the previous translations
+    def __init__(self, api_connector, source_lang: str, target_lang: str):
+        self.api_connector = api_connector
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+
+    def __call__(self, sents: List[str]) -> List[str]:
+        if not sents:
+            return []
+        return self.api_connector.translate_sentences(sents, self.source_lang, self.target_lang)
+
+
+class PairStage(Stage):
+    def __init__(self, de_tsv: str, output_dir: str, url_column: int = 8, text_column: int = 9):
+        """
+        writes the document pairs of all articles (like create_parallel_docs.py): the translated
+        simple article (<simple id>_<de id>.simpde) and the matching de article (.de). the rows are
+        passed on unchanged.
+
+        Args:
+        de_tsv          the parsed tsv of the de articles (looked up with a TSVIndex).
+        output_dir      the output directory for the article pairs.
+        url_column      the index of the column containing the URL of the de article.
+        text_column     the index of the column containing the translated sentences.
+        """
+        super().__init__("pairs")
+        self.de_tsv = de_tsv
+        self.output_dir = output_dir
+        self.url_column = url_column
+        self.text_column = text_column
+        self.de_index = None
+        self.n_pairs = 0
+        self.id_regex = re.compile(r".*wiki\?curid=(\d+)")
+
+    def open(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.de_index = TSVIndex(self.de_tsv).load()
+
+    def emit(self, batch: Rows, result: Rows) -> Rows:
+        article = []
+        for row in batch:
+            if article and row[0] != article[0][0]:
+                self._write_pair(article)
+                article = []
+            article.append(row)
+        if article:
+            self._write_pair(article)
+        return batch
+
+    def _write_pair(self, article: Rows):
+        # no exact match (see https://github.com/nicolasspring/simplewiki_project/blob/master/parsing/README.md#output)
+        de_id = self._de_id(article[0][self.url_column])
+        if de_id is None:
+            return
+        de_span = self.de_index.article_span(de_id)
+        if de_span is None:
+            return
+        prefix = os.path.join(self.output_dir, f"{article[0][0]}_{de_id}")
+        with open(prefix + ".simpde", "w", encoding="utf8") as outfile:
+            for row in article:
+                outfile.write(row[self.text_column] + "\n")
+        with open(prefix + ".de", "w", encoding="utf8") as outfile:
+            for line in read_article_column(self.de_tsv, de_span, 6):
+                outfile.write(line + "\n")
+        self.n_pairs += 1
+
+    def _de_id(self, url: str) -> Optional[int]:
+        ids = self.id_regex.findall(url)
+        return int(ids[0]) if ids else None
+
+    def close(self):
+        sys.stderr.write(f"INFO:\tCreated {self.n_pairs} document pairs.\n")
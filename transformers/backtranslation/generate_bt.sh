@@ -6,33 +6,30 @@ REPO=$(dirname "$TRANSFORMERS")
 
 cd $BACKTRANSLATION
 
+DATA_BIN=$BACKTRANSLATION/data-bin
 TEXT=$BACKTRANSLATION/data-txt/simplewiki_ls_mono
 BT_OUT=$BACKTRANSLATION/generation/backtranslations
 LOGS=$BACKTRANSLATION/logs/bt_generation
 
 mkdir -p $BT_OUT $LOGS
 
+# the chunks written by job-prepare-monolingual-data.sh (chunk00, chunk01, ...)
+ALL_CHUNKS=$(ls -d $DATA_BIN/simplewiki_ls_mono/chunk* 2>/dev/null | sed 's/.*\/chunk//')
+if [[ -z "$ALL_CHUNKS" ]]; then
+    echo "No chunks in $DATA_BIN/simplewiki_ls_mono, run job-prepare-monolingual-data.sh first." >&2
+    exit 1
+fi
+
 module load volta cuda/10.0
 
-for CHUNK in $(seq -f "%02g" 0 13); do
-    INPUT=$TEXT/train.mono.dedup.${CHUNK}.ls
-    OUTPUT=$BT_OUT/bt.chunk${CHUNK}.out
-
-    if [[ -f $OUTPUT ]]; then
-        NUM_LINES_INPUT=$(cat $INPUT | wc -l)
-        NUM_LINES_OUTPUT=$(awk '/^H-/{hypos++}END{print hypos}' $OUTPUT)
-        SKIPPED=$(grep -Po \
-            '(?<=WARNING | fairseq.data.data_utils | )\d+(?= samples have invalid sizes and will be skipped)' $OUTPUT)
-        if [[ -z "$SKIPPED" ]]; then
-            SKIPPED=0
-        fi
-
-        if [[ $NUM_LINES_INPUT == $(($NUM_LINES_OUTPUT + $SKIPPED)) ]]; then
-            echo "chunk $CHUNK OK: ($NUM_LINES_INPUT input == $NUM_LINES_OUTPUT output + $SKIPPED skipped)."
-            continue
-        fi
-    fi
+# only the missing or incomplete chunks are (re)submitted
+CHUNKS=$(python $TRANSFORMERS/generation/check_bt_chunks.py \
+    --chunks $ALL_CHUNKS \
+    --input-pattern "$TEXT/train.mono.dedup.{chunk}.ls" \
+    --output-pattern "$BT_OUT/bt.chunk{chunk}.out" \
+    --manifest $BT_OUT/manifest.json)
 
+for CHUNK in $CHUNKS; do
     # generating back-translation with beam size 5
     sbatch -D $BACKTRANSLATION -o $LOGS/slurm-%j-translate-chunk-$CHUNK.out \
         $BACKTRANSLATION/job-translate-bt-chunk.sh $REPO $CHUNK
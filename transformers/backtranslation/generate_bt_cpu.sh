@@ -0,0 +1,34 @@
+#!/bin/bash
+
+BACKTRANSLATION="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
+TRANSFORMERS=$(dirname "$BACKTRANSLATION")
+REPO=$(dirname "$TRANSFORMERS")
+
+cd $BACKTRANSLATION
+
+DATA_BIN=$BACKTRANSLATION/data-bin
+TEXT=$BACKTRANSLATION/data-txt/simplewiki_ls_mono
+BT_OUT=$BACKTRANSLATION/generation/backtranslations
+LOGS=$BACKTRANSLATION/logs/bt_generation
+
+mkdir -p $BT_OUT $LOGS
+
+# the chunks written by job-prepare-monolingual-data.sh (chunk00, chunk01, ...)
+ALL_CHUNKS=$(ls -d $DATA_BIN/simplewiki_ls_mono/chunk* 2>/dev/null | sed 's/.*\/chunk//')
+if [[ -z "$ALL_CHUNKS" ]]; then
+    echo "No chunks in $DATA_BIN/simplewiki_ls_mono, run job-prepare-monolingual-data.sh first." >&2
+    exit 1
+fi
+
+# only the missing or incomplete chunks are (re)submitted, all of them in a single CPU job
+CHUNKS=$(python $TRANSFORMERS/generation/check_bt_chunks.py \
+    --chunks $ALL_CHUNKS \
+    --input-pattern "$TEXT/train.mono.dedup.{chunk}.ls" \
+    --output-pattern "$BT_OUT/bt.chunk{chunk}.out" \
+    --manifest $BT_OUT/manifest.json)
+
+if [[ -n "$CHUNKS" ]]; then
+    # generating back-translation with beam size 5 on CPUs
+    sbatch -D $BACKTRANSLATION -o $LOGS/slurm-%j-translate-chunks-cpu.out \
+        $BACKTRANSLATION/job-translate-bt-chunks-cpu.sh $REPO "$(echo $CHUNKS)" 4
+fi
@@ -14,11 +14,15 @@ BACKTRANSLATION=$TRANSFORMERS/backtranslation
 
 cd $BACKTRANSLATION
 
+DEDUP_SAMPLE=$TRANSFORMERS/preprocessing/dedup_sample.py
+BINARIZE=$TRANSFORMERS/preprocessing/binarize.py
+
 BT_OUT=$BACKTRANSLATION/generation/backtranslations
 BT_TXT=$BACKTRANSLATION/data-txt/simplewiki_ls_bt
 BT_BIN=$BACKTRANSLATION/data-bin/simplewiki_ls_bt
 SRC_DICT=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para/dict.de.txt
 PARA_BIN=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para
+PARA_TXT=$BACKTRANSLATION/data-txt/simplewiki_de_ls_para
 COMBINED=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para_plus_bt
 
 echo "Extracting back-translations from out files..."
@@ -27,19 +31,21 @@ python $TRANSFORMERS/software/fairseq/examples/backtranslation/extract_bt_data.p
     --output $BT_TXT/bt_data_full --srclang de --tgtlang ls \
     $BT_OUT/bt.chunk*.out
 
-paste $BT_TXT/bt_data_full.de $BT_TXT/bt_data_full.ls \
-| shuf \
-| awk -F '\t' -v BT_TXT="$BT_TXT" \
-    '{if (NR <= 52805) print $1 > BT_TXT"/bt_data.de"; if (NR <= 52805) print $2 > BT_TXT"/bt_data.ls";}'
+# as many back-translations as parallel training pairs. extract_bt_data.py has already filtered
+# the pairs by length, duplicate pairs are removed before sampling.
+N_PARA=$(wc -l < $PARA_TXT/train.de)
+echo "Sampling $N_PARA back-translations..."
+python $DEDUP_SAMPLE --dedup --sample $N_PARA --seed 1 \
+    -i $BT_TXT/bt_data_full.de $BT_TXT/bt_data_full.ls \
+    -o $BT_TXT/bt_data.de $BT_TXT/bt_data.ls
 
 echo "Binarizing back-translation data..."
-fairseq-preprocess \
-    --source-lang de --target-lang ls \
-    --joined-dictionary \
-    --srcdict $SRC_DICT \
-    --trainpref $BT_TXT/bt_data \
-    --destdir $BT_BIN \
-    --workers 8
+for LANG in de ls; do \
+    python $BINARIZE -p 8 -d $SRC_DICT \
+        -i $BT_TXT/bt_data.$LANG \
+        -o $BT_BIN/train.de-ls.$LANG; \
+    cp $SRC_DICT $BT_BIN/dict.$LANG.txt; \
+done
 
 echo "Creating a combined dataset in $COMBINED..."
 PARA_BIN=$(readlink -f $PARA_BIN)
@@ -20,6 +20,7 @@ PAIR=$SRC-$TGT
 
 MOSES=$TRANSFORMERS/software/mosesdecoder
 SUBWORD_NMT=$TRANSFORMERS/software/subword-nmt
+PREPROCESS=$TRANSFORMERS/preprocessing/preprocess.py
 
 DATA=$REPO/data
 OUT_TXT=$BACKTRANSLATION/data-txt/simplewiki_de_ls_para
@@ -28,11 +29,9 @@ OUT_BIN=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para
 echo "Preprocessing data..."
 for l in $SRC $TGT; do
     for c in train test valid; do
-        cat $DATA/de_ls/$c.$l \
-        | perl $MOSES/scripts/tokenizer/normalize-punctuation.perl -l de \
-        | perl $MOSES/scripts/tokenizer/remove-non-printing-char.perl \
-        | perl $MOSES/scripts/tokenizer/tokenizer.perl -threads 8 -a -l de \
-        > $DATA/de_ls/tmp/$c.tok.$l
+        python $PREPROCESS -l de -p 8 \
+            -i $DATA/de_ls/$c.$l \
+            -o $DATA/de_ls/tmp/$c.tok.$l
     done
 done
 
@@ -50,9 +49,9 @@ for l in $SRC $TGT; do
     for c in train test valid; do
         INFILE=$DATA/de_ls/tmp/$c.tok.$l
         echo "Applying BPE to $INFILE..."
-        python $SUBWORD_NMT/subword_nmt/apply_bpe.py -c $CODE \
-            < $INFILE \
-            > $DATA/de_ls/tmp/$c.bpe.$l
+        python $PREPROCESS --bpe-only -p 8 -c $CODE \
+            -i $INFILE \
+            -o $DATA/de_ls/tmp/$c.bpe.$l
     done
 done
 
@@ -14,8 +14,9 @@ BACKTRANSLATION=$TRANSFORMERS/backtranslation
 
 cd $BACKTRANSLATION
 
-MOSES=$TRANSFORMERS/software/mosesdecoder
-SUBWORD_NMT=$TRANSFORMERS/software/subword-nmt
+PREPROCESS=$TRANSFORMERS/preprocessing/preprocess.py
+DEDUP_SAMPLE=$TRANSFORMERS/preprocessing/dedup_sample.py
+BINARIZE=$TRANSFORMERS/preprocessing/binarize.py
 
 DATA=$REPO/data
 OUT_TXT=$BACKTRANSLATION/data-txt/simplewiki_ls_mono
@@ -26,38 +27,25 @@ SRC_DICT=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para/dict.ls.txt
 TGT_DICT=$BACKTRANSLATION/data-bin/simplewiki_de_ls_para/dict.de.txt
 CHUNK_SIZE=100000
 
-echo "Preprocessing data..."
-cat $DATA/simple_ls/train.ls \
-| perl $MOSES/scripts/tokenizer/normalize-punctuation.perl -l de \
-| perl $MOSES/scripts/tokenizer/remove-non-printing-char.perl \
-| perl $MOSES/scripts/tokenizer/tokenizer.perl -threads 8 -a -l de \
-> $DATA/simple_ls/tmp/train.tok.ls
-
-echo "Applying BPE on $DATA/simple_ls/tmp/train.tok.ls..."
-python $SUBWORD_NMT/subword_nmt/apply_bpe.py -c $CODE \
-    < $DATA/simple_ls/tmp/train.tok.ls \
-    > $DATA/simple_ls/tmp/train.bpe.ls
+echo "Preprocessing data and applying BPE..."
+python $PREPROCESS -l de -p 8 -c $CODE \
+    -i $DATA/simple_ls/train.ls \
+    -o $DATA/simple_ls/tmp/train.bpe.ls
 
 echo "Deduplicating $DATA/simple_ls/tmp/train.bpe.ls..."
-python $TRANSFORMERS/software/fairseq/examples/backtranslation/deduplicate_lines.py \
-    < $DATA/simple_ls/tmp/train.bpe.ls \
-    > $DATA/simple_ls/tmp/train.dedup.ls
-
-echo "Splitting into chunks of size $CHUNK_SIZE"
-split --lines $CHUNK_SIZE --numeric-suffixes -a 2 \
-    --additional-suffix .ls \
-    $DATA/simple_ls/tmp/train.dedup.ls \
-    $OUT_TXT/train.mono.dedup.
-
-for CHUNK in $(seq -f "%02g" 0 13); do
-    fairseq-preprocess \
-        --only-source \
-        --source-lang ls --target-lang de \
-        --joined-dictionary \
-        --srcdict $SRC_DICT \
-        --testpref $OUT_TXT/train.mono.dedup.${CHUNK} \
-        --destdir $OUT_BIN/chunk${CHUNK} \
-        --workers 8; \
-    cp $TGT_DICT $OUT_BIN/chunk${CHUNK}/; \
-    cp $CODE $OUT_BIN/chunk${CHUNK}/; \
+python $DEDUP_SAMPLE --dedup \
+    -i $DATA/simple_ls/tmp/train.bpe.ls \
+    -o $DATA/simple_ls/tmp/train.dedup.ls
+
+echo "Binarizing chunks of size $CHUNK_SIZE..."
+python $BINARIZE -p 8 -d $SRC_DICT \
+    -i $DATA/simple_ls/tmp/train.dedup.ls \
+    -o "$OUT_BIN/chunk{chunk:02d}/test.ls-de.ls" \
+    --chunk-size $CHUNK_SIZE \
+    --text-output "$OUT_TXT/train.mono.dedup.{chunk:02d}.ls"
+
+for CHUNK_DIR in $OUT_BIN/chunk*; do \
+    cp $SRC_DICT $CHUNK_DIR/dict.ls.txt; \
+    cp $TGT_DICT $CHUNK_DIR/; \
+    cp $CODE $CHUNK_DIR/; \
 done
@@ -30,12 +30,9 @@ fairseq-generate $DATA_BIN \
 > $GENERATION_OUT/test.out
 
 echo "Postprocessing..."
-grep -P '^H-' $GENERATION_OUT/test.out \
-| sed "s/\@\@ //g" \
+python $TRANSFORMERS/generation/extract_hypotheses.py --remove-bpe \
+    -i $GENERATION_OUT/test.out \
 | perl $MOSES/scripts/tokenizer/detokenizer.perl -l de -q \
-| awk -F'H-' '{print $2}' \
-| sort -n \
-| cut -f 3 \
 > $GENERATION_OUT/test.de.translated
 
 echo "Calculating BLEU..."
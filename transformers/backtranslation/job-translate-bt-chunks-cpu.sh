@@ -0,0 +1,37 @@
+#!/bin/bash
+#SBATCH --time=24:00:00
+#SBATCH --cpus-per-task=32
+#SBATCH --mem=64G
+#SBATCH --partition=generic
+
+# calling script needs to set:
+# $REPO
+# $CHUNKS (space separated, e.g. "00 03 07")
+# $PROCESSES
+
+REPO=$1
+CHUNKS=$2
+PROCESSES=${3:-4}
+
+TRANSFORMERS=$REPO/transformers
+BACKTRANSLATION=$TRANSFORMERS/backtranslation
+
+cd $BACKTRANSLATION
+
+BT_OUT=$BACKTRANSLATION/generation/backtranslations
+CHECKPOINT_DIR=$BACKTRANSLATION/checkpoints/checkpoints_ls_de_reverse_model
+DATA_BIN=$BACKTRANSLATION/data-bin
+
+# every process uses an equal share of the allocated cores
+THREADS=$((${SLURM_CPUS_PER_TASK:-$(nproc)} / $PROCESSES))
+
+python $TRANSFORMERS/generation/generate_cpu.py \
+    --data "$DATA_BIN/simplewiki_ls_mono/chunk{chunk}" \
+    --output "$BT_OUT/bt.chunk{chunk}.out" \
+    --chunks $CHUNKS \
+    --path $CHECKPOINT_DIR/checkpoint_best.pt \
+    --source-lang ls --target-lang de \
+    --max-tokens 4096 \
+    --beam 5 \
+    --processes $PROCESSES \
+    --threads $THREADS
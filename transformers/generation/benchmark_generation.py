@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from typing import Dict, List, Tuple
+
+from generate_cpu import generate
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "preprocessing")
+)
+from binarize import IndexedDataset  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--data",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="A binarized data directory (e.g. data-bin/simplewiki_ls_mono/chunk00).",
+    )
+    parser.add_argument(
+        "--path", type=str, metavar="PATH", required=True, help="The model checkpoint."
+    )
+    parser.add_argument(
+        "-n",
+        "--sentences",
+        type=int,
+        metavar="INT",
+        default=2000,
+        help="The number of randomly sampled sentences translated per configuration. "
+        + "(default: 2000)",
+    )
+    parser.add_argument(
+        "-c",
+        "--configs",
+        type=str,
+        nargs="+",
+        metavar="PxT",
+        default=["1x1", "1x2", "2x1", "1x4", "2x2", "4x1"],
+        help="Configurations of processes x threads per process. (default: 1x1 1x2 2x1 1x4 2x2 "
+        + "4x1)",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        nargs="+",
+        metavar="INT",
+        default=[4096],
+        help="Token budgets per batch. (default: 4096)",
+    )
+    parser.add_argument(
+        "--beam", type=int, metavar="INT", default=5, help="The beam size. (default: 5)"
+    )
+    parser.add_argument(
+        "-s", "--source-lang", type=str, metavar="STRING", default="ls", help="The source language."
+    )
+    parser.add_argument(
+        "-t", "--target-lang", type=str, metavar="STRING", default="de", help="The target language."
+    )
+    parser.add_argument(
+        "--gen-subset",
+        type=str,
+        metavar="STRING",
+        default="test",
+        help="The data split to translate. (default: test)",
+    )
+    parser.add_argument(
+        "--seed", type=int, metavar="INT", default=1, help="The seed for sampling sentences."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Optional JSON file for the results.",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def parse_config(config: str) -> Tuple[int, int]:
+    n_processes, n_threads = config.lower().split("x")
+    return int(n_processes), int(n_threads)
+
+
+def measure(
+    args: argparse.Namespace,
+    sample_ids: List[int],
+    n_processes: int,
+    n_threads: int,
+    max_tokens: int,
+) -> Dict:
+    """
+    translates the sampled sentences with one configuration and returns its throughput. the time
+    includes loading the model in every process, like a real run.
+    """
+    settings = (
+        args.data,
+        args.path,
+        args.source_lang,
+        args.target_lang,
+        args.gen_subset,
+        args.beam,
+        0,
+        200,
+        1.0,
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        sentences = tokens = 0
+        for sentences, tokens in generate(
+            [(args.data, os.path.join(tmp_dir, "bench.out"))],
+            settings,
+            n_processes,
+            n_threads,
+            max_tokens=max_tokens,
+            sample_ids=sample_ids,
+        ):
+            pass
+        seconds = time.perf_counter() - start
+    n_cores = n_processes * n_threads
+    return {
+        "processes": n_processes,
+        "threads": n_threads,
+        "max_tokens": max_tokens,
+        "sentences": sentences,
+        "generated_tokens": tokens,
+        "seconds": seconds,
+        "sentences_per_second": sentences / seconds,
+        "sentences_per_second_per_core": sentences / seconds / n_cores,
+    }
+
+
+def main(args: argparse.Namespace):
+    dataset = IndexedDataset(
+        os.path.join(
+            args.data, f"{args.gen_subset}.{args.source_lang}-{args.target_lang}.{args.source_lang}"
+        )
+    )
+    rng = np.random.default_rng(args.seed)
+    n_sentences = min(args.sentences, len(dataset))
+    sample_ids = sorted(rng.choice(len(dataset), size=n_sentences, replace=False).tolist())
+
+    results = []
+    print(
+        f"{'processes':>9} {'threads':>7} {'max tokens':>10} {'seconds':>8} {'sent/s':>8} "
+        + f"{'sent/s/core':>11}"
+    )
+    for max_tokens in args.max_tokens:
+        for config in args.configs:
+            n_processes, n_threads = parse_config(config)
+            result = measure(args, sample_ids, n_processes, n_threads, max_tokens)
+            results.append(result)
+            print(
+                f"{n_processes:>9} {n_threads:>7} {max_tokens:>10} {result['seconds']:>8.1f} "
+                + f"{result['sentences_per_second']:>8.2f} "
+                + f"{result['sentences_per_second_per_core']:>11.3f}"
+            )
+    if args.output:
+        report = {
+            "machine": {
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "cores": len(os.sched_getaffinity(0)),
+            },
+            "checkpoint": args.path,
+            "data": args.data,
+            "sentences": n_sentences,
+            "beam": args.beam,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf8") as outfile:
+            json.dump(report, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
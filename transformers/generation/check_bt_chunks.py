@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import json
+import os
+import pathos.multiprocessing as mp
+import re
+import sys
+
+from typing import Dict, List, Optional
+
+from extract_hypotheses import parse_generation_line
+
+# fairseq formats the number with thousands separators ("1,234 samples")
+SKIPPED_REGEX = re.compile(
+    rb"fairseq\.data\.data_utils \| ([\d,]+) samples have invalid sizes and will be skipped"
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c",
+        "--chunks",
+        type=str,
+        nargs="+",
+        metavar="STRING",
+        required=True,
+        help="The chunk names (e.g. 00 01 ... 13).",
+    )
+    parser.add_argument(
+        "-i",
+        "--input-pattern",
+        type=str,
+        metavar="STRING",
+        required=True,
+        help="The input text file of a chunk with the placeholder {chunk} "
+        + "(e.g. data-txt/simplewiki_ls_mono/train.mono.dedup.{chunk}.ls).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-pattern",
+        type=str,
+        metavar="STRING",
+        required=True,
+        help="The fairseq-generate output file of a chunk with the placeholder {chunk} "
+        + "(e.g. generation/backtranslations/bt.chunk{chunk}.out).",
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The manifest file. Chunks whose input and output files have not changed since the "
+        + "last check are not scanned again.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes scanning chunks in parallel.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    args = parser.parse_args()
+    return args
+
+
+def file_state(path: str) -> Optional[List[int]]:
+    """
+    returns the size and modification time of a file, or None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def count_lines(path: str, block_size: int = 1 << 20) -> int:
+    with open(path, "rb") as infile:
+        return sum(block.count(b"\n") for block in iter(lambda: infile.read(block_size), b""))
+
+
+def scan_generation_output(path: str) -> Dict[str, int]:
+    """
+    scans a fairseq-generate output file once and returns the number of hypothesis lines, of
+    distinct hypothesis ids and of skipped samples and the maximum id seen.
+    """
+    seen = bytearray()
+    stats = {"hypotheses": 0, "ids": 0, "skipped": 0, "max_id": -1}
+    with open(path, "rb") as infile:
+        for line in infile:
+            parsed = parse_generation_line(line, b"H")
+            if parsed is None:
+                match = SKIPPED_REGEX.search(line)
+                if match is not None:
+                    stats["skipped"] += int(match.group(1).replace(b",", b""))
+                continue
+            sample_id = parsed[0]
+            stats["hypotheses"] += 1
+            if sample_id >= len(seen):
+                seen.extend(bytes(max(sample_id + 1 - len(seen), len(seen))))
+            if not seen[sample_id]:
+                seen[sample_id] = 1
+                stats["ids"] += 1
+            stats["max_id"] = max(stats["max_id"], sample_id)
+    return stats
+
+
+def check_chunk(input_file: str, output_file: str) -> Dict:
+    """
+    returns the manifest entry of a chunk. a chunk is complete if every input line has a
+    hypothesis or has been skipped.
+    """
+    entry = {
+        "input": input_file,
+        "output": output_file,
+        "input_state": file_state(input_file),
+        "output_state": file_state(output_file),
+        "complete": False,
+    }
+    if entry["input_state"] is None or entry["output_state"] is None:
+        return entry
+    entry["input_lines"] = count_lines(input_file)
+    entry.update(scan_generation_output(output_file))
+    entry["complete"] = entry["input_lines"] == entry["ids"] + entry["skipped"]
+    return entry
+
+
+def check_chunks(
+    chunks: List[str],
+    input_pattern: str,
+    output_pattern: str,
+    manifest_file: str,
+    n_processes: int = 1,
+) -> Dict[str, Dict]:
+    """
+    updates the manifest entries of all chunks whose input or output file has changed since the
+    last check (scanned in parallel) and returns the entries of @param chunks.
+    """
+    manifest: Dict[str, Dict] = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, encoding="utf8") as infile:
+            manifest = json.load(infile)
+    stale = []
+    for chunk in chunks:
+        input_file = input_pattern.format(chunk=chunk)
+        output_file = output_pattern.format(chunk=chunk)
+        entry = manifest.get(chunk)
+        if (
+            entry is None
+            or entry["input"] != input_file
+            or entry["output"] != output_file
+            or entry["input_state"] != file_state(input_file)
+            or entry["output_state"] != file_state(output_file)
+        ):
+            stale.append((chunk, input_file, output_file))
+    if stale:
+        with mp.Pool(processes=min(n_processes, len(stale))) as pool:
+            entries = pool.map(lambda item: check_chunk(item[1], item[2]), stale)
+        for (chunk, _, _), entry in zip(stale, entries):
+            manifest[chunk] = entry
+        os.makedirs(os.path.dirname(os.path.abspath(manifest_file)), exist_ok=True)
+        with open(manifest_file + ".tmp", "w", encoding="utf8") as outfile:
+            json.dump(manifest, outfile, indent=2, sort_keys=True)
+        os.replace(manifest_file + ".tmp", manifest_file)
+    return {chunk: manifest[chunk] for chunk in chunks}
+
+
+def main(args: argparse.Namespace):
+    entries = check_chunks(
+        args.chunks, args.input_pattern, args.output_pattern, args.manifest, args.processes
+    )
+    for chunk, entry in entries.items():
+        if entry["complete"]:
+            if args.verbose >= 1:
+                print(
+                    f"chunk {chunk} OK: ({entry['input_lines']} input == {entry['ids']} output + "
+                    + f"{entry['skipped']} skipped).",
+                    file=sys.stderr,
+                )
+            continue
+        if args.verbose >= 1 and entry["output_state"] is not None:
+            print(
+                f"chunk {chunk} incomplete: ({entry.get('input_lines')} input != "
+                + f"{entry.get('ids')} output + {entry.get('skipped')} skipped).",
+                file=sys.stderr,
+            )
+        # only the chunks to be resubmitted are written to stdout
+        print(chunk)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
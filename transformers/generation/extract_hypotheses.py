@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import sys
+
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+# line types of fairseq-generate followed by a score column
+SCORED_TYPES = {"H", "D", "P"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        nargs="+",
+        metavar="PATH",
+        required=True,
+        help="One or more fairseq-generate output files.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="The output file for the extracted lines. stdout if omitted.",
+    )
+    parser.add_argument(
+        "-t",
+        "--type",
+        type=str,
+        metavar="STRING",
+        default="H",
+        help="The line type to extract: H (hypotheses), D (detokenized hypotheses), S (sources) or "
+        + "T (targets). (default: H)",
+    )
+    parser.add_argument(
+        "--remove-bpe",
+        type=str,
+        nargs="?",
+        metavar="STRING",
+        const="@@ ",
+        default=None,
+        help="Remove this BPE continuation marker. (default if given: '@@ ')",
+    )
+    parser.add_argument(
+        "--fill-missing",
+        action="store_true",
+        help="Write empty lines for ids without a line (e.g. skipped samples) instead of omitting "
+        + "them.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    args = parser.parse_args()
+    return args
+
+
+def parse_generation_line(line: bytes, line_type: bytes) -> Optional[Tuple[int, bytes]]:
+    """
+    returns the sample id and the text of a fairseq-generate output line of type @param line_type
+    (e.g. b"H-12\t-0.31\tein Satz\n"), or None for other lines.
+    """
+    if not line.startswith(line_type + b"-"):
+        return None
+    fields = line.rstrip(b"\r\n").split(b"\t", 2 if line_type.decode() in SCORED_TYPES else 1)
+    try:
+        sample_id = int(fields[0][len(line_type) + 1 :])
+    except ValueError:
+        return None
+    return sample_id, fields[-1] if len(fields) > 1 else b""
+
+
+def bucket_lines(files: List[BinaryIO], line_type: str = "H") -> Tuple[List[Optional[bytes]], int]:
+    """
+    reads the lines of @param line_type from fairseq-generate output in a single pass and places
+    every line in the bucket of its sample id (the first line of an id is kept, i.e. the best
+    hypothesis). returns the buckets, indexed by id, and the number of lines read.
+    """
+    encoded_type = line_type.encode()
+    buckets: List[Optional[bytes]] = []
+    n_lines = 0
+    max_id = -1
+    for infile in files:
+        for line in infile:
+            parsed = parse_generation_line(line, encoded_type)
+            if parsed is None:
+                continue
+            sample_id, text = parsed
+            n_lines += 1
+            if sample_id >= len(buckets):
+                # grown geometrically, the unused buckets are removed at the end
+                buckets.extend([None] * max(sample_id + 1 - len(buckets), len(buckets)))
+            if buckets[sample_id] is None:
+                buckets[sample_id] = text
+            max_id = max(max_id, sample_id)
+    del buckets[max_id + 1 :]
+    return buckets, n_lines
+
+
+def extract_lines(
+    buckets: List[Optional[bytes]],
+    remove_bpe: Optional[str] = None,
+    fill_missing: bool = False,
+) -> Iterator[bytes]:
+    """
+    yields the bucketed lines in id order (like sort -n | cut), with line breaks.
+    """
+    marker = remove_bpe.encode() if remove_bpe is not None else None
+    for text in buckets:
+        if text is None:
+            if fill_missing:
+                yield b"\n"
+            continue
+        if marker is not None:
+            text = text.replace(marker, b"")
+        yield text + b"\n"
+
+
+def main(args: argparse.Namespace):
+    files = [open(path, "rb") for path in args.input]
+    try:
+        buckets, n_lines = bucket_lines(files, args.type)
+    finally:
+        for infile in files:
+            infile.close()
+    outfile = open(args.output, "wb") if args.output is not None else sys.stdout.buffer
+    try:
+        for line in extract_lines(buckets, args.remove_bpe, args.fill_missing):
+            outfile.write(line)
+    finally:
+        if args.output is not None:
+            outfile.close()
+    if args.verbose >= 1:
+        n_missing = sum(1 for text in buckets if text is None)
+        print(
+            f"INFO:\tExtracted {len(buckets) - n_missing} {args.type}- lines ({n_lines} read, "
+            + f"{n_missing} ids below the maximum id missing).",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
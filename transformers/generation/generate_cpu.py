@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import math
+import numpy as np
+import os
+import pathos.multiprocessing as mp
+import sys
+import time
+import torch
+
+from datetime import datetime
+from fairseq import checkpoint_utils, utils
+from fairseq_cli.generate import get_symbols_to_strip_from_output
+from multiprocess import Queue  # the multiprocessing backend of pathos
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "preprocessing")
+)
+from binarize import IndexedDataset  # noqa: E402
+from common.parallel import bounded_imap  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+
+# (data directory, sample ids) of a batch
+Batch = Tuple[str, List[int]]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--data",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The binarized data directory, with the placeholder {chunk} if --chunks are given "
+        + "(e.g. data-bin/simplewiki_ls_mono/chunk{chunk}).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The output file in fairseq-generate format, with the placeholder {chunk} if "
+        + "--chunks are given (e.g. generation/backtranslations/bt.chunk{chunk}.out).",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunks",
+        type=str,
+        nargs="+",
+        metavar="STRING",
+        default=None,
+        help="The chunk names (e.g. 00 01 ... 13). All chunks are translated by the same processes.",
+    )
+    parser.add_argument(
+        "--path", type=str, metavar="PATH", required=True, help="The model checkpoint."
+    )
+    parser.add_argument(
+        "--gen-subset",
+        type=str,
+        metavar="STRING",
+        default="test",
+        help="The data split to translate. (default: test)",
+    )
+    parser.add_argument(
+        "-s", "--source-lang", type=str, metavar="STRING", default="ls", help="The source language."
+    )
+    parser.add_argument(
+        "-t", "--target-lang", type=str, metavar="STRING", default="de", help="The target language."
+    )
+    parser.add_argument(
+        "--beam", type=int, metavar="INT", default=5, help="The beam size. (default: 5)"
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        metavar="INT",
+        default=4096,
+        help="The maximum number of source tokens (including padding) per batch. (default: 4096)",
+    )
+    parser.add_argument(
+        "--max-positions",
+        type=int,
+        metavar="INT",
+        default=1024,
+        help="Longer source sentences are skipped like with --skip-invalid-size-inputs-valid-test. "
+        + "(default: 1024)",
+    )
+    parser.add_argument(
+        "--max-len-a",
+        type=float,
+        metavar="FLOAT",
+        default=0,
+        help="Generate sequences of maximum length a * x + b, x being the source length.",
+    )
+    parser.add_argument(
+        "--max-len-b",
+        type=int,
+        metavar="INT",
+        default=200,
+        help="Generate sequences of maximum length a * x + b, x being the source length.",
+    )
+    parser.add_argument(
+        "--lenpen", type=float, metavar="FLOAT", default=1.0, help="The length penalty."
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=1,
+        help="The number of inference processes.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="The number of torch threads per process. (default: the available cores divided by "
+        + "the number of processes)",
+    )
+    parser.add_argument(
+        "--no-pinning",
+        action="store_true",
+        help="Do not pin the processes to disjoint sets of cores.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+def make_batches(
+    sizes: np.ndarray,
+    max_tokens: int,
+    max_positions: int,
+    sample_ids: Optional[List[int]] = None,
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    sorts the sample ids by source length and groups them into batches of at most
+    @param max_tokens tokens including padding (like fairseq's batch_by_size). returns the batches
+    and the ids of the samples longer than @param max_positions, which are skipped.
+    """
+    order = np.arange(len(sizes)) if sample_ids is None else np.unique(sample_ids)
+    order = order[np.argsort(sizes[order], kind="mergesort")]
+    skipped = sorted(order[sizes[order] > max_positions].tolist())
+    order = order[sizes[order] <= max_positions]
+    assert (
+        len(order) == 0 or sizes[order[-1]] <= max_tokens
+    ), f"Sentences lengths should not exceed max_tokens={max_tokens}"
+    batches = []
+    batch: List[int] = []
+    batch_max = 0
+    for sample_id, size in zip(order.tolist(), sizes[order].tolist()):
+        if batch and (len(batch) + 1) * max(batch_max, size) > max_tokens:
+            batches.append(batch)
+            batch = []
+            batch_max = 0
+        batch.append(sample_id)
+        batch_max = max(batch_max, size)
+    if batch:
+        batches.append(batch)
+    return batches, skipped
+
+
+def assign_cores(n_processes: int, n_threads: int) -> List[List[int]]:
+    """
+    returns disjoint sets of @param n_threads of the available cores for every process (sets
+    overlap if there are fewer cores than threads).
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    return [
+        [cores[(i * n_threads + j) % len(cores)] for j in range(n_threads)]
+        for i in range(n_processes)
+    ]
+
+
+def skipped_warning(n_skipped: int, max_positions: int, skipped: List[int]) -> str:
+    """
+    returns the warning of fairseq-generate about skipped samples (read by check_bt_chunks.py).
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return (
+        f"{timestamp} | WARNING | fairseq.data.data_utils | {n_skipped:,} samples have invalid "
+        + f"sizes and will be skipped, max_positions=({max_positions}, {max_positions}), first "
+        + f"few sample ids={skipped[:10]}\n"
+    )
+
+
+class CPUGenerator(object):
+    def __init__(
+        self,
+        data_dir: str,
+        checkpoint: str,
+        source_lang: str = "ls",
+        target_lang: str = "de",
+        gen_subset: str = "test",
+        beam: int = 5,
+        max_len_a: float = 0,
+        max_len_b: int = 200,
+        lenpen: float = 1.0,
+        n_threads: int = 1,
+    ):
+        """
+        translates batches of a binarized dataset on the CPU with the fairseq API and formats the
+        results like fairseq-generate (S-, H-, D- and P- lines), so that they can be read by
+        extract_bt_data.py.
+
+        Args:
+        data_dir        a data directory with the dictionaries (dict.<lang>.txt).
+        checkpoint      the model checkpoint (e.g. of train_reverse_model.sh).
+        source_lang     the source language.
+        target_lang     the target language.
+        gen_subset      the data split to translate.
+        beam            the beam size.
+        max_len_a       generate sequences of maximum length a * x + b.
+        max_len_b       generate sequences of maximum length a * x + b.
+        lenpen          the length penalty.
+        n_threads       the number of torch threads.
+        """
+        torch.set_num_threads(n_threads)
+        self.gen_subset = gen_subset
+        self.models, self.cfg, self.task = checkpoint_utils.load_model_ensemble_and_task(
+            [checkpoint],
+            arg_overrides={
+                "data": data_dir,
+                "source_lang": source_lang,
+                "target_lang": target_lang,
+            },
+        )
+        for model in self.models:
+            model.eval()
+            model.prepare_for_inference_(self.cfg)
+        self.generator = self.task.build_generator(
+            self.models,
+            argparse.Namespace(
+                beam=beam, max_len_a=max_len_a, max_len_b=max_len_b, lenpen=lenpen, nbest=1
+            ),
+        )
+        self.src_dict = self.task.source_dictionary
+        self.tgt_dict = self.task.target_dictionary
+        self.strip_symbols = get_symbols_to_strip_from_output(self.generator)
+        self.datasets = {}
+
+    def dataset(self, data_dir: str):
+        """
+        returns the dataset of the split in @param data_dir (the chunks share the dictionaries).
+        """
+        if data_dir not in self.datasets:
+            self.task.cfg.data = data_dir
+            self.task.load_dataset(self.gen_subset)
+            self.datasets[data_dir] = self.task.dataset(self.gen_subset)
+        return self.datasets[data_dir]
+
+    def translate(self, data_dir: str, sample_ids: List[int]) -> Tuple[str, int]:
+        """
+        translates a batch and returns the output lines and the number of generated tokens.
+        """
+        dataset = self.dataset(data_dir)
+        sample = dataset.collater([dataset[i] for i in sample_ids])
+        hypos = self.task.inference_step(self.generator, self.models, sample)
+        lines = []
+        n_tokens = 0
+        for i, sample_id in enumerate(sample["id"].tolist()):
+            src_tokens = utils.strip_pad(
+                sample["net_input"]["src_tokens"][i, :], self.tgt_dict.pad()
+            )
+            src_str = self.src_dict.string(src_tokens, None)
+            lines.append(f"S-{sample_id}\t{src_str}\n")
+            hypo = hypos[i][0]
+            _, hypo_str, _ = utils.post_process_prediction(
+                hypo_tokens=hypo["tokens"].int().cpu(),
+                src_str=src_str,
+                alignment=hypo["alignment"],
+                align_dict=None,
+                tgt_dict=self.tgt_dict,
+                remove_bpe=None,
+                extra_symbols_to_ignore=self.strip_symbols,
+            )
+            score = hypo["score"] / math.log(2)
+            positional_scores = hypo["positional_scores"].div_(math.log(2)).tolist()
+            lines.append("H-{}\t{}\t{}\n".format(sample_id, score, hypo_str))
+            lines.append("D-{}\t{}\t{}\n".format(sample_id, score, hypo_str))
+            lines.append(
+                "P-{}\t{}\n".format(
+                    sample_id, " ".join("{:.4f}".format(x) for x in positional_scores)
+                )
+            )
+            n_tokens += len(hypo["tokens"])
+        return "".join(lines), n_tokens
+
+
+# the generators of a worker process
+_worker_generators: Dict[Tuple, CPUGenerator] = {}
+
+
+def init_worker(core_queue: Optional[Queue]):
+    """
+    pins a new worker process to the next set of cores.
+    """
+    if core_queue is not None:
+        cores = core_queue.get()
+        os.sched_setaffinity(0, cores)
+
+
+def translate_batch(settings: Tuple, batch: Batch) -> Tuple[str, str, int, int]:
+    """
+    translates a batch with the generator of the worker process. returns the data directory, the
+    output lines, the number of sentences and the number of generated tokens.
+    """
+    if settings not in _worker_generators:
+        _worker_generators[settings] = CPUGenerator(*settings)
+    data_dir, sample_ids = batch
+    output, n_tokens = _worker_generators[settings].translate(data_dir, sample_ids)
+    return data_dir, output, len(sample_ids), n_tokens
+
+
+def generate(
+    jobs: List[Tuple[str, str]],
+    settings: Tuple,
+    n_processes: int,
+    n_threads: int,
+    max_tokens: int = 4096,
+    max_positions: int = 1024,
+    pin: bool = True,
+    sample_ids: Optional[List[int]] = None,
+    profiler: Profiler = None,
+) -> Iterator[Tuple[int, int]]:
+    """
+    translates the datasets of @param jobs, (data directory, output file) pairs, with
+    @param n_processes inference processes using @param n_threads threads each. the batches of all
+    jobs are submitted longest first, so the processes finish at about the same time. yields the
+    number of translated sentences and generated tokens after every batch.
+
+    Args:
+    jobs            (data directory, output file) pairs.
+    settings        the arguments of CPUGenerator without n_threads.
+    n_processes     the number of inference processes.
+    n_threads       the number of torch threads per process.
+    max_tokens      the maximum number of source tokens (including padding) per batch.
+    max_positions   longer source sentences are skipped.
+    pin             pin the processes to disjoint sets of cores.
+    sample_ids      only translate these samples (e.g. for benchmarks).
+    profiler        an optional Profiler.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    source_lang, target_lang, gen_subset = settings[2], settings[3], settings[4]
+    costs: List[Tuple[int, Batch]] = []
+    warnings = {}
+    with profiler.stage("batching"):
+        for data_dir, _ in jobs:
+            dataset = IndexedDataset(
+                os.path.join(data_dir, f"{gen_subset}.{source_lang}-{target_lang}.{source_lang}")
+            )
+            job_batches, skipped = make_batches(
+                dataset.sizes, max_tokens, max_positions, sample_ids
+            )
+            if skipped:
+                warnings[data_dir] = skipped_warning(len(skipped), max_positions, skipped)
+            for batch in job_batches:
+                # beam search time grows with the padded batch size
+                costs.append((len(batch) * int(dataset.sizes[batch[-1]]), (data_dir, batch)))
+            profiler.count("skipped", len(skipped))
+    costs.sort(key=lambda item: -item[0])
+    batches = [batch for _, batch in costs]
+
+    core_queue = None
+    if pin:
+        core_queue = Queue()
+        for cores in assign_cores(n_processes, n_threads):
+            core_queue.put(cores)
+    worker_settings = (*settings, n_threads)
+    sentences = 0
+    tokens = 0
+    with mp.Pool(processes=n_processes, initializer=init_worker, initargs=(core_queue,)) as pool:
+        outfiles = {data_dir: open(output, "w", encoding="utf8") for data_dir, output in jobs}
+        try:
+            for data_dir, warning in warnings.items():
+                outfiles[data_dir].write(warning)
+            for data_dir, output, n_sentences, n_tokens in bounded_imap(
+                pool,
+                lambda batch: translate_batch(worker_settings, batch),
+                batches,
+                2 * n_processes,
+            ):
+                with profiler.stage("write"):
+                    outfiles[data_dir].write(output)
+                sentences += n_sentences
+                tokens += n_tokens
+                profiler.count("sentences", n_sentences)
+                profiler.count("generated tokens", n_tokens)
+                yield sentences, tokens
+        finally:
+            for outfile in outfiles.values():
+                outfile.close()
+
+
+def main(args: argparse.Namespace):
+    if args.chunks:
+        assert (
+            "{chunk" in args.data and "{chunk" in args.output
+        ), "--data and --output need a {chunk} placeholder."
+        jobs = [
+            (args.data.format(chunk=chunk), args.output.format(chunk=chunk))
+            for chunk in args.chunks
+        ]
+    else:
+        jobs = [(args.data, args.output)]
+    n_threads = args.threads or max(1, len(os.sched_getaffinity(0)) // args.processes)
+    settings = (
+        jobs[0][0],
+        args.path,
+        args.source_lang,
+        args.target_lang,
+        args.gen_subset,
+        args.beam,
+        args.max_len_a,
+        args.max_len_b,
+        args.lenpen,
+    )
+    profiler = Profiler.from_args("generate_cpu", args).start()
+    start = time.perf_counter()
+    sentences = tokens = 0
+    for sentences, tokens in generate(
+        jobs,
+        settings,
+        args.processes,
+        n_threads,
+        max_tokens=args.max_tokens,
+        max_positions=args.max_positions,
+        pin=not args.no_pinning,
+        profiler=profiler,
+    ):
+        if args.verbose >= 2:
+            print(f"INFO:\tTranslated {sentences} sentences...", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    n_cores = args.processes * n_threads
+    if args.verbose >= 1:
+        print(
+            f"INFO:\tTranslated {sentences} sentences ({tokens} tokens) in {seconds:.1f}s with "
+            + f"{args.processes} processes x {n_threads} threads: "
+            + f"{sentences / max(seconds, 1e-9):.1f} sentences/s, "
+            + f"{sentences / max(seconds, 1e-9) / n_cores:.2f} sentences/s per core.",
+            file=sys.stderr,
+        )
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
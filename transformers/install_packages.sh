@@ -7,7 +7,7 @@ cd $TRANSFORMERS
 
 conda install pytorch torchvision cudatoolkit=10.0 -c pytorch
 
-pip install Cython sacremoses subword_nmt sacrebleu==1.4.4
+pip install Cython sacremoses subword_nmt sacrebleu==1.4.4 pathos
 
 mkdir -p $TRANSFORMERS/software
 git clone https://github.com/pytorch/fairseq $TRANSFORMERS/software/fairseq
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import numpy as np
+import os
+import pathos.multiprocessing as mp
+import struct
+import sys
+import time
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from preprocess import Preprocessor, find_shards
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from common.parallel import bounded_imap  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+
+# the header of the index files of fairseq's MMapIndexedDataset (--dataset-impl mmap)
+INDEX_MAGIC = b"MMIDIDX\x00\x00"
+INDEX_VERSION = 1
+DTYPE_CODES = {
+    1: np.uint8,
+    2: np.int8,
+    3: np.int16,
+    4: np.int32,
+    5: np.int64,
+    6: np.float64,
+    7: np.double,
+    8: np.uint16,
+    9: np.uint32,
+    10: np.uint64,
+}
+
+Shard = Tuple[int, int]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The input text file (BPE-segmented unless --codes is given).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-prefix",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The output prefix of the .bin and .idx files (e.g. data-bin/train.de-ls.de). With "
+        + "--chunk-size, it has to contain the placeholder {chunk} (e.g. chunk{chunk:02d}/test).",
+    )
+    parser.add_argument(
+        "-d",
+        "--dict",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="An existing fairseq dictionary (dict.<lang>.txt).",
+    )
+    parser.add_argument(
+        "-c",
+        "--codes",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="BPE codes. If given, the input is normalized, tokenized and BPE-segmented (like "
+        + "preprocess.py) before binarization, without writing intermediate text files.",
+    )
+    parser.add_argument(
+        "-l", "--lang", type=str, metavar="STRING", default="de", help="The language of the input."
+    )
+    parser.add_argument(
+        "--bpe-only",
+        action="store_true",
+        help="Only apply BPE to already tokenized input (requires --codes).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Write a separate dataset for every this many lines.",
+    )
+    parser.add_argument(
+        "--text-output",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="Optional output file for the (preprocessed) text lines. With --chunk-size, it has "
+        + "to contain the placeholder {chunk}.",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes to be run in parallel.",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        metavar="INT",
+        default=4,
+        help="The size of the line ranges handled per task in MB. (default: 4)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+class Vocabulary(object):
+    def __init__(self, dict_file: str):
+        """
+        a fairseq dictionary (dict.<lang>.txt) loaded like fairseq.data.Dictionary: the special
+        symbols <s>, <pad>, </s> and <unk> have the indices 0 to 3, the symbols of the file follow
+        in their order.
+
+        Args:
+        dict_file       the dictionary file with one "<symbol> <count> [#fairseq:overwrite]" per
+                            line.
+        """
+        self.dict_file = dict_file
+        self.symbols = ["<s>", "<pad>", "</s>", "<unk>"]
+        self.counts = [1, 1, 1, 1]
+        self.indices = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.eos_index = self.indices["</s>"]
+        self.unk_index = self.indices["<unk>"]
+        self.n_special = len(self.symbols)
+        with open(dict_file, encoding="utf8") as infile:
+            for line in infile:
+                try:
+                    symbol, field = line.rstrip().rsplit(" ", 1)
+                    overwrite = field == "#fairseq:overwrite"
+                    if overwrite:
+                        symbol, field = symbol.rsplit(" ", 1)
+                    count = int(field)
+                except ValueError:
+                    raise ValueError(
+                        f"Incorrect dictionary format, expected '<token> <cnt> [flags]': {line}"
+                    )
+                if symbol in self.indices and not overwrite:
+                    raise RuntimeError(f"Duplicate word found in {dict_file}: {symbol}")
+                self.indices[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+                self.counts.append(count)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def dtype(self) -> type:
+        """
+        returns the smallest integer type of fairseq-preprocess for this vocabulary size.
+        """
+        if len(self) < 65500:
+            return np.uint16
+        if len(self) < 4294967295:
+            return np.uint32
+        return np.int64
+
+    def encode_line(self, line: str) -> Tuple[List[int], int]:
+        """
+        returns the indices of the whitespace separated words of @param line followed by </s>, and
+        the number of words replaced by <unk>.
+        """
+        words = line.split()
+        unk = self.unk_index
+        ids = [self.indices.get(word, unk) for word in words]
+        n_replaced = sum(1 for i, word in zip(ids, words) if i == unk and word != "<unk>")
+        ids.append(self.eos_index)
+        return ids, n_replaced
+
+
+class IndexedDatasetWriter(object):
+    def __init__(self, prefix: str, dtype: type):
+        """
+        writes an indexed dataset in the format of fairseq's MMapIndexedDataset: the token indices
+        of all items are concatenated in @param prefix.bin, @param prefix.idx holds the header, the
+        number of tokens of every item (int32) and the byte offsets of the items (int64).
+
+        Args:
+        prefix      the output prefix of the .bin and .idx files.
+        dtype       the integer type of the token indices.
+        """
+        self.prefix = prefix
+        self.dtype = dtype
+        self.sizes: List[np.ndarray] = []
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+        self.data_file = open(prefix + ".bin", "wb")
+
+    def __enter__(self) -> "IndexedDatasetWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, tokens: np.ndarray, sizes: np.ndarray):
+        """
+        appends items given as the concatenation of their token indices and their sizes.
+        """
+        self.data_file.write(tokens.astype(self.dtype, copy=False).tobytes(order="C"))
+        self.sizes.append(sizes.astype(np.int32, copy=False))
+
+    def close(self):
+        if self.data_file.closed:
+            return
+        self.data_file.close()
+        sizes = np.concatenate(self.sizes) if self.sizes else np.zeros(0, dtype=np.int32)
+        pointers = np.zeros(len(sizes), dtype=np.int64)
+        np.cumsum(sizes[:-1], dtype=np.int64, out=pointers[1:])
+        pointers *= np.dtype(self.dtype).itemsize
+        code = next(code for code, dtype in DTYPE_CODES.items() if dtype == self.dtype)
+        with open(self.prefix + ".idx", "wb") as index_file:
+            index_file.write(INDEX_MAGIC)
+            index_file.write(struct.pack("<Q", INDEX_VERSION))
+            index_file.write(struct.pack("<B", code))
+            index_file.write(struct.pack("<Q", len(sizes)))
+            index_file.write(sizes.tobytes(order="C"))
+            index_file.write(pointers.tobytes(order="C"))
+
+
+class IndexedDataset(object):
+    def __init__(self, prefix: str):
+        """
+        reads an indexed dataset in the format of fairseq's MMapIndexedDataset with numpy (memory
+        mapped, without fairseq and torch).
+
+        Args:
+        prefix      the prefix of the .bin and .idx files.
+        """
+        self.prefix = prefix
+        with open(prefix + ".idx", "rb") as index_file:
+            magic = index_file.read(len(INDEX_MAGIC))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{prefix}.idx is not the index of an mmap indexed dataset.")
+            (version,) = struct.unpack("<Q", index_file.read(8))
+            if version != INDEX_VERSION:
+                raise ValueError(f"Unsupported index version {version} of {prefix}.idx.")
+            (code,) = struct.unpack("<B", index_file.read(1))
+            (length,) = struct.unpack("<Q", index_file.read(8))
+            offset = index_file.tell()
+        self.dtype = DTYPE_CODES[code]
+        index = np.memmap(prefix + ".idx", mode="r", order="C")
+        self.sizes = np.frombuffer(index, dtype=np.int32, count=length, offset=offset)
+        self.pointers = np.frombuffer(
+            index, dtype=np.int64, count=length, offset=offset + self.sizes.nbytes
+        )
+        if os.path.getsize(prefix + ".bin") > 0:
+            self.data = np.memmap(prefix + ".bin", mode="r", dtype=self.dtype, order="C")
+        else:
+            self.data = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        start = self.pointers[i] // np.dtype(self.dtype).itemsize
+        return self.data[start : start + self.sizes[i]]
+
+
+# the vocabulary and preprocessor of a worker process, created for the first task
+_worker_vocabularies: Dict[str, Vocabulary] = {}
+_worker_preprocessors: Dict[Tuple, Preprocessor] = {}
+
+
+def binarize_shard(
+    path: str,
+    shard: Shard,
+    dict_file: str,
+    preprocess_settings: Optional[Tuple] = None,
+    keep_text: bool = False,
+) -> Tuple[np.ndarray, np.ndarray, Optional[bytes], np.ndarray, int]:
+    """
+    binarizes the lines of a shard with the vocabulary (and the preprocessor) of the worker
+    process. returns the concatenated token indices, the number of tokens per line, optionally the
+    (preprocessed) text and the byte offsets of its line ends, and the number of words replaced by
+    <unk>.
+    """
+    if dict_file not in _worker_vocabularies:
+        _worker_vocabularies[dict_file] = Vocabulary(dict_file)
+    vocabulary = _worker_vocabularies[dict_file]
+    preprocessor = None
+    if preprocess_settings is not None:
+        if preprocess_settings not in _worker_preprocessors:
+            _worker_preprocessors[preprocess_settings] = Preprocessor(*preprocess_settings)
+        preprocessor = _worker_preprocessors[preprocess_settings]
+    offset, length = shard
+    with open(path, "rb") as infile:
+        infile.seek(offset)
+        data = infile.read(length).decode("utf8", errors="surrogateescape")
+    # universal newlines like the text mode files read by fairseq-preprocess
+    lines = data.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    if preprocessor is not None:
+        lines = [preprocessor.process_line(line) for line in lines]
+    tokens: List[int] = []
+    sizes = np.zeros(len(lines), dtype=np.int32)
+    n_replaced = 0
+    for i, line in enumerate(lines):
+        ids, replaced = vocabulary.encode_line(line)
+        tokens.extend(ids)
+        sizes[i] = len(ids)
+        n_replaced += replaced
+    text = None
+    line_ends = np.zeros(0, dtype=np.int64)
+    if keep_text:
+        encoded = [(line + "\n").encode("utf8", errors="surrogateescape") for line in lines]
+        line_ends = np.cumsum([len(line) for line in encoded], dtype=np.int64)
+        text = b"".join(encoded)
+    return (
+        np.array(tokens, dtype=vocabulary.dtype()),
+        sizes,
+        text,
+        line_ends,
+        n_replaced,
+    )
+
+
+def binarize_file(
+    input_file: str,
+    output_prefix: str,
+    dict_file: str,
+    preprocess_settings: Optional[Tuple] = None,
+    chunk_size: Optional[int] = None,
+    text_output: Optional[str] = None,
+    n_processes: int = 1,
+    shard_size: int = 4 * 1024 * 1024,
+    profiler: Profiler = None,
+) -> Iterator[int]:
+    """
+    binarizes the shards of @param input_file in a process pool and writes the datasets (one per
+    @param chunk_size lines if given) in input order. yields the number of lines written after
+    every shard.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    if chunk_size is not None:
+        assert "{chunk" in output_prefix, "The output prefix needs a {chunk} placeholder."
+        assert (
+            text_output is None or "{chunk" in text_output
+        ), "The text output needs a {chunk} placeholder."
+    dtype = Vocabulary(dict_file).dtype()
+    shards = find_shards(input_file, shard_size)
+
+    def open_chunk(chunk: int) -> Tuple[IndexedDatasetWriter, Optional[object]]:
+        writer = IndexedDatasetWriter(output_prefix.format(chunk=chunk), dtype)
+        text_file = None
+        if text_output is not None:
+            text_path = text_output.format(chunk=chunk)
+            os.makedirs(os.path.dirname(os.path.abspath(text_path)), exist_ok=True)
+            text_file = open(text_path, "wb")
+        return writer, text_file
+
+    done = 0
+    chunk = 0
+    with mp.Pool(processes=n_processes) as pool:
+        writer, text_file = open_chunk(chunk)
+        try:
+            for tokens, sizes, text, line_ends, n_replaced in bounded_imap(
+                pool,
+                lambda shard: binarize_shard(
+                    input_file, shard, dict_file, preprocess_settings, text_output is not None
+                ),
+                shards,
+                2 * n_processes,
+            ):
+                with profiler.stage("write"):
+                    token_ends = np.cumsum(sizes, dtype=np.int64)
+                    start = 0
+                    while start < len(sizes):
+                        end = len(sizes)
+                        if chunk_size is not None:
+                            if done > 0 and done % chunk_size == 0:
+                                writer.close()
+                                if text_file is not None:
+                                    text_file.close()
+                                chunk += 1
+                                writer, text_file = open_chunk(chunk)
+                            end = min(end, start + chunk_size - done % chunk_size)
+                        token_start = token_ends[start - 1] if start > 0 else 0
+                        writer.write(tokens[token_start : token_ends[end - 1]], sizes[start:end])
+                        if text_file is not None:
+                            text_start = line_ends[start - 1] if start > 0 else 0
+                            text_file.write(text[text_start : line_ends[end - 1]])
+                        done += end - start
+                        start = end
+                profiler.count("lines", len(sizes))
+                profiler.count("tokens", int(sizes.sum()))
+                profiler.count("replaced", n_replaced)
+                yield done
+        finally:
+            writer.close()
+            if text_file is not None:
+                text_file.close()
+
+
+def main(args: argparse.Namespace):
+    assert args.codes is not None or not args.bpe_only, "--bpe-only requires BPE codes (-c)."
+    profiler = Profiler.from_args("binarize", args).start()
+    preprocess_settings = None
+    if args.codes is not None:
+        preprocess_settings = (args.lang, args.codes, not args.bpe_only, 1000000)
+    start = time.perf_counter()
+    lines = 0
+    for lines in binarize_file(
+        args.input,
+        args.output_prefix,
+        args.dict,
+        preprocess_settings=preprocess_settings,
+        chunk_size=args.chunk_size,
+        text_output=args.text_output,
+        n_processes=args.processes,
+        shard_size=args.shard_size * 1024 * 1024,
+        profiler=profiler,
+    ):
+        if args.verbose >= 2:
+            print(f"INFO:\tBinarized {lines} lines...", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    if args.verbose >= 1:
+        tokens = profiler.counters.get("tokens", 0)
+        replaced = profiler.counters.get("replaced", 0)
+        print(
+            f"INFO:\tBinarized {lines} lines ({tokens} tokens, "
+            + f"{100 * replaced / max(tokens, 1):.3}% replaced by <unk>) of {args.input} in "
+            + f"{seconds:.1f}s ({lines / max(seconds, 1e-9):.0f} lines/s, "
+            + f"{args.processes} processes).",
+            file=sys.stderr,
+        )
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import hashlib
+import numpy as np
+import os
+import random
+import sys
+
+from contextlib import ExitStack
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+
+Example = Tuple[bytes, ...]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        nargs="+",
+        metavar="PATH",
+        required=True,
+        help="One or more aligned input files (e.g. bt_data_full.de bt_data_full.ls).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        nargs="+",
+        metavar="PATH",
+        required=True,
+        help="One output file per input file.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Remove all but the first occurrence of duplicate lines (of duplicate tuples of "
+        + "aligned lines if there are several input files).",
+    )
+    parser.add_argument(
+        "--dedup-index",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Only compare the lines of the input file with this index (starting at 0) for --dedup.",
+    )
+    parser.add_argument(
+        "-n",
+        "--sample",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Write a uniform random sample of this many aligned lines instead of all lines.",
+    )
+    parser.add_argument(
+        "--seed", type=int, metavar="INT", default=1, help="The random seed for --sample."
+    )
+    parser.add_argument(
+        "--minlen",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Remove lines with fewer tokens (in any input file).",
+    )
+    parser.add_argument(
+        "--maxlen",
+        type=int,
+        metavar="INT",
+        default=None,
+        help="Remove lines with more tokens (in any input file).",
+    )
+    parser.add_argument(
+        "--ratio",
+        type=float,
+        metavar="FLOAT",
+        default=None,
+        help="Remove aligned lines whose token counts differ by more than this ratio.",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        metavar="INT",
+        default=100000,
+        help="The number of lines hashed and looked up at once. (default: 100000)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+class HashSet(object):
+    def __init__(self, capacity: int = 1 << 20):
+        """
+        a set of 64-bit hashes in an open addressing table (linear probing) of uint64, which needs
+        about 16 bytes per hash. hashes are looked up and added in blocks with numpy.
+
+        Args:
+        capacity    the initial number of slots (a power of two). the table is doubled when it is
+                        half full.
+        """
+        self.table = np.zeros(capacity, dtype=np.uint64)
+        self.size = 0
+
+    def add_block(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        adds a block of hashes and returns a boolean mask of the hashes which have not been in the
+        set before (only the first of several equal hashes of the block is marked as new).
+        """
+        # 0 marks empty slots
+        hashes = np.where(hashes == 0, np.uint64(1), hashes)
+        unique, first = np.unique(hashes, return_index=True)
+        while 2 * (self.size + len(unique)) > len(self.table):
+            self._grow()
+        inserted = self._insert(unique)
+        new = np.zeros(len(hashes), dtype=bool)
+        new[first[inserted]] = True
+        return new
+
+    def _insert(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        inserts distinct hashes, returns a mask of the hashes which have not been in the table.
+        """
+        mask = np.uint64(len(self.table) - 1)
+        slots = hashes & mask
+        inserted = np.zeros(len(hashes), dtype=bool)
+        pending = np.arange(len(hashes))
+        while len(pending):
+            values = self.table[slots[pending]]
+            found = values == hashes[pending]
+            empty = values == 0
+            # several hashes probing the same empty slot: the first one takes it
+            candidates = pending[empty]
+            _, winners = np.unique(slots[candidates], return_index=True)
+            winners = candidates[winners]
+            self.table[slots[winners]] = hashes[winners]
+            inserted[winners] = True
+            self.size += len(winners)
+            done = np.zeros(len(hashes), dtype=bool)
+            done[pending[found]] = True
+            done[winners] = True
+            pending = pending[~done[pending]]
+            # the losers probe their slot again, all others move on to the next slot
+            moving = pending[~np.isin(pending, candidates)]
+            slots[moving] = (slots[moving] + np.uint64(1)) & mask
+        return inserted
+
+    def _grow(self):
+        old = self.table[self.table != 0]
+        self.table = np.zeros(2 * len(self.table), dtype=np.uint64)
+        self.size = 0
+        self._insert(old)
+
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+
+def line_hash(example: Example) -> int:
+    """
+    returns a 64-bit hash of a line (or of a tuple of aligned lines).
+    """
+    return int.from_bytes(hashlib.blake2b(b"\t".join(example), digest_size=8).digest(), "little")
+
+
+def n_tokens(line: bytes) -> int:
+    line = line.strip()
+    return len(line.split(b" ")) if line else 0
+
+
+def is_valid(
+    example: Example,
+    minlen: Optional[int] = None,
+    maxlen: Optional[int] = None,
+    ratio: Optional[float] = None,
+) -> bool:
+    """
+    filters aligned lines like extract_bt_data.py (--minlen, --maxlen, --ratio).
+    """
+    lengths = [n_tokens(line) for line in example]
+    if minlen is not None and min(lengths) < minlen:
+        return False
+    if maxlen is not None and max(lengths) > maxlen:
+        return False
+    if ratio is not None and len(lengths) > 1:
+        if min(lengths) == 0:
+            return max(lengths) == 0
+        if max(lengths) / min(lengths) > ratio:
+            return False
+    return True
+
+
+def read_blocks(paths: List[str], block_size: int) -> Iterator[List[Example]]:
+    """
+    reads blocks of aligned lines (without line breaks) from several files.
+    """
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(path, "rb")) for path in paths]
+        block = []
+        for example in zip(*files):
+            block.append(tuple(line.rstrip(b"\n") for line in example))
+            if len(block) >= block_size:
+                yield block
+                block = []
+        if block:
+            yield block
+        if any(infile.readline() for infile in files):
+            raise ValueError(f"The input files {paths} do not have the same number of lines.")
+
+
+def dedup_sample(
+    inputs: List[str],
+    dedup: bool = False,
+    dedup_index: int = None,
+    sample: int = None,
+    seed: int = 1,
+    minlen: int = None,
+    maxlen: int = None,
+    ratio: float = None,
+    block_size: int = 100000,
+    profiler: Profiler = None,
+) -> Iterator[Example]:
+    """
+    streams the aligned lines of @param inputs which pass the length filters and are not
+    duplicates. with @param sample, a uniform random sample (reservoir sampling with a fixed seed)
+    of the remaining lines is returned in input order, so only the sample and the hashes are kept
+    in memory.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    seen = HashSet() if dedup else None
+    rng = random.Random(seed)
+    reservoir: List[Tuple[int, Example]] = []
+    n_kept = 0
+    for block in read_blocks(inputs, block_size):
+        profiler.count("lines", len(block))
+        with profiler.stage("filter"):
+            if minlen is not None or maxlen is not None or ratio is not None:
+                n_lines = len(block)
+                block = [example for example in block if is_valid(example, minlen, maxlen, ratio)]
+                profiler.count("filtered", n_lines - len(block))
+        if seen is not None and block:
+            with profiler.stage("dedup"):
+                keys = (
+                    block if dedup_index is None else [(example[dedup_index],) for example in block]
+                )
+                hashes = np.fromiter(
+                    (line_hash(key) for key in keys),
+                    dtype=np.uint64,
+                    count=len(block),
+                )
+                new = seen.add_block(hashes)
+                profiler.count("duplicates", len(block) - int(new.sum()))
+                block = [example for example, is_new in zip(block, new) if is_new]
+        if sample is None:
+            for example in block:
+                yield example
+            profiler.count("written", len(block))
+            continue
+        with profiler.stage("sample"):
+            for example in block:
+                if n_kept < sample:
+                    reservoir.append((n_kept, example))
+                else:
+                    j = rng.randrange(n_kept + 1)
+                    if j < sample:
+                        reservoir[j] = (n_kept, example)
+                n_kept += 1
+    if seen is not None:
+        profiler.count("unique", seen.size)
+        profiler.count("hash table bytes", seen.nbytes())
+    if sample is not None:
+        reservoir.sort(key=lambda item: item[0])
+        profiler.count("written", len(reservoir))
+        for _, example in reservoir:
+            yield example
+
+
+def main(args: argparse.Namespace):
+    assert len(args.input) == len(args.output), "Please provide one output file per input file."
+    profiler = Profiler.from_args("dedup_sample", args).start()
+    with ExitStack() as stack:
+        outfiles = [stack.enter_context(open(path, "wb")) for path in args.output]
+        for example in dedup_sample(
+            args.input,
+            dedup=args.dedup,
+            dedup_index=args.dedup_index,
+            sample=args.sample,
+            seed=args.seed,
+            minlen=args.minlen,
+            maxlen=args.maxlen,
+            ratio=args.ratio,
+            block_size=args.block_size,
+            profiler=profiler,
+        ):
+            for outfile, line in zip(outfiles, example):
+                outfile.write(line + b"\n")
+    counters: Dict[str, int] = profiler.counters
+    if args.verbose >= 1:
+        print(
+            f"INFO:\tRead {counters.get('lines', 0)} lines, removed "
+            + f"{counters.get('filtered', 0)} by length and {counters.get('duplicates', 0)} "
+            + f"duplicates, wrote {counters.get('written', 0)} lines.",
+            file=sys.stderr,
+        )
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import os
+import pathos.multiprocessing as mp
+import re
+import sys
+import time
+import unicodedata
+
+from sacremoses import MosesPunctNormalizer, MosesTokenizer
+from subword_nmt.apply_bpe import BPE
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from common.parallel import bounded_imap  # noqa: E402
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+
+# lines passed through unchanged by tokenizer.perl (without -x)
+SKIPPED_LINE_REGEX = re.compile(r"^\s*$")
+MULTIPLE_SPACES_REGEX = re.compile(r" +")
+
+Shard = Tuple[int, int]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i", "--input", type=str, metavar="PATH", required=True, help="The input text file."
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, metavar="PATH", required=True, help="The output file."
+    )
+    parser.add_argument(
+        "-c",
+        "--codes",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="BPE codes (learned with learn_bpe.py). Without codes, the lines are only normalized "
+        + "and tokenized.",
+    )
+    parser.add_argument(
+        "-l", "--lang", type=str, metavar="STRING", default="de", help="The language of the input."
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes to be run in parallel.",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        metavar="INT",
+        default=4,
+        help="The size of the line ranges handled per task in MB. (default: 4)",
+    )
+    parser.add_argument(
+        "--bpe-only",
+        action="store_true",
+        help="Only apply BPE to already tokenized input (like apply_bpe.py).",
+    )
+    parser.add_argument(
+        "--memo-size",
+        type=int,
+        metavar="INT",
+        default=1000000,
+        help="The maximum number of memoized word segmentations per process. (default: 1000000)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", type=int, metavar="INT", default=1, help="The verbosity level."
+    )
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+class NonPrintingTable(dict):
+    """
+    a str.translate table replacing all characters of the unicode category "Other" (\\p{C}) with
+    spaces, like remove-non-printing-char.perl. the category of a character is only looked up once.
+    """
+
+    def __missing__(self, codepoint: int) -> int:
+        value = 32 if unicodedata.category(chr(codepoint)).startswith("C") else codepoint
+        self[codepoint] = value
+        return value
+
+
+class Preprocessor(object):
+    def __init__(
+        self,
+        lang: str = "de",
+        codes: str = None,
+        tokenize: bool = True,
+        memo_size: int = 1000000,
+    ):
+        """
+        applies the preprocessing of the job-prepare-*.sh scripts to single lines:
+
+            normalize-punctuation.perl -l <lang>
+            | remove-non-printing-char.perl
+            | tokenizer.perl -a -l <lang>
+            | apply_bpe.py -c <codes>
+
+        the segmentation of every word is memoized, so frequent words are only segmented once.
+
+        Args:
+        lang            the language of the input.
+        codes           optional BPE codes. no BPE is applied if omitted.
+        tokenize        normalize and tokenize the lines. set to False for tokenized input.
+        memo_size       the maximum number of memoized word segmentations. the memo is emptied when
+                            it is full.
+        """
+        self.lang = lang
+        self.codes = codes
+        self.tokenize = tokenize
+        self.memo_size = memo_size
+        self.normalizer = MosesPunctNormalizer(lang=lang, perl_parity=True)
+        self.tokenizer = MosesTokenizer(lang=lang)
+        self.non_printing = NonPrintingTable()
+        self.bpe = None
+        if codes is not None:
+            with open(codes, encoding="utf8") as codes_file:
+                self.bpe = BPE(codes_file)
+        self.memo: Dict[str, str] = {}
+        self.memo_hits = 0
+
+    def process_line(self, line: str) -> str:
+        """
+        preprocesses a line (without line break).
+        """
+        if self.tokenize:
+            normalized = self.normalizer.normalize(line).translate(self.non_printing)
+            if SKIPPED_LINE_REGEX.match(normalized):
+                # sacremoses strips lines without words, normalize-punctuation.perl only removes
+                # "\r" and repeated spaces and tokenizer.perl prints them unchanged
+                line = MULTIPLE_SPACES_REGEX.sub(" ", line.replace("\r", ""))
+                line = line.translate(self.non_printing)
+            else:
+                line = self.tokenizer.tokenize(
+                    normalized, aggressive_dash_splits=True, return_str=True, escape=True
+                )
+        if self.bpe is not None:
+            line = self._apply_bpe(line)
+        return line
+
+    def _apply_bpe(self, line: str) -> str:
+        """
+        like BPE.process_line: segments the words and keeps leading and trailing whitespace.
+        """
+        stripped = line.strip("\r\n ")
+        if not stripped:
+            return line
+        segments = []
+        for word in stripped.split(" "):
+            # eliminate double spaces
+            if not word:
+                continue
+            segmented = self.memo.get(word)
+            if segmented is None:
+                segmented = " ".join(self.bpe.segment_tokens([word]))
+                if len(self.memo) >= self.memo_size:
+                    self.memo.clear()
+                self.memo[word] = segmented
+            else:
+                self.memo_hits += 1
+            segments.append(segmented)
+        leading = line[: len(line) - len(line.lstrip("\r\n "))]
+        trailing = line[len(line.rstrip("\r\n ")) :]
+        return leading + " ".join(segments) + trailing
+
+
+# the preprocessor of a worker process, created for the first task
+_worker_preprocessors: Dict[Tuple, Preprocessor] = {}
+
+
+def find_shards(path: str, shard_size: int) -> List[Shard]:
+    """
+    splits a file into (offset, length) ranges of about @param shard_size bytes ending at line
+    breaks.
+    """
+    file_size = os.path.getsize(path)
+    shards = []
+    with open(path, "rb") as infile:
+        start = 0
+        while start < file_size:
+            infile.seek(min(start + shard_size, file_size))
+            infile.readline()
+            end = min(infile.tell(), file_size)
+            shards.append((start, end - start))
+            start = end
+    return shards
+
+
+def preprocess_shard(
+    path: str, shard: Shard, settings: Tuple[str, Optional[str], bool, int]
+) -> Tuple[bytes, int, int]:
+    """
+    preprocesses the lines of a shard with the preprocessor of the worker process. returns the
+    output, the number of lines and the number of memo hits.
+    """
+    if settings not in _worker_preprocessors:
+        _worker_preprocessors[settings] = Preprocessor(*settings)
+    preprocessor = _worker_preprocessors[settings]
+    hits = preprocessor.memo_hits
+    offset, length = shard
+    with open(path, "rb") as infile:
+        infile.seek(offset)
+        data = infile.read(length).decode("utf8", errors="surrogateescape")
+    lines = data.split("\n")
+    # a final line without line break is written with one
+    if lines[-1] == "":
+        lines.pop()
+    output = "".join(preprocessor.process_line(line) + "\n" for line in lines)
+    return (
+        output.encode("utf8", errors="surrogateescape"),
+        len(lines),
+        preprocessor.memo_hits - hits,
+    )
+
+
+def preprocess_file(
+    input_file: str,
+    output_file: str,
+    settings: Tuple[str, Optional[str], bool, int],
+    n_processes: int,
+    shard_size: int,
+    profiler: Profiler = None,
+) -> Iterator[int]:
+    """
+    preprocesses the shards of @param input_file in a process pool and writes the output in input
+    order. yields the number of lines written after every shard.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    shards = find_shards(input_file, shard_size)
+    done = 0
+    with mp.Pool(processes=n_processes) as pool:
+        with open(output_file, "wb") as outfile:
+            for output, n_lines, hits in bounded_imap(
+                pool,
+                lambda shard: preprocess_shard(input_file, shard, settings),
+                shards,
+                2 * n_processes,
+            ):
+                with profiler.stage("write"):
+                    outfile.write(output)
+                profiler.count("lines", n_lines)
+                profiler.count("memo hits", hits)
+                done += n_lines
+                yield done
+
+
+def main(args: argparse.Namespace):
+    profiler = Profiler.from_args("preprocess", args).start()
+    settings = (args.lang, args.codes, not args.bpe_only, args.memo_size)
+    start = time.perf_counter()
+    lines = 0
+    for lines in preprocess_file(
+        args.input,
+        args.output,
+        settings,
+        args.processes,
+        args.shard_size * 1024 * 1024,
+        profiler=profiler,
+    ):
+        if args.verbose >= 2:
+            print(f"INFO:\tPreprocessed {lines} lines...", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    if args.verbose >= 1:
+        print(
+            f"INFO:\tPreprocessed {lines} lines of {args.input} in {seconds:.1f}s "
+            + f"({lines / max(seconds, 1e-9):.0f} lines/s, {args.processes} processes).",
+            file=sys.stderr,
+        )
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import numpy as np
+import os
+import pathos.multiprocessing as mp
+import subprocess
+import sys
+import tempfile
+import time
+
+from binarize import IndexedDataset, binarize_file
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="A BPE-segmented test corpus (e.g. test.ls).",
+    )
+    parser.add_argument(
+        "-d",
+        "--dict",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The fairseq dictionary (dict.<lang>.txt).",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes (and fairseq-preprocess workers).",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def run_fairseq(args: argparse.Namespace, dest_dir: str) -> str:
+    """
+    binarizes the test corpus with fairseq-preprocess like job-prepare-monolingual-data.sh and
+    returns the output prefix.
+    """
+    input_prefix, lang = os.path.splitext(args.input)
+    lang = lang.lstrip(".") or "src"
+    command = [
+        "fairseq-preprocess",
+        "--only-source",
+        "--source-lang",
+        lang,
+        "--srcdict",
+        args.dict,
+        "--testpref",
+        input_prefix,
+        "--destdir",
+        dest_dir,
+        "--workers",
+        str(args.processes),
+    ]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return os.path.join(dest_dir, f"test.{lang}-None.{lang}")
+
+
+def compare_datasets(expected: IndexedDataset, found: IndexedDataset) -> int:
+    """
+    returns the index (starting at 1) of the first differing item, or 0 if the items are identical.
+    """
+    if expected.dtype != found.dtype:
+        print(f"ERROR: the dtypes differ: {expected.dtype} != {found.dtype}")
+        return 1
+    for i in range(max(len(expected), len(found))):
+        if i >= len(expected) or i >= len(found) or not np.array_equal(expected[i], found[i]):
+            return i + 1
+    return 0
+
+
+def same_bytes(path_a: str, path_b: str) -> bool:
+    with open(path_a, "rb") as file_a, open(path_b, "rb") as file_b:
+        return file_a.read() == file_b.read()
+
+
+def main(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        fairseq_prefix = run_fairseq(args, os.path.join(tmp_dir, "fairseq"))
+        fairseq_seconds = time.perf_counter() - start
+
+        python_prefix = os.path.join(tmp_dir, "binarize", "test")
+        start = time.perf_counter()
+        lines = 0
+        for lines in binarize_file(
+            args.input, python_prefix, args.dict, n_processes=args.processes
+        ):
+            pass
+        python_seconds = time.perf_counter() - start
+
+        print(f"fairseq-preprocess: {fairseq_seconds:8.2f}s")
+        print(f"binarize.py:        {python_seconds:8.2f}s ({lines / python_seconds:.0f} lines/s)")
+        n_item = compare_datasets(IndexedDataset(fairseq_prefix), IndexedDataset(python_prefix))
+        if n_item != 0:
+            print(f"ERROR: the datasets differ in item {n_item}.")
+            sys.exit(1)
+        if not all(
+            same_bytes(fairseq_prefix + ext, python_prefix + ext) for ext in (".bin", ".idx")
+        ):
+            print("ERROR: the items are identical, but the files are not.")
+            sys.exit(1)
+        try:
+            from fairseq.data.indexed_dataset import MMapIndexedDataset
+        except ImportError:
+            MMapIndexedDataset = None
+        if MMapIndexedDataset is not None:
+            # the dataset is read back by fairseq itself
+            dataset = MMapIndexedDataset(python_prefix)
+            ours = IndexedDataset(python_prefix)
+            for i in range(len(dataset)):
+                if not np.array_equal(dataset[i].numpy(), ours[i]):
+                    print(f"ERROR: fairseq reads a different item {i + 1}.")
+                    sys.exit(1)
+        print(f"OK: the .bin and .idx files of {lines} lines are identical.")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Author: Nicolas Spring
+
+import argparse
+import os
+import pathos.multiprocessing as mp
+import subprocess
+import sys
+import tempfile
+import time
+
+from preprocess import preprocess_file
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-i", "--input", type=str, metavar="PATH", required=True, help="A test corpus."
+    )
+    parser.add_argument(
+        "-c",
+        "--codes",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="BPE codes. Without codes, only normalization and tokenization are compared.",
+    )
+    parser.add_argument(
+        "-l", "--lang", type=str, metavar="STRING", default="de", help="The language of the input."
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        metavar="INT",
+        default=mp.cpu_count(),
+        help="The number of processes (and tokenizer threads) to be run in parallel.",
+    )
+    parser.add_argument(
+        "--moses",
+        type=str,
+        metavar="PATH",
+        required=True,
+        help="The mosesdecoder repository (software/mosesdecoder).",
+    )
+    parser.add_argument(
+        "--subword-nmt",
+        type=str,
+        metavar="PATH",
+        default=None,
+        help="The subword-nmt repository (software/subword-nmt). The installed package is used if "
+        + "omitted.",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def run_scripts(args: argparse.Namespace, output_file: str):
+    """
+    preprocesses the test corpus with the scripts used in the job-prepare-*.sh scripts.
+    """
+    tokenizer = os.path.join(args.moses, "scripts", "tokenizer")
+    command = (
+        f"cat {args.input}"
+        + f" | perl {tokenizer}/normalize-punctuation.perl -l {args.lang}"
+        + f" | perl {tokenizer}/remove-non-printing-char.perl"
+        + f" | perl {tokenizer}/tokenizer.perl -threads {args.processes} -a -l {args.lang}"
+    )
+    if args.codes is not None:
+        if args.subword_nmt is not None:
+            apply_bpe = os.path.join(args.subword_nmt, "subword_nmt", "apply_bpe.py")
+        else:
+            apply_bpe = "-m subword_nmt.apply_bpe"
+        command += f" | {sys.executable} {apply_bpe} -c {args.codes}"
+    with open(output_file, "wb") as outfile:
+        subprocess.run(command, shell=True, check=True, stdout=outfile, stderr=subprocess.DEVNULL)
+
+
+def first_difference(path_a: str, path_b: str) -> int:
+    """
+    returns the number (starting at 1) of the first differing line of two files, or 0 if the files
+    are identical.
+    """
+    with open(path_a, "rb") as file_a, open(path_b, "rb") as file_b:
+        n_line = 0
+        while True:
+            line_a = file_a.readline()
+            line_b = file_b.readline()
+            n_line += 1
+            if line_a != line_b:
+                return n_line
+            if not line_a:
+                return 0
+
+
+def main(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scripts_output = os.path.join(tmp_dir, "scripts.out")
+        python_output = os.path.join(tmp_dir, "preprocess.out")
+
+        start = time.perf_counter()
+        run_scripts(args, scripts_output)
+        scripts_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lines = 0
+        for lines in preprocess_file(
+            args.input,
+            python_output,
+            (args.lang, args.codes, True, 1000000),
+            args.processes,
+            1024 * 1024,
+        ):
+            pass
+        python_seconds = time.perf_counter() - start
+
+        print(f"scripts:       {scripts_seconds:8.2f}s ({lines / scripts_seconds:.0f} lines/s)")
+        print(f"preprocess.py: {python_seconds:8.2f}s ({lines / python_seconds:.0f} lines/s)")
+        n_line = first_difference(scripts_output, python_output)
+        if n_line == 0:
+            print(f"OK: the outputs for {lines} lines are identical.")
+            return
+        with open(scripts_output, encoding="utf8", errors="replace") as infile:
+            expected = infile.read().split("\n")[n_line - 1]
+        with open(python_output, encoding="utf8", errors="replace") as infile:
+            found = infile.read().split("\n")[n_line - 1]
+        print(f"ERROR: the outputs differ in line {n_line}:")
+        print(f"  scripts:       {expected}")
+        print(f"  preprocess.py: {found}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
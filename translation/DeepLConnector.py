@@ -10,15 +10,24 @@ from typing import List
 
 
 class DeepLConnector(object):
-    def __init__(self, auth_key: str, save_path: str = None, verbose: int = 1):
+    def __init__(
+        self,
+        auth_key: str,
+        save_path: str = None,
+        empty_save_file: bool = True,
+        verbose: int = 1,
+    ):
         """
         Args:
-        auth_key    the authentification key to access the DeepL API.
-        save_path   optional output file for saving translations directly.
-        verbose     the verbosity level.
+        auth_key        the authentification key to access the DeepL API.
+        save_path       optional output file for saving translations directly.
+        empty_save_file empty the save file at the beginning of every translate_sentences call. set to
+                            False when translating in several calls (or processes).
+        verbose         the verbosity level.
         """
         self.url = "https://api.deepl.com/v2/translate"
         self.save_path = save_path
+        self.empty_save_file = empty_save_file
         self.verbose = verbose
         self.__auth_key = auth_key
 
@@ -37,7 +46,7 @@ class DeepLConnector(object):
         translated_sents    a list of translated sentences.
         """
         self._debug(f"Sentences to translate: {len(sents)}")
-        if self.save_path:
+        if self.save_path and self.empty_save_file:
             open(self.save_path, "w").close()
         prog_info_every = len(sents) // 100 if len(sents) // 100 >= 1 else 1
         done = 0
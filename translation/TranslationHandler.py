@@ -2,33 +2,92 @@
 # -*- coding: utf-8 -*-
 # Author: Nicolas Spring
 
+import os
 import pandas as pd
 import sys
+import unicodedata
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.columnar import read_table  # noqa: E402
+from common.compressed_io import open_file  # noqa: E402
+from common.stage_cache import StageCache  # noqa: E402
+
+
+def normalize_sentence(sent: str) -> str:
+    """
+    normalizes a sentence for matching it against previous translations (unicode NFC, collapsed
+    whitespace).
+    """
+    return " ".join(unicodedata.normalize("NFC", sent).split())
+
+
+def sentence_keys(article_ids: Iterable, sents: Iterable) -> List[Tuple[str, str]]:
+    """
+    returns (article id, normalized sentence) keys for matching sentences against previous
+    translations.
+    """
+    return [
+        (str(article_id), normalize_sentence(str(sent)))
+        for article_id, sent in zip(article_ids, sents)
+    ]
 
 
 class TranslationHandler(object):
-    def __init__(self, verbose: int = 1):
+    def __init__(self, cache: StageCache = None, verbose: int = 1):
         """
         Args:
+        cache       an optional StageCache. translate_column reuses the cached translations if the
+                        input file, the previous translations and the languages have not changed.
         verbose     the verbosity level.
         """
+        self.cache = cache
         self.verbose = verbose
         self.source_df = None
+        self.source_file = None
+        self.source_usecols = None
+        self.previous_file = None
+        self.previous_col_idx = None
         self.api_connector = None
         self.translations = None
         self.translations_col_idx = None
         self.translations_trg_lan = None
+        self.previous_translations = None
 
-    def read_tsv(self, file_path: str):
+    def read_tsv(self, file_path: str, usecols: Optional[List[int]] = None):
         """
-        Reads a tsv file containing a column of data ready for translation into a DataFrame.
+        Reads a (compressed) tsv or parquet file containing a column of data ready for translation into a DataFrame.
 
         Args:
         file_path   the name of the input file.
+        usecols     optional list of column indices to load. all columns are loaded if omitted.
         """
-        self.source_df = pd.read_csv(file_path, sep="\t", quotechar='"', header=None)
+        self.source_df = read_table(file_path, columns=usecols)
+        self.source_file = file_path
+        self.source_usecols = usecols
         self._debug(f"Sucessfully read file {file_path}.")
 
+    def read_previous_translations(self, file_path: str, col_idx: int):
+        """
+        Reads a previously translated tsv (or parquet) file, i.e. the output of add_translation_column
+        with the translations in the last column. Translations of sentences that are contained in the
+        previous file (in the same article) are reused by translate_column.
+
+        Args:
+        file_path   the name of the previously translated file.
+        col_idx     the column index of the source sentences in the previous file.
+        """
+        previous_df = read_table(file_path)
+        keys = self._row_keys(previous_df, col_idx)
+        translations = previous_df.iloc[:, -1].fillna("").astype(str)
+        self.previous_translations = dict(zip(keys, translations))
+        self.previous_file = file_path
+        self.previous_col_idx = col_idx
+        self._debug(
+            f"Read {len(self.previous_translations)} previous translations from {file_path}."
+        )
+
     def translate_column(
         self,
         col_idx: int,
@@ -50,11 +109,97 @@ class TranslationHandler(object):
         target_lang         the target language.
         """
         self.api_connector = api_connector
-        sents = list(self.source_df.iloc[:, col_idx])
-        self.translations = api_connector.translate_sentences(sents, "EN", "DE")
         self.translations_col_idx = col_idx
         self.translations_trg_lan = target_lang
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(col_idx, api_connector, source_lang, target_lang)
+            self.translations = self.cache.load(cache_key)
+            if self.translations is not None:
+                self._debug(f"Loaded {len(self.translations)} translations from the cache.")
+                return
+        sents = list(self.source_df.iloc[:, col_idx])
+        if self.previous_translations is None:
+            self.translations = api_connector.translate_sentences(sents, source_lang, target_lang)
+        else:
+            keys = self._row_keys(self.source_df, col_idx)
+            new_keys, new_sents = self.find_new_sentences(keys, sents)
+            new_translations = (
+                api_connector.translate_sentences(new_sents, source_lang, target_lang)
+                if new_sents
+                else []
+            )
+            self.translations = self.merge_translations(keys, new_keys, new_translations)
         self._debug(f"Sucessfully translated {len(sents)} sentences.")
+        if cache_key is not None:
+            self.cache.save(cache_key, self.translations, "translate_column")
+
+    def _cache_key(self, col_idx: int, api_connector, source_lang: str, target_lang: str) -> str:
+        """
+        returns the key of the translations of a column in the stage cache.
+        """
+        params = {
+            "col_idx": col_idx,
+            "usecols": self.source_usecols,
+            "previous_col_idx": self.previous_col_idx,
+            "connector": type(api_connector).__name__,
+            "source_lang": source_lang,
+            "target_lang": target_lang,
+        }
+        return self.cache.key("translate_column", params, [self.source_file, self.previous_file])
+
+    def find_new_sentences(
+        self, keys: List[Tuple[str, str]], sents: List[str]
+    ) -> Tuple[Dict[Tuple[str, str], int], List[str]]:
+        """
+        Finds the sentences without a previous translation. Every distinct sentence of an article is
+        only returned once.
+
+        Args:
+        keys    the (article id, normalized sentence) keys of the sentences (see sentence_keys).
+        sents   the sentences.
+
+        Returns:
+        new_keys    the index in new_sents for the key of every new sentence.
+        new_sents   the distinct new sentences.
+        """
+        new_keys: Dict[Tuple[str, str], int] = {}
+        new_sents = []
+        for key, sent in zip(keys, sents):
+            if key not in self.previous_translations and key not in new_keys:
+                new_keys[key] = len(new_sents)
+                new_sents.append(sent)
+        n_reused = sum(key in self.previous_translations for key in keys)
+        self._debug(
+            f"Reusing previous translations for {n_reused} sentences, "
+            + f"{len(new_sents)} distinct new sentences."
+        )
+        return new_keys, new_sents
+
+    def merge_translations(
+        self,
+        keys: List[Tuple[str, str]],
+        new_keys: Dict[Tuple[str, str], int],
+        new_translations: List[str],
+    ) -> List[str]:
+        """
+        Combines previous translations and the translations of the new sentences found by
+        find_new_sentences into one translation per key.
+        """
+        return [
+            (
+                self.previous_translations[key]
+                if key in self.previous_translations
+                else new_translations[new_keys[key]]
+            )
+            for key in keys
+        ]
+
+    def _row_keys(self, df: pd.DataFrame, col_idx: int) -> List[Tuple[str, str]]:
+        """
+        returns (article id, normalized sentence) keys for all rows of a DataFrame.
+        """
+        return sentence_keys(df.iloc[:, 0], df.iloc[:, col_idx].fillna(""))
 
     def write_parallel_file(self, outpath: str):
         """
@@ -62,11 +207,13 @@ class TranslationHandler(object):
         respective translations.
 
         Args:
-        outpath     the filename of the output file.
+        outpath     the filename of the output file (compressed if it ends in .gz, .bz2, .zst
+                        or .xz).
         """
         parallel_df = pd.DataFrame(self.source_df.iloc[:, self.translations_col_idx])
         parallel_df.insert(1, self.translations_trg_lan, pd.Series(self.translations))
-        parallel_df.to_csv(outpath, sep="\t", quotechar='"', index=False, header=False)
+        with open_file(outpath, "w", newline="") as outfile:
+            parallel_df.to_csv(outfile, sep="\t", quotechar='"', index=False, header=False)
         self._debug(
             f"Parallel file with original sentences and translations was written to {outpath}."
         )
@@ -77,11 +224,13 @@ class TranslationHandler(object):
         specified @param outpath.
 
         Args:
-        outpath     the filename of the output file.
+        outpath     the filename of the output file (compressed if it ends in .gz, .bz2, .zst
+                        or .xz).
         """
         all_df = self.source_df.copy()
         all_df.insert(len(all_df.columns), self.translations_trg_lan, pd.Series(self.translations))
-        all_df.to_csv(outpath, sep="\t", quotechar='"', index=False, header=False)
+        with open_file(outpath, "w", newline="") as outfile:
+            all_df.to_csv(outfile, sep="\t", quotechar='"', index=False, header=False)
         self._debug(
             f"A column with translations was added to the original file and written to {outpath}."
         )
@@ -3,10 +3,16 @@
 # Author: Nicolas Spring
 
 import argparse
+import os
+import sys
 
 from TranslationHandler import TranslationHandler
 from DeepLConnector import DeepLConnector
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from common.profiling import Profiler, add_profiling_args  # noqa: E402
+from common.stage_cache import StageCache, add_cache_args  # noqa: E402
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
@@ -25,7 +31,7 @@ def parse_args() -> argparse.Namespace:
         type=str,
         metavar="PATH",
         required=True,
-        help="A tsv file containing a column of data ready for translation.",
+        help="A tsv (or parquet) file containing a column of data ready for translation.",
     )
     parser.add_argument(
         "-o",
@@ -53,6 +59,13 @@ def parse_args() -> argparse.Namespace:
         required=True,
         help="The authentication key for the DeepL API.",
     )
+    parser.add_argument(
+        "--previous",
+        type=str,
+        metavar="PATH",
+        help="A previously translated tsv (or parquet) file (the output of an earlier run). "
+        + "Translations of unchanged sentences are reused and only new sentences are translated.",
+    )
     parser.add_argument(
         "--source-lang",
         type=str,
@@ -67,20 +80,31 @@ def parse_args() -> argparse.Namespace:
         required=True,
         help="DeepL API language code for the target language.",
     )
+    add_profiling_args(parser)
+    add_cache_args(parser)
     args = parser.parse_args()
     return args
 
 
 def main(args: argparse.Namespace):
+    profiler = Profiler.from_args("translate_sents", args).start()
     api_connector = DeepLConnector(
         auth_key=args.auth_key, save_path=args.save_file, verbose=args.verbose
     )
-    translation_handler = TranslationHandler(verbose=args.verbose)
-    translation_handler.read_tsv(args.input)
-    translation_handler.translate_column(
-        args.column_index, api_connector, args.source_lang.upper(), args.target_lang.upper()
-    )
-    translation_handler.add_translation_column(args.output)
+    translation_handler = TranslationHandler(cache=StageCache.from_args(args), verbose=args.verbose)
+    with profiler.stage("read"):
+        translation_handler.read_tsv(args.input)
+        if args.previous:
+            translation_handler.read_previous_translations(args.previous, args.column_index)
+    with profiler.stage("translate"):
+        translation_handler.translate_column(
+            args.column_index, api_connector, args.source_lang.upper(), args.target_lang.upper()
+        )
+    with profiler.stage("write"):
+        translation_handler.add_translation_column(args.output)
+    profiler.count("sentences", len(translation_handler.translations))
+    if args.profile:
+        profiler.write_report(args.profile)
 
 
 if __name__ == "__main__":